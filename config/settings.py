@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Dict
 from pathlib import Path
 
 class Settings(BaseSettings):
@@ -27,6 +28,24 @@ class Settings(BaseSettings):
     EMAIL_USER: str = ""
     EMAIL_PASSWORD: str = ""
     FROM_EMAIL: str = ""
+    # "asyncio" = native asyncio SMTP pool, "smtplib" = thread pool around smtplib
+    SMTP_TRANSPORT: str = "asyncio"
+    # Maximum open SMTP connections per pool; senders beyond it wait for a free connection
+    SMTP_POOL_SIZE: int = 10
+    # Connections opened at startup so the first sends skip the TLS+AUTH handshake
+    SMTP_POOL_MIN_IDLE: int = 1
+    # Seconds a sender waits for a free connection before giving up
+    SMTP_POOL_CHECKOUT_TIMEOUT: float = 30.0
+    # Override the provider's sending limits (0 = use the provider profile)
+    SMTP_RATE_LIMIT_PER_MINUTE: int = 0
+    SMTP_RATE_LIMIT_PER_DAY: int = 0
+    # Coalescing window in seconds per email type (e.g. {"feedback": 900, "attendance": 900});
+    # queued emails of those types for the same student in one window go out as one digest
+    EMAIL_DIGEST_WINDOWS: Dict[str, int] = {}
+
+    # Cache Settings ("memory" = per-process LRU, "redis" = shared cache at CACHE_URL)
+    CACHE_BACKEND: str = "memory"
+    CACHE_URL: str = "redis://localhost:6379/0"
 
     class Config:
         env_file = ".env"
@@ -1,10 +1,10 @@
 import warnings
 import json
 import logging
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, Depends
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from utils.template_environment import get_templates
 from starlette.middleware.sessions import SessionMiddleware
 from config.database import Database
 from utils.dynamic_event_scheduler import start_dynamic_scheduler, stop_dynamic_scheduler
@@ -23,14 +23,23 @@ app = FastAPI()
 # Configure JSON encoder for the entire application
 json._default_encoder = CustomJSONEncoder()
 
+# Cache-Control/ETag handling (registered before the session middleware so it runs
+# inside it and can see the session)
+from utils.cache_control import add_cache_control_middleware
+add_cache_control_middleware(app)
+
 # Add session middleware for student authentication
 app.add_middleware(SessionMiddleware, secret_key="your-secret-key-change-in-production", max_age=3600)
 
+# Give each request its own identity map for student/event lookups
+from utils.identity_map import IdentityMapMiddleware
+app.add_middleware(IdentityMapMiddleware)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Configure templates
-templates = Jinja2Templates(directory="templates")
+templates = get_templates()
 
 # Error handlers
 @app.exception_handler(HTTPException)
@@ -125,6 +134,7 @@ async def internal_server_error_handler(request: Request, exc):
 from routes.admin import router as admin_router
 from routes.client import router as client_router
 from routes.auth import router as auth_router
+from dependencies.auth import require_admin
 
 # Mount routes in correct order (most specific first)
 app.include_router(admin_router)   # Admin routes including /admin/...
@@ -133,29 +143,49 @@ app.include_router(client_router)  # Client routes at /client/...
 
 # Global variable to keep scheduler task alive
 scheduler_task = None
+# Background task that refreshes the platform statistics snapshot
+statistics_task = None
 
 @app.on_event("startup")
 async def startup_db_client():
-    global scheduler_task
+    global scheduler_task, statistics_task
+    
+    # Compile all page and email templates before the first request
+    from utils.template_environment import precompile_templates
+    precompile_templates()
+    
     await Database.connect_db()
     
-    # Initialize SMTP connection pool
-    from utils.smtp_pool import smtp_pool
-    logger.info("SMTP Connection Pool initialized for high-performance email delivery")
+    # Start the shared email transport (one SMTP pool and executor per process)
+    from utils.email_transport import email_transport
+    await email_transport.start()
+    
+    # Load the student counter used by template contexts
+    from utils.student_counter import student_counter
+    await student_counter.start()
     
     # Initialize dynamic event scheduler with background task
     await start_dynamic_scheduler()
     print("Started Dynamic Event Scheduler - updates triggered by event timing")
     
-    # Start certificate email queue
+    # Start certificate email queue (the outbox workers also deliver queued confirmation emails)
+    from utils.transactional_email import transactional_emails  # registers its outbox handler
     from utils.email_queue import certificate_email_queue
     await certificate_email_queue.start()
     print("Started Certificate Email Queue - background processing for email delivery")
     
+    # Preload certificate templates so certificate-day traffic does no template disk I/O
+    from utils.certificate_template_cache import preload_certificate_templates
+    await preload_certificate_templates()
+    
     # Create a background task to keep scheduler alive
     import asyncio
     from utils.dynamic_event_scheduler import dynamic_scheduler
     scheduler_task = asyncio.create_task(keep_scheduler_alive())
+    
+    # Refresh platform statistics in the background instead of per homepage view
+    from utils.scheduled_tasks import refresh_platform_statistics
+    statistics_task = asyncio.create_task(refresh_platform_statistics())
       # Verify scheduler is running
     from utils.dynamic_event_scheduler import get_scheduler_status
     status = await get_scheduler_status()
@@ -182,20 +212,30 @@ async def keep_scheduler_alive():
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    global scheduler_task
+    global scheduler_task, statistics_task
     if scheduler_task:
         scheduler_task.cancel()
+    if statistics_task:
+        statistics_task.cancel()
     await stop_dynamic_scheduler()
     
+    # Stop student counter reconciliation
+    from utils.student_counter import student_counter
+    await student_counter.stop()
+    
     # Stop certificate email queue
     from utils.email_queue import certificate_email_queue
     await certificate_email_queue.stop()
     print("Stopped Certificate Email Queue")
     
-    # Shutdown SMTP connection pool
-    from utils.smtp_pool import smtp_pool
-    smtp_pool.shutdown()
-    print("Stopped SMTP Connection Pool")
+    # Shutdown the shared email transport (SMTP pools and executor)
+    from utils.email_transport import email_transport
+    await email_transport.shutdown()
+    print("Stopped Email Transport")
+    
+    # Close shared cache backend connections
+    from utils.cache import close_cache
+    await close_cache()
     
     await Database.close_db()
 
@@ -205,11 +245,11 @@ async def read_root(request: Request):
     try:
         # Get template context including student authentication status
         from utils.template_context import get_template_context
-        from utils.event_status_manager import EventStatusManager
+        from utils.event_catalog import event_catalog
         from datetime import datetime
-          # Get events and update their status
-        upcoming_events = await EventStatusManager.get_available_events("upcoming")
-        ongoing_events = await EventStatusManager.get_available_events("ongoing")
+        # Get events from the status-partitioned event catalog
+        upcoming_events = await event_catalog.get_events("upcoming")
+        ongoing_events = await event_catalog.get_events("ongoing")
         
         # Sort by relevant dates and limit to 3 events each for homepage
         current_date = datetime.now()
@@ -285,6 +325,56 @@ async def scheduler_health():
     status = await get_scheduler_status()
     return status
 
+@app.get("/health/event-catalog")
+async def event_catalog_health():
+    """Event catalog and rendered fragment cache statistics"""
+    from utils.event_catalog import event_catalog
+    from utils.fragment_cache import fragment_cache
+    return {
+        **event_catalog.get_stats(),
+        "fragment_cache": fragment_cache.get_stats()
+    }
+
+@app.get("/health/cache")
+async def cache_health():
+    """Cache backend and per-namespace hit-rate statistics"""
+    from utils.cache import get_cache_stats
+    return get_cache_stats()
+
+@app.get("/health/email-outbox")
+async def email_outbox_health():
+    """Email outbox backlog depth, oldest pending age and delivery counters"""
+    from utils.email_queue import certificate_email_queue
+    from utils.transactional_email import transactional_emails
+    return {
+        **await certificate_email_queue.get_outbox_stats(),
+        "transactional": transactional_emails.get_stats()
+    }
+
+@app.get("/health/mail-merge", dependencies=[Depends(require_admin)])
+async def mail_merge_health():
+    """Throughput and failures of recent bulk mail merge campaigns"""
+    from utils.mail_merge import mail_merge
+    return mail_merge.get_stats()
+
+@app.get("/health/scheduler/metrics")
+async def scheduler_metrics(format: str = "json"):
+    """Scheduler lag and throughput metrics (JSON, or Prometheus text with ?format=prometheus)"""
+    from fastapi.responses import PlainTextResponse
+    from utils.dynamic_event_scheduler import get_scheduler_metrics
+    if format == "prometheus":
+        return PlainTextResponse(get_scheduler_metrics("prometheus"), media_type="text/plain; version=0.0.4")
+    return get_scheduler_metrics()
+
+@app.get("/health/email/metrics", dependencies=[Depends(require_admin)])
+async def email_delivery_metrics(format: str = "json"):
+    """Email stage timings, delivery latency and outcomes per email type (JSON, or Prometheus text with ?format=prometheus)"""
+    from fastapi.responses import PlainTextResponse
+    from utils.email_metrics import email_metrics
+    if format == "prometheus":
+        return PlainTextResponse(email_metrics.get_metrics_prometheus(), media_type="text/plain; version=0.0.4")
+    return email_metrics.get_metrics()
+
 # Mount special routes for certificate assets with shortened paths
 @app.get("/logo/{filename:path}")
 async def serve_logo(filename: str):
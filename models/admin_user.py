@@ -25,6 +25,7 @@ class AdminUser(BaseModel):
     # Event-specific permissions for Event Admins
     assigned_events: Optional[List[str]] = Field(default=[], description="Event IDs that this admin can manage (for Event Admins)")
     permissions: Optional[List[str]] = Field(default=[], description="Specific permissions granted to this admin")
+    assignments_version: int = Field(default=0, description="Bumped whenever assigned_events changes; used to refresh cached admin sessions")
     
     @validator('role')
     def validate_role(cls, v):
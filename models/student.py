@@ -12,6 +12,7 @@ class EventParticipation(BaseModel):
     feedback_id: Optional[str] = Field(default=None, description="Generated feedback ID when feedback is submitted")
     certificate_id: Optional[str] = Field(default=None, description="Generated certificate ID when certificate is issued")
     certificate_email_sent: bool = Field(default=False, description="Track if certificate email was sent to prevent duplicate emails")
+    certificate_email_state: Optional[str] = Field(default=None, description="Certificate email delivery: pending/sending/sent/failed")
     
     # Payment tracking for paid events
     payment_id: Optional[str] = Field(default=None, description="Payment ID for paid events")
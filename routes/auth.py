@@ -1,19 +1,27 @@
 from fastapi import APIRouter, Request, HTTPException, status
-from fastapi.templating import Jinja2Templates
+from utils.template_environment import get_templates
 from fastapi.responses import RedirectResponse
 from models.admin_user import AdminUser, AdminRole
 from datetime import datetime
 from utils.db_operations import DatabaseOperations
 from passlib.context import CryptContext
-from typing import Union
+from typing import Dict, Union
 import logging
+import time
 
 router = APIRouter(prefix="/auth")  # Add prefix here
-templates = Jinja2Templates(directory="templates")
+templates = get_templates()
 logger = logging.getLogger(__name__)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# How long (seconds) an admin session is trusted before re-reading the users collection.
+# The refresh time is stored in each session, so every session (device) refreshes on its own.
+ADMIN_SESSION_REFRESH_TTL = 30
+
+# username -> latest assignments_version written by this process
+_admin_assignment_versions: Dict[str, int] = {}
+
 async def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -86,6 +94,35 @@ async def get_current_admin(request: Request) -> AdminUser:
             detail="Invalid session data"
         )
 
+async def bump_admin_assignments_version(username: str) -> int:
+    """
+    Record that an admin's assigned events changed.
+    
+    Must be called by every code path in the application that modifies assigned_events,
+    so that the admin's sessions handled by this process refresh on their next request.
+    Writers outside the application (scripts) $inc assignments_version in the same update;
+    sessions pick that up within ADMIN_SESSION_REFRESH_TTL.
+    """
+    updated_admin = await DatabaseOperations.find_one_and_update(
+        "users",
+        {"username": username},
+        {"$inc": {"assignments_version": 1}}
+    )
+    version = (updated_admin or {}).get("assignments_version", 0)
+    _admin_assignment_versions[username] = version
+    return version
+
+def _admin_session_is_current(admin_data: dict) -> bool:
+    """Check whether the session's admin data can be used without re-reading the database"""
+    refreshed_at = admin_data.get("refreshed_at")
+    if not isinstance(refreshed_at, (int, float)):
+        return False
+    
+    session_version = admin_data.get("assignments_version", 0)
+    if _admin_assignment_versions.get(admin_data.get("username"), session_version) != session_version:
+        return False
+    return 0 <= (time.time() - refreshed_at) < ADMIN_SESSION_REFRESH_TTL
+
 async def refresh_admin_session(request: Request) -> AdminUser:
     """Refresh admin session data from database to get latest assigned events"""
     admin_data = request.session.get("admin")
@@ -95,6 +132,10 @@ async def refresh_admin_session(request: Request) -> AdminUser:
             detail="Admin not logged in"
         )
     
+    # Reuse this session's data while it was refreshed within the TTL and its assignments_version is current
+    if _admin_session_is_current(admin_data):
+        return AdminUser(**admin_data)
+    
     # Get fresh admin data from database
     fresh_admin = await DatabaseOperations.find_one(
         "users", 
@@ -112,12 +153,21 @@ async def refresh_admin_session(request: Request) -> AdminUser:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Admin account no longer active"
         )
-      # Update session with fresh data but keep login_time
-    # Convert ObjectId to string for JSON serialization
-    session_data = dict(fresh_admin)
-    if "_id" in session_data:
-        session_data["_id"] = str(session_data["_id"])
-    session_data["login_time"] = admin_data.get("login_time")
+    
+    # Replace the admin data only when it actually changed
+    if (fresh_admin.get("assignments_version", 0) != admin_data.get("assignments_version", 0)
+            or fresh_admin.get("assigned_events") != admin_data.get("assigned_events")
+            or fresh_admin.get("role") != admin_data.get("role")
+            or fresh_admin.get("permissions") != admin_data.get("permissions")):
+        # Update session with fresh data but keep login_time
+        # Convert ObjectId to string for JSON serialization
+        session_data = dict(fresh_admin)
+        if "_id" in session_data:
+            session_data["_id"] = str(session_data["_id"])
+        session_data["login_time"] = admin_data.get("login_time")
+    else:
+        session_data = dict(admin_data)
+    session_data["refreshed_at"] = time.time()
     request.session["admin"] = session_data
     
     return AdminUser(**fresh_admin)
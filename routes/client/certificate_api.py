@@ -9,6 +9,7 @@ from fastapi import APIRouter, Request, HTTPException, Depends
 from dependencies.auth import require_student_login, get_current_student
 from models.student import Student
 from utils.db_operations import DatabaseOperations
+from utils.certificate_template_cache import certificate_template_cache
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -45,18 +46,31 @@ async def get_certificate_data_api(request: Request, student: Student = Depends(
 
 @router.post("/send-certificate-email")
 async def send_certificate_email_api(request: Request, student: Student = Depends(require_student_login)):
-    """API endpoint to send certificate email from JavaScript-generated PDF (only once per student per event)"""
+    """
+    API endpoint to send certificate email from JavaScript-generated PDF (only once per student per event)
+    
+    Accepts the PDF as a raw application/pdf body (event_id, enrollment_no and file_name in the
+    query string) or as JSON with a pdf_base64 field.
+    """
     try:
         from utils.email_queue import certificate_email_queue
         from utils.db_operations import DatabaseOperations
         
-        data = await request.json()
+        # The PDF arrives either as raw binary (fields in the query string) or as base64 in JSON
+        content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        pdf_bytes = None
+        pdf_base64 = None
+        if content_type in ("application/pdf", "application/octet-stream"):
+            data = request.query_params
+            pdf_bytes = await request.body()
+        else:
+            data = await request.json()
+            pdf_base64 = data.get("pdf_base64")
         event_id = data.get("event_id")
         enrollment_no = data.get("enrollment_no")
-        pdf_base64 = data.get("pdf_base64")
         file_name = data.get("file_name")
         
-        if not all([event_id, enrollment_no, pdf_base64, file_name]):
+        if not all([event_id, enrollment_no, pdf_bytes or pdf_base64, file_name]):
             return {"success": False, "message": "All fields are required"}
         
         # Verify the logged-in student matches the requested enrollment
@@ -88,7 +102,8 @@ async def send_certificate_email_api(request: Request, student: Student = Depend
             student_email=student_doc.get("email", ""),
             event_title=event_doc.get("event_name", ""),
             pdf_base64=pdf_base64,
-            file_name=file_name
+            file_name=file_name,
+            pdf_bytes=pdf_bytes
         )
         
         if success:
@@ -162,15 +177,12 @@ async def get_certificate_template(event_id: str, current_student: dict = Depend
         # Construct the full template path
         template_path = Path(certificate_template)
         
-        # Check if the file exists
-        if not template_path.exists():
+        # Read the template content from the certificate template cache
+        try:
+            template_content = await certificate_template_cache.get_source(template_path)
+        except FileNotFoundError:
             logger.error(f"Certificate template not found: {template_path}")
             return {"success": False, "message": f"Certificate template file not found: {certificate_template}"}
-        
-        # Read the template content
-        try:
-            with open(template_path, 'r', encoding='utf-8') as file:
-                template_content = file.read()
         except Exception as read_error:
             logger.error(f"Error reading template file: {str(read_error)}")
             return {"success": False, "message": f"Error reading template file: {str(read_error)}"}
@@ -246,14 +258,11 @@ async def test_certificate_template(event_id: str):
         # Construct the full template path
         template_path = Path(certificate_template)
         
-        # Check if the file exists
-        if not template_path.exists():
-            return {"success": False, "message": f"Certificate template file not found: {certificate_template}", "path_checked": str(template_path)}
-        
-        # Read the template content
+        # Read the template content from the certificate template cache
         try:
-            with open(template_path, 'r', encoding='utf-8') as file:
-                template_content = file.read()
+            template_content = await certificate_template_cache.get_source(template_path)
+        except FileNotFoundError:
+            return {"success": False, "message": f"Certificate template file not found: {certificate_template}", "path_checked": str(template_path)}
         except Exception as read_error:
             return {"success": False, "message": f"Error reading template file: {str(read_error)}"}
         
@@ -274,7 +283,7 @@ async def get_email_queue_stats(current_student: dict = Depends(get_current_stud
     """Get email queue statistics (for debugging/monitoring)"""
     try:
         from utils.email_queue import certificate_email_queue
-        stats = certificate_email_queue.get_stats()
+        stats = await certificate_email_queue.get_outbox_stats()
         return {"success": True, "stats": stats}
     except Exception as e:
         logger.error(f"Error getting email queue stats: {str(e)}")
@@ -2,11 +2,11 @@ import warnings
 import re
 import logging
 from fastapi import APIRouter, Request, HTTPException, Response, Depends, status, Form
-from fastapi.templating import Jinja2Templates
+from utils.template_environment import get_templates
 from fastapi.responses import RedirectResponse, HTMLResponse
 from datetime import datetime, timedelta
 from utils.db_operations import DatabaseOperations
-from utils.email_service import EmailService
+from utils.email_service import email_service
 from models.registration import RegistrationForm
 from models.student import Student
 from models.attendance import AttendanceRecord
@@ -14,6 +14,8 @@ from config.database import Database
 from bson import ObjectId
 from utils.template_context import get_template_context
 from utils.statistics import StatisticsManager
+from utils.student_counter import student_counter
+from utils.certificate_template_cache import certificate_template_cache
 from dependencies.auth import require_student_login, get_current_student, get_current_student_optional
 
 # Configure logging
@@ -23,18 +25,17 @@ logger = logging.getLogger(__name__)
 warnings.filterwarnings("ignore", message=".*error reading bcrypt version.*")
 
 router = APIRouter()  # Removed prefix="/client" since the parent router already has this prefix
-templates = Jinja2Templates(directory="templates")
-email_service = EmailService()
+templates = get_templates()
 
 @router.get("/")
 async def index(request: Request):
     """Render the client homepage with upcoming and ongoing events"""
     try:
-        from utils.event_status_manager import EventStatusManager
+        from utils.event_catalog import event_catalog
 
-        # Get events and update their status
-        upcoming_events = await EventStatusManager.get_available_events("upcoming")
-        ongoing_events = await EventStatusManager.get_available_events("ongoing")
+        # Get events from the status-partitioned event catalog
+        upcoming_events = await event_catalog.get_events("upcoming")
+        ongoing_events = await event_catalog.get_events("ongoing")
         
         # Convert datetime strings to datetime objects and sort by relevant dates
         current_date = datetime.now()
@@ -77,12 +78,8 @@ async def index(request: Request):
         upcoming_events.sort(key=lambda x: safe_sort_key(x, 'start_datetime'))
         ongoing_events.sort(key=lambda x: safe_sort_key(x, 'end_datetime'))
         
-        # Calculate event type counts for the homepage
-        all_events = upcoming_events + ongoing_events
-        event_type_counts = {}
-        for event in all_events:
-            event_type = event.get('event_type', 'other').lower()
-            event_type_counts[event_type] = event_type_counts.get(event_type, 0) + 1
+        # Event type counts are precomputed by the catalog
+        event_type_counts = await event_catalog.get_event_type_counts()
         
         # Get real platform statistics from database
         platform_stats = await StatisticsManager.get_platform_statistics()
@@ -147,7 +144,7 @@ async def index(request: Request):
 async def list_events(request: Request, filter: str = "upcoming"):
     """Client-side event listing page"""
     try:
-        from utils.event_status_manager import EventStatusManager
+        from utils.event_catalog import event_catalog
         
         # Get events based on filter - Only allow upcoming and ongoing for client side
         filter = filter.lower()
@@ -156,12 +153,12 @@ async def list_events(request: Request, filter: str = "upcoming"):
         
         if filter == "all":
             # For client side, "all" means upcoming + ongoing (exclude completed)
-            upcoming_events = await EventStatusManager.get_available_events("upcoming")
-            ongoing_events = await EventStatusManager.get_available_events("ongoing")
+            upcoming_events = await event_catalog.get_events("upcoming")
+            ongoing_events = await event_catalog.get_events("ongoing")
             events = upcoming_events + ongoing_events
         else:
             # Get specific type of events (upcoming or ongoing only)
-            events = await EventStatusManager.get_available_events(filter)        # Convert datetime strings to datetime objects for sorting and processing
+            events = await event_catalog.get_events(filter)        # Convert datetime strings to datetime objects for sorting and processing
         current_date = datetime.now()
         
         for i, event in enumerate(events):
@@ -203,27 +200,9 @@ async def list_events(request: Request, filter: str = "upcoming"):
             # Don't sort if there's an error
             pass
             
-        # Get all events to calculate dynamic filter categories
+        # Event type counts (upcoming + ongoing) are precomputed by the catalog
         try:
-            all_upcoming = await EventStatusManager.get_available_events("upcoming")
-            all_ongoing = await EventStatusManager.get_available_events("ongoing")
-            all_events = all_upcoming + all_ongoing
-            
-            # Convert datetime strings to datetime objects for all events
-            for event in all_events:
-                for date_field in ["start_datetime", "end_datetime", "registration_start_date", "registration_end_date"]:
-                    if isinstance(event.get(date_field), str):
-                        try:
-                            event[date_field] = datetime.fromisoformat(event[date_field].replace('Z', '+00:00'))
-                        except (ValueError, AttributeError):
-                            event[date_field] = current_date  # Fallback to current date                elif event.get(date_field) is None:
-                    event[date_field] = current_date  # Handle None values
-            
-            # Calculate event type counts
-            event_type_counts = {}
-            for event in all_events:
-                event_type = event.get('event_type', 'other').lower()
-                event_type_counts[event_type] = event_type_counts.get(event_type, 0) + 1
+            event_type_counts = await event_catalog.get_event_type_counts()
         except Exception as counts_error:
             logger.warning(f"Error calculating event type counts: {counts_error}")
             event_type_counts = {}
@@ -1031,6 +1010,7 @@ async def student_register(request: Request):
         # Save to database
         result = await DatabaseOperations.insert_one("students", student_data)
         if result:
+            student_counter.increment()
             template_context = await get_template_context(request)
             return templates.TemplateResponse(
                 "auth/register.html",
@@ -1546,15 +1526,12 @@ async def get_certificate_template(event_id: str, current_student: Student = Dep
         # Construct the full template path
         template_path = Path(certificate_template)
         
-        # Check if the file exists
-        if not template_path.exists():
+        # Read the template content from the certificate template cache
+        try:
+            template_content = await certificate_template_cache.get_source(template_path)
+        except FileNotFoundError:
             logger.error(f"Certificate template not found: {template_path}")
             return {"success": False, "message": f"Certificate template file not found: {certificate_template}"}
-        
-        # Read the template content
-        try:
-            with open(template_path, 'r', encoding='utf-8') as file:
-                template_content = file.read()
         except Exception as read_error:
             logger.error(f"Error reading template file: {str(read_error)}")
             return {"success": False, "message": f"Error reading template file: {str(read_error)}"}
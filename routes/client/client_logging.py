@@ -7,14 +7,14 @@ throughout the client routes module.
 
 import logging
 from fastapi import Request
-from fastapi.templating import Jinja2Templates
+from utils.template_environment import get_templates
 from typing import Dict, Any, Optional
 
 # Get logger for client routes
 logger = logging.getLogger('routes.client')
 
 # Configure templates
-templates = Jinja2Templates(directory="templates")
+templates = get_templates()
 
 def log_route_error(route_name: str, error: Exception, details: Optional[Dict[str, Any]] = None) -> None:
     """
@@ -2,12 +2,13 @@
 import warnings
 import re
 from fastapi import APIRouter, Request, HTTPException, Response, Depends, status
-from fastapi.templating import Jinja2Templates
+from utils.template_environment import get_templates
 from fastapi.responses import RedirectResponse
 from datetime import datetime, timedelta
 from utils.db_operations import DatabaseOperations
 from utils.event_status_manager import EventStatusManager
-from utils.email_service import EmailService
+from utils.email_service import email_service
+from utils.transactional_email import transactional_emails
 from models.registration import RegistrationForm
 from models.team_registration import TeamRegistrationForm, TeamParticipant, TeamValidationResult
 from models.student import Student, EventParticipation
@@ -18,8 +19,7 @@ from utils.id_generator import generate_registration_id, generate_team_registrat
 from dependencies.auth import require_student_login
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
-email_service = EmailService()
+templates = get_templates()
 
 
 async def validate_team_participants(enrollment_numbers: list) -> TeamValidationResult:
@@ -540,18 +540,22 @@ async def save_individual_registration(registration: RegistrationForm, event_id:
             "student_data": student.model_dump()
         })
 
-    # Send registration confirmation email for free events
+    # Queue the registration confirmation email for free events (sent in the background)
     try:
-        await email_service.send_registration_confirmation(
+        delivered = await transactional_emails.enqueue_or_send(
+            "send_registration_confirmation",
+            idempotency_key=f"registration_confirmation:{registration_id}",
             student_email=registration.email,
             student_name=registration.full_name,
             event_title=event.get("event_name", event_id),
-            event_date=event.get("start_datetime"),
+            start_datetime=event.get("start_datetime"),
             event_venue=event.get("venue"),
             registration_id=registration_id
         )
+        if not delivered:
+            print(f"Registration confirmation email for {registration_id} could not be queued or sent")
     except Exception as e:
-        print(f"Failed to send registration confirmation email: {str(e)}")
+        print(f"Failed to queue registration confirmation email: {str(e)}")
         # Continue with the response even if email fails
 
     # Return success response
@@ -687,28 +691,28 @@ async def save_team_registration(team_registration: TeamRegistrationForm, event_
             "student_data": student.model_dump()
         })    # Send registration confirmation emails for free team events
     try:
-        # Send email to team leader
-        await email_service.send_registration_confirmation(
-            student_email=team_registration.email,
-            student_name=team_registration.full_name,
-            event_title=event.get("event_name", event_id),
-            event_date=event.get("start_datetime"),
-            event_venue=event.get("venue"),
-            registration_id=team_registration_id
-        )
-          # Send emails to team participants
-        for participant in team_registration.team_participants:
-            if participant.email:  # Only send if email is available
-                await email_service.send_registration_confirmation(
-                    student_email=participant.email,
-                    student_name=participant.full_name,
-                    event_title=event.get("event_name", event_id),
-                    event_date=event.get("start_datetime"),
-                    event_venue=event.get("venue"),
-                    registration_id=team_registration_id
-                )
+        # Queue emails to the team leader and participants (sent in the background)
+        recipients = [(team_registration.enrollment_no, team_registration.email, team_registration.full_name)]
+        recipients += [
+            (participant.enrollment_no, participant.email, participant.full_name)
+            for participant in team_registration.team_participants
+            if participant.email  # Only send if email is available
+        ]
+        for enrollment_no, email, full_name in recipients:
+            delivered = await transactional_emails.enqueue_or_send(
+                "send_registration_confirmation",
+                idempotency_key=f"registration_confirmation:{team_registration_id}:{enrollment_no}",
+                student_email=email,
+                student_name=full_name,
+                event_title=event.get("event_name", event_id),
+                start_datetime=event.get("start_datetime"),
+                event_venue=event.get("venue"),
+                registration_id=team_registration_id
+            )
+            if not delivered:
+                print(f"Registration confirmation email for {enrollment_no} ({team_registration_id}) could not be queued or sent")
     except Exception as e:
-        print(f"Failed to send team registration confirmation emails: {str(e)}")
+        print(f"Failed to queue team registration confirmation emails: {str(e)}")
         # Continue with the response even if email fails
 
     # For free events, show success page directly
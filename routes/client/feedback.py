@@ -1,21 +1,20 @@
 """Event feedback and certificate routes."""
 from fastapi import APIRouter, Request, HTTPException, Response, Depends, status
-from fastapi.templating import Jinja2Templates
+from utils.template_environment import get_templates
 from fastapi.responses import RedirectResponse
 from datetime import datetime
 from models.student import Student
 from models.feedback import EventFeedback
 from config.database import Database
 from utils.db_operations import DatabaseOperations
-from utils.email_service import EmailService
+from utils.transactional_email import transactional_emails
 from dependencies.auth import require_student_login
 from utils.event_status_manager import EventStatusManager
 from models.event import EventSubStatus
 from utils.id_generator import generate_feedback_id
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
-email_service = EmailService()
+templates = get_templates()
 
 @router.get("/events/{event_id}/feedback")
 async def show_feedback_form(request: Request, event_id: str, student: Student = Depends(require_student_login)):
@@ -319,16 +318,20 @@ async def submit_feedback(request: Request, event_id: str, student: Student = De
             {"$set": {f"event_participations.{event_id}.feedback_id": feedback_id}}
         )
 
-        # Send feedback confirmation email
+        # Queue the feedback confirmation email (sent in the background)
         try:
-            await email_service.send_feedback_confirmation(
+            delivered = await transactional_emails.enqueue_or_send(
+                "send_feedback_confirmation",
+                idempotency_key=f"feedback_confirmation:{feedback_id}",
                 student_email=student_data.get("email"),
                 student_name=student_data.get("full_name"),
                 event_title=event.get("event_name", event_id),
                 event_date=event.get("start_datetime")
             )
+            if not delivered:
+                print(f"Feedback confirmation email for {feedback_id} could not be queued or sent")
         except Exception as e:
-            print(f"Failed to send feedback confirmation email: {str(e)}")
+            print(f"Failed to queue feedback confirmation email: {str(e)}")
             # Continue even if email fails
         
         # Create registration object for template
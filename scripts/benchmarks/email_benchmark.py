@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Email throughput benchmark
+
+Drives the application's certificate email paths against the local SMTP sink
+and reports messages/second, p50/p95/p99 latency and connection churn for each
+driver and concurrency level.
+
+Drivers:
+- optimized:     OptimizedEmailService.send_certificate_notification
+- email_service: EmailService.send_certificate_notification (including its retries)
+- queue:         CertificateEmailQueue end to end through the MongoDB outbox. This
+                 writes benchmark students and outbox messages (removed afterwards),
+                 so it only runs with --allow-db-writes against a disposable MongoDB
+                 given by MONGODB_URL
+
+Attachments are the PDFs found in --pdf-dir (data/ by default). When there are
+none, certificate-sized PDFs are generated from the certificate templates in
+data/. Recipients come from data/test_students.json with their addresses moved
+to the reserved .invalid domain, so nothing can be delivered even if the
+benchmark is pointed at a real server. The queue driver stores them as students
+with synthetic BENCH-... enrollment numbers and deletes exactly the documents it
+inserted, so existing students are never touched.
+
+Usage:
+    python scripts/benchmarks/email_benchmark.py --drivers optimized email_service --messages 200 --concurrency 1 10 50 --latency-ms 20 --fail-rate 0.02
+    MONGODB_URL=mongodb://localhost:27018 python scripts/benchmarks/email_benchmark.py --drivers queue --allow-db-writes
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import re
+import sys
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List
+
+# Add the project root to the Python path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+# Settings require these; the queue driver needs MONGODB_URL to point at a disposable database
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+
+from scripts.benchmarks.smtp_sink import SMTPSink, start_sink_thread
+from utils.async_smtp import async_smtp_pool
+from utils.email_attachments import EmailAttachment
+from utils.email_transport import email_transport
+from utils.metrics import Histogram
+from utils.smtp_pool import smtp_pool
+from utils.smtp_rate_limiter import ProviderLimits, smtp_rate_limiter
+
+SENDER = "benchmark@campusconnect.local"
+DATA_DIR = os.path.join(PROJECT_ROOT, "data")
+EVENT_TITLE = "Campus Team Hackathon Challenge 2025"
+
+@dataclass
+class Recipient:
+    name: str
+    email: str
+    enrollment_no: str
+
+@dataclass
+class RunResult:
+    driver: str
+    concurrency: int
+    messages: int
+    sent: int
+    elapsed: float
+    latency: Histogram
+    sessions: int
+    rejected: int
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    def row(self) -> str:
+        snapshot = self.latency.snapshot()
+        percentiles = [f"{(snapshot[key] or 0) * 1000:>9.1f}" for key in ("p50", "p95", "p99")]
+        per_session = self.sent / self.sessions if self.sessions else 0.0
+        return (f"{self.driver:<15}{self.concurrency:>6}{self.messages_per_second:>10.1f}{''.join(percentiles)}"
+                f"{self.sessions:>10}{per_session:>10.1f}{self.rejected:>10}{self.messages - self.sent:>8}")
+
+HEADER = (f"{'driver':<15}{'conc':>6}{'msgs/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'sessions':>10}{'msgs/sess':>10}{'4xx':>10}{'failed':>8}")
+
+# --- Test data ---
+
+def _pdf_object(number: int, body: bytes) -> bytes:
+    return f"{number} 0 obj\n".encode("ascii") + body + b"\nendobj\n"
+
+def make_certificate_pdf(lines: List[str], size_kb: int) -> bytes:
+    """A valid single-page PDF with the certificate text, padded to size_kb with an
+    incompressible image stream (real certificates embed logos, signatures and fonts)"""
+    text = "BT /F1 18 Tf 72 720 Td " + " ".join(
+        f"({line.replace('(', '').replace(')', '')}) Tj 0 -24 Td" for line in lines[:20]
+    ) + " ET"
+    content = zlib.compress(text.encode("latin-1", errors="replace"))
+    image = os.urandom(max(0, size_kb * 1024 - len(content) - 1024))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 842 595] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> /XObject << /Im1 6 0 R >> >> >>",
+        f"<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n".encode("ascii") + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        f"<< /Type /XObject /Subtype /Image /Width 1 /Height {len(image)} /ColorSpace /DeviceGray "
+        f"/BitsPerComponent 8 /Length {len(image)} >>\nstream\n".encode("ascii") + image + b"\nendstream",
+    ]
+
+    pdf = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += _pdf_object(number, body)
+    xref_offset = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("ascii")
+    for offset in offsets:
+        pdf += f"{offset:010d} 00000 n \n".encode("ascii")
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("ascii")
+    return bytes(pdf)
+
+def load_pdfs(pdf_dir: str, size_kb: int) -> List[EmailAttachment]:
+    """PDFs from pdf_dir, or PDFs generated from the certificate templates in data/"""
+    paths = sorted(glob.glob(os.path.join(pdf_dir, "**", "*.pdf"), recursive=True))
+    if paths:
+        return [EmailAttachment.from_path(path, "application/pdf") for path in paths]
+
+    pdfs = []
+    for template_path in sorted(glob.glob(os.path.join(DATA_DIR, "*.html"))):
+        with open(template_path, encoding="utf-8") as template_file:
+            text = re.sub(r"<(style|script)[^>]*>.*?</\1>", " ", template_file.read(), flags=re.S)
+        lines = [line.strip() for line in re.sub(r"<[^>]+>", "\n", text).splitlines() if line.strip()]
+        name = os.path.splitext(os.path.basename(template_path))[0]
+        pdfs.append(EmailAttachment.pdf(f"certificate_{name}.pdf", make_certificate_pdf(lines, size_kb)))
+    return pdfs
+
+def load_recipients(count: int) -> List[Recipient]:
+    """Students from data/test_students.json, repeated to `count`, on the .invalid domain"""
+    with open(os.path.join(DATA_DIR, "test_students.json"), encoding="utf-8") as students_file:
+        students = json.load(students_file)["student_registration"]
+    recipients = []
+    for index in range(count):
+        student = students[index % len(students)]
+        local_part = student["email"].split("@", 1)[0]
+        recipients.append(Recipient(
+            name=student["full_name"],
+            email=f"{local_part}+{index}@campusconnect.invalid",
+            enrollment_no=f"BENCH{index:06d}"
+        ))
+    return recipients
+
+# --- Drivers ---
+
+def point_pools_at(sink: SMTPSink):
+    for pool in (smtp_pool, async_smtp_pool):
+        pool.smtp_server = "127.0.0.1"
+        pool.smtp_port = sink.port
+        pool.email_user = SENDER
+        pool.email_password = "benchmark"
+        pool.from_email = SENDER
+
+async def run_direct(send: Callable[[int], Awaitable[bool]], messages: int, concurrency: int):
+    """Call send(index) `messages` times with at most `concurrency` in flight"""
+    latency = Histogram("email_benchmark_latency_seconds", window_size=max(messages, 1))
+    remaining = iter(range(messages))
+    sent = 0
+
+    async def sender():
+        nonlocal sent
+        for index in remaining:
+            start = time.perf_counter()
+            if await send(index):
+                sent += 1
+            latency.observe(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(sender() for _ in range(concurrency)))
+    return sent, time.perf_counter() - start, latency
+
+def certificate_sender(service, recipients: List[Recipient], pdfs: List[EmailAttachment]):
+    async def send(index: int) -> bool:
+        recipient = recipients[index]
+        return await service.send_certificate_notification(
+            student_email=recipient.email,
+            student_name=recipient.name,
+            event_title=EVENT_TITLE,
+            certificate_url="/client/events/BENCHMARK/certificate",
+            certificate_attachment=pdfs[index % len(pdfs)]
+        )
+    return send
+
+async def drive_optimized(recipients, pdfs, messages, concurrency):
+    from utils.optimized_email_service import optimized_email_service
+    return await run_direct(certificate_sender(optimized_email_service, recipients, pdfs), messages, concurrency)
+
+async def drive_email_service(recipients, pdfs, messages, concurrency):
+    from utils.email_service import email_service
+    return await run_direct(certificate_sender(email_service, recipients, pdfs), messages, concurrency)
+
+async def drive_queue(recipients, pdfs, messages, concurrency, timeout: float = 600):
+    """Enqueue certificate emails and wait for the outbox workers to deliver them"""
+    from bson import ObjectId
+    from config.database import Database
+    from utils.db_operations import DatabaseOperations
+    from utils.email_outbox import OUTBOX_COLLECTION
+    from utils.email_queue import certificate_email_queue
+
+    await Database.connect_db()
+    outbox = certificate_email_queue.outbox
+    # Retries against the sink should not wait minutes
+    outbox.base_retry_delay, outbox.max_retry_delay = 0.5, 5.0
+    outbox.max_workers = concurrency
+
+    run_id = int(time.time())
+    event_id = f"BENCHMARK_{run_id}"
+    # Synthetic enrollment numbers, so the queue's student updates cannot hit real students
+    batch = [
+        Recipient(name=recipient.name, email=recipient.email, enrollment_no=f"BENCH-{run_id}-{index}")
+        for index, recipient in enumerate(recipients[:messages])
+    ]
+    keys = [certificate_email_queue.idempotency_key(recipient.enrollment_no, event_id) for recipient in batch]
+    student_ids = []
+    try:
+        for recipient in batch:
+            student_id = await DatabaseOperations.insert_one("students", {
+                "enrollment_no": recipient.enrollment_no,
+                "full_name": recipient.name,
+                "email": recipient.email,
+                # Certificate emails are only queued for an existing participation
+                "event_participations": {event_id: {"registration_id": f"{event_id}_{recipient.enrollment_no}", "registration_type": "individual"}}
+            })
+            if student_id:
+                student_ids.append(ObjectId(student_id))
+
+        start_sent, start_dead = outbox.stats["total_sent"], outbox.stats["total_dead"]
+        start = time.perf_counter()
+        for index, recipient in enumerate(batch):
+            pdf = pdfs[index % len(pdfs)]
+            await certificate_email_queue.add_certificate_email(
+                event_id, recipient.enrollment_no, recipient.name, recipient.email,
+                EVENT_TITLE, None, pdf.filename, pdf_bytes=pdf.data
+            )
+        await certificate_email_queue.start()
+
+        deadline = time.monotonic() + timeout
+        while (outbox.stats["total_sent"] - start_sent + outbox.stats["total_dead"] - start_dead < len(batch)
+               and time.monotonic() < deadline):
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        await certificate_email_queue.stop()
+
+        # Enqueue-to-delivery latency as recorded by the outbox
+        latency = Histogram("email_benchmark_latency_seconds", window_size=max(messages, 1))
+        delivered = await DatabaseOperations.find_many(OUTBOX_COLLECTION, {"_id": {"$in": keys}, "status": "sent"})
+        for message in delivered:
+            latency.observe((message["sent_at"] - message["created_at"]).total_seconds())
+        return len(delivered), elapsed, latency
+
+    finally:
+        await certificate_email_queue.stop()
+        # Only the documents this run inserted
+        for student_id in student_ids:
+            await DatabaseOperations.delete_one("students", {"_id": student_id})
+        for key in keys:
+            await DatabaseOperations.delete_one(OUTBOX_COLLECTION, {"_id": key})
+        await Database.close_db()
+
+DRIVERS = {
+    "optimized": drive_optimized,
+    "email_service": drive_email_service,
+    "queue": drive_queue,
+}
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark the email services against a local SMTP sink")
+    parser.add_argument("--drivers", nargs="+", choices=list(DRIVERS), default=["optimized", "email_service"])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--transport", choices=["asyncio", "smtplib"], help="Override SMTP_TRANSPORT")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Sink delay per reply (simulated round trip)")
+    parser.add_argument("--fail-rate", type=float, default=0, help="Fraction of messages the sink refuses with --fail-code")
+    parser.add_argument("--fail-code", type=int, default=451)
+    parser.add_argument("--pdf-dir", default=DATA_DIR, help="Directory with certificate PDFs to attach")
+    parser.add_argument("--pdf-kb", type=int, default=150, help="Size of generated PDFs when --pdf-dir has none")
+    parser.add_argument("--allow-db-writes", action="store_true", help="Required for the queue driver")
+    args = parser.parse_args()
+
+    if "queue" in args.drivers and not args.allow_db_writes:
+        parser.error("the queue driver writes to MongoDB; pass --allow-db-writes with MONGODB_URL set to a disposable database")
+
+    # The sink has no sending limits; measure the email paths, not the provider pacing
+    smtp_rate_limiter.configure(ProviderLimits(per_minute=60_000_000, burst=1_000_000))
+    sink = start_sink_thread(latency_ms=args.latency_ms, fail_rate=args.fail_rate, fail_code=args.fail_code, seed=42)
+    point_pools_at(sink)
+    if args.transport:
+        email_transport.transport = args.transport
+        email_transport.pool = async_smtp_pool if args.transport == "asyncio" else smtp_pool
+
+    pdfs = load_pdfs(args.pdf_dir, args.pdf_kb)
+    recipients = load_recipients(args.messages)
+    print(f"{len(pdfs)} certificate PDFs ({sum(pdf.size for pdf in pdfs) // len(pdfs) // 1024} KB average), "
+          f"{email_transport.transport} transport, sink latency {args.latency_ms:.0f}ms, fail rate {args.fail_rate:.1%}")
+    print(HEADER)
+
+    for concurrency in args.concurrency:
+        for driver in args.drivers:
+            sink.reset_stats()
+            sent, elapsed, latency = await DRIVERS[driver](recipients, pdfs, args.messages, concurrency)
+            result = RunResult(driver, concurrency, args.messages, sent, elapsed, latency,
+                               sink.stats.sessions, sink.stats.rejected)
+            print(result.row())
+            # Every run starts with a cold pool so session counts are comparable
+            await email_transport.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
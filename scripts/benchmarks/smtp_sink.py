@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Local SMTP sink for email benchmarks
+
+An asyncio SMTP server on localhost that accepts every message and throws it away.
+It advertises PIPELINING and AUTH PLAIN/LOGIN (any credentials are accepted) and
+counts sessions and messages so benchmarks can report connection churn. An optional
+per-reply delay stands in for the network round trip to a real provider, and a
+fraction of messages can be refused with a temporary (4xx) reply to exercise
+retries and rate-limit backoff.
+
+Run standalone:
+    python scripts/benchmarks/smtp_sink.py --port 8025 --latency-ms 50 --fail-rate 0.05
+"""
+
+import argparse
+import asyncio
+import random
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+@dataclass
+class SinkStats:
+    sessions: int = 0
+    messages: int = 0
+    rejected: int = 0
+    bytes_received: int = 0
+
+class SMTPSink:
+    """Minimal SMTP server that discards messages"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0,
+                 fail_rate: float = 0.0, fail_code: int = 451, seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.latency = latency_ms / 1000
+        # Fraction of messages refused at the end of DATA with fail_code
+        self.fail_rate = fail_rate
+        self.fail_code = fail_code
+        self._random = random.Random(seed)
+        self.stats = SinkStats()
+        self._server = None
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle_session, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def reset_stats(self):
+        self.stats = SinkStats()
+
+    async def _handle_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats.sessions += 1
+
+        def reply(line: str):
+            writer.write(line.encode("ascii") + b"\r\n")
+
+        try:
+            reply("220 localhost CampusConnect benchmark sink")
+            await writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                verb = line.decode("utf-8", errors="replace").strip().split(" ", 1)[0].upper()
+
+                if verb == "EHLO":
+                    reply("250-localhost")
+                    reply("250-PIPELINING")
+                    reply("250-8BITMIME")
+                    reply("250 AUTH PLAIN LOGIN")
+                elif verb == "HELO":
+                    reply("250 localhost")
+                elif verb == "AUTH":
+                    if line.strip().upper() == b"AUTH LOGIN":
+                        # Username and password prompts
+                        reply("334 VXNlcm5hbWU6")
+                        await writer.drain()
+                        await reader.readline()
+                        reply("334 UGFzc3dvcmQ6")
+                        await writer.drain()
+                        await reader.readline()
+                    reply("235 Authentication successful")
+                elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                    reply("250 OK")
+                elif verb == "DATA":
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    await writer.drain()
+                    while True:
+                        data_line = await reader.readline()
+                        if not data_line or data_line == b".\r\n":
+                            break
+                        self.stats.bytes_received += len(data_line)
+                    if self.fail_rate and self._random.random() < self.fail_rate:
+                        self.stats.rejected += 1
+                        reply(f"{self.fail_code} 4.3.0 Temporary failure, try again later")
+                        if self.fail_code == 421:
+                            # 421 means the server is closing the session
+                            await writer.drain()
+                            break
+                    else:
+                        self.stats.messages += 1
+                        reply("250 Queued")
+                elif verb == "QUIT":
+                    reply("221 Bye")
+                    await writer.drain()
+                    break
+                else:
+                    reply("502 Command not implemented")
+
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+def start_sink_thread(**sink_options) -> SMTPSink:
+    """Run a sink on its own event loop thread so it does not share CPU time with the client loop"""
+    sink = SMTPSink(**sink_options)
+    ready = threading.Event()
+    loop = asyncio.new_event_loop()
+
+    async def serve():
+        await sink.start()
+        ready.set()
+
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(serve(), loop)
+    ready.wait()
+    return sink
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run a local SMTP sink")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay before each reply")
+    parser.add_argument("--fail-rate", type=float, default=0, help="Fraction of messages refused with --fail-code")
+    parser.add_argument("--fail-code", type=int, default=451, help="Temporary failure reply code (e.g. 421, 451, 452)")
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.host, args.port, args.latency_ms, args.fail_rate, args.fail_code)
+    port = await sink.start()
+    print(f"SMTP sink listening on {args.host}:{port} (Ctrl+C to stop)")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            print(f"sessions={sink.stats.sessions} messages={sink.stats.messages} "
+                  f"rejected={sink.stats.rejected} bytes={sink.stats.bytes_received}")
+    finally:
+        await sink.stop()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
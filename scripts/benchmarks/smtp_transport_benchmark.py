@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+SMTP transport benchmark
+
+Sends the same message through the smtplib thread-pool transport (SMTPConnectionPool
+behind a 2-worker executor, as OptimizedEmailService used to) and the asyncio
+transport (AsyncSMTPConnectionPool) against the local SMTP sink, and reports
+messages/second at each concurrency level.
+
+Usage:
+    python scripts/benchmarks/smtp_transport_benchmark.py --messages 500 --concurrency 1 10 50 --latency-ms 20
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+# Settings require these even though the benchmark never touches the database
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+
+from scripts.benchmarks.smtp_sink import start_sink_thread
+from utils.async_smtp import AsyncSMTPConnectionPool
+from utils.smtp_pool import SMTPConnectionPool
+from utils.smtp_rate_limiter import ProviderLimits, smtp_rate_limiter
+
+SENDER = "benchmark@campusconnect.local"
+RECIPIENT = "student@campusconnect.local"
+
+def build_message(size_kb: int) -> str:
+    message = MIMEMultipart("alternative")
+    message["Subject"] = "Registration Confirmed - Benchmark Event"
+    message["From"] = SENDER
+    message["To"] = RECIPIENT
+    message.attach(MIMEText("<p>" + "x" * (size_kb * 1024) + "</p>", "html"))
+    return message.as_string()
+
+def point_at_sink(pool, port: int):
+    pool.smtp_server = "127.0.0.1"
+    pool.smtp_port = port
+    pool.email_user = SENDER
+    pool.email_password = "benchmark"
+    pool.from_email = SENDER
+
+async def run_concurrently(send, messages: int, concurrency: int) -> float:
+    """Send `messages` emails with at most `concurrency` in flight; return elapsed seconds"""
+    remaining = iter(range(messages))
+
+    async def sender():
+        for _ in remaining:
+            if not await send():
+                raise RuntimeError("send failed")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(sender() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+async def benchmark_smtplib(port: int, message: str, messages: int, concurrency: int) -> float:
+    pool = SMTPConnectionPool()
+    point_at_sink(pool, port)
+    executor = ThreadPoolExecutor(max_workers=2)
+    loop = asyncio.get_running_loop()
+    try:
+        return await run_concurrently(
+            lambda: loop.run_in_executor(executor, pool.send_email_with_pool, RECIPIENT, message),
+            messages, concurrency
+        )
+    finally:
+        executor.shutdown()
+        pool.shutdown()
+
+async def benchmark_asyncio(port: int, message: str, messages: int, concurrency: int) -> float:
+    pool = AsyncSMTPConnectionPool()
+    point_at_sink(pool, port)
+    try:
+        return await run_concurrently(lambda: pool.send_email_with_pool(RECIPIENT, message), messages, concurrency)
+    finally:
+        await pool.shutdown()
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare SMTP transports against a local sink")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--size-kb", type=int, default=20, help="Approximate HTML body size")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Sink delay per reply (simulated round trip)")
+    args = parser.parse_args()
+
+    # The sink has no sending limits; measure the transports, not the provider pacing
+    smtp_rate_limiter.configure(ProviderLimits(per_minute=60_000_000, burst=1_000_000))
+    sink = start_sink_thread(latency_ms=args.latency_ms)
+    port = sink.port
+    message = build_message(args.size_kb)
+    transports = [("smtplib (2 threads)", benchmark_smtplib), ("asyncio", benchmark_asyncio)]
+
+    print(f"{'transport':<22}{'concurrency':>12}{'msgs/sec':>12}{'sessions':>10}")
+    for concurrency in args.concurrency:
+        for label, benchmark in transports:
+            sink.reset_stats()
+            elapsed = await benchmark(port, message, args.messages, concurrency)
+            print(f"{label:<22}{concurrency:>12}{args.messages / elapsed:>12.1f}{sink.stats.sessions:>10}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -62,7 +62,8 @@ async def migrate_admin_roles():
                 result = await DatabaseOperations.update_one(
                     "users", 
                     {"_id": admin["_id"]}, 
-                    {"$set": update_data}
+                    # Bumping assignments_version makes logged-in sessions reload the admin's access
+                    {"$set": update_data, "$inc": {"assignments_version": 1}}
                 )
                 
                 if result:
@@ -36,7 +36,8 @@ async def upgrade_to_super_admin():
         
         result = await db["users"].update_one(
             {"username": "SHIV2808"},
-            {"$set": update_data}
+            # Bumping assignments_version makes logged-in sessions reload the admin's access
+            {"$set": update_data, "$inc": {"assignments_version": 1}}
         )
         
         if result.modified_count > 0:
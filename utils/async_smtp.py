@@ -0,0 +1,459 @@
+"""
+Asyncio-native SMTP Connection Pool
+
+This module provides an SMTP client written directly on asyncio streams and a
+connection pool with the same interface as SMTPConnectionPool, so email can be
+sent from the event loop without handing every message to a small thread pool.
+
+Features:
+- STARTTLS (or implicit TLS on port 465) and AUTH PLAIN/LOGIN
+- Command pipelining (MAIL/RCPT/DATA in one round trip) when the server
+  advertises PIPELINING
+- Keep-alive connections reused across messages, with RSET after a failed
+  transaction instead of reconnecting
+- At most pool_size sessions are open; extra senders wait for a free connection
+  (up to SMTP_POOL_CHECKOUT_TIMEOUT), and SMTP_POOL_MIN_IDLE are opened at startup
+- Sends paced by the shared provider-aware rate limiter
+- NOOP health checks on connections that have been idle for a while
+- Connection recycling and statistics compatible with SMTPConnectionPool
+"""
+
+import asyncio
+import base64
+import logging
+import socket
+import ssl
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple, Union
+
+from config.settings import get_settings
+from utils.smtp_pool import CheckoutStats, ConnectionStats, LOCAL_SMTP_HOSTS, SMTPPoolTimeout
+from utils.smtp_rate_limiter import smtp_rate_limiter
+from utils.email_metrics import email_metrics
+
+logger = logging.getLogger(__name__)
+
+# Connections idle for longer than this are NOOP-checked before reuse
+IDLE_CHECK_SECONDS = 30
+
+
+class SMTPResponseError(Exception):
+    """An SMTP command received an unexpected reply"""
+
+    def __init__(self, code: int, message: str, command: str = ""):
+        self.code = code
+        self.message = message
+        self.command = command
+        super().__init__(f"{command} failed: {code} {message}" if command else f"{code} {message}")
+
+    @property
+    def is_temporary(self) -> bool:
+        """4xx replies (including 421 service closing) are worth retrying later"""
+        return 400 <= self.code < 500
+
+class AsyncSMTPConnection:
+    """A single SMTP session over asyncio streams"""
+
+    def __init__(self, smtp_server: str, smtp_port: int, email_user: str, email_password: str,
+                 timeout: float = 30.0, use_tls: Optional[bool] = None):
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.email_user = email_user
+        self.email_password = email_password
+        self.timeout = timeout
+        # Implicit TLS is the convention on port 465; everything else upgrades with STARTTLS
+        self.use_tls = smtp_port == 465 if use_tls is None else use_tls
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.extensions: Dict[str, str] = {}
+        self.created_at = time.time()
+        self.last_used = time.time()
+        self.email_count = 0
+        self.is_healthy = False
+        self.connection_id = id(self)
+
+    @property
+    def supports_pipelining(self) -> bool:
+        return "pipelining" in self.extensions
+
+    async def _read_reply(self) -> Tuple[int, str]:
+        """Read one (possibly multi-line) reply"""
+        lines = []
+        while True:
+            line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+            if not line:
+                raise ConnectionError("SMTP server closed the connection")
+            line = line.decode("utf-8", errors="replace").rstrip("\r\n")
+            lines.append(line[4:])
+            if len(line) < 4 or line[3] != "-":
+                try:
+                    return int(line[:3]), "\n".join(lines)
+                except ValueError:
+                    raise ConnectionError(f"Malformed SMTP reply: {line!r}")
+
+    async def _command(self, command: str, expected: Tuple[int, ...] = (250,),
+                       label: Optional[str] = None) -> Tuple[int, str]:
+        """Send a command and check the reply code; label replaces the command text in errors"""
+        self.writer.write(command.encode("utf-8") + b"\r\n")
+        await self.writer.drain()
+        code, message = await self._read_reply()
+        if code not in expected:
+            raise SMTPResponseError(code, message, label or command.split(" ", 1)[0])
+        return code, message
+
+    async def _ehlo(self):
+        code, message = await self._command(f"EHLO {socket.getfqdn()}")
+        self.extensions = {}
+        for line in message.split("\n")[1:]:
+            keyword, _, params = line.partition(" ")
+            self.extensions[keyword.lower()] = params
+
+    async def _starttls(self, context: ssl.SSLContext):
+        await self._command("STARTTLS", expected=(220,))
+        await asyncio.wait_for(
+            self.writer.start_tls(context, server_hostname=self.smtp_server), self.timeout
+        )
+        # Capabilities must be re-read over the encrypted channel
+        await self._ehlo()
+
+    async def _login(self):
+        mechanisms = self.extensions.get("auth", "").upper().split()
+        if "PLAIN" in mechanisms or not mechanisms:
+            token = base64.b64encode(f"\0{self.email_user}\0{self.email_password}".encode("utf-8")).decode("ascii")
+            await self._command(f"AUTH PLAIN {token}", expected=(235,), label="AUTH")
+        else:
+            # Credentials are never echoed into errors or logs
+            await self._command("AUTH LOGIN", expected=(334,))
+            await self._command(base64.b64encode(self.email_user.encode("utf-8")).decode("ascii"), expected=(334,), label="AUTH")
+            await self._command(base64.b64encode(self.email_password.encode("utf-8")).decode("ascii"), expected=(235,), label="AUTH")
+
+    async def connect(self) -> bool:
+        """Open the session: greeting, EHLO, STARTTLS and AUTH"""
+        try:
+            logger.debug(f"Creating async SMTP connection {self.connection_id}")
+            context = ssl.create_default_context()
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    self.smtp_server, self.smtp_port,
+                    ssl=context if self.use_tls else None,
+                    server_hostname=self.smtp_server if self.use_tls else None
+                ),
+                self.timeout
+            )
+
+            code, message = await self._read_reply()
+            if code != 220:
+                raise SMTPResponseError(code, message, "CONNECT")
+
+            await self._ehlo()
+            if not self.use_tls:
+                if "starttls" in self.extensions:
+                    await self._starttls(context)
+                elif self.smtp_server not in LOCAL_SMTP_HOSTS:
+                    # Plaintext sessions are only allowed to a local server (e.g. the benchmark SMTP sink)
+                    raise ConnectionError(f"{self.smtp_server} does not offer STARTTLS")
+            if self.email_user:
+                await self._login()
+
+            self.is_healthy = True
+            self.last_used = time.time()
+            logger.info(f"Async SMTP connection {self.connection_id} established successfully")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to create async SMTP connection {self.connection_id}: {str(e)}")
+            self.is_healthy = False
+            await self.close()
+            return False
+
+    async def test_health(self) -> bool:
+        """Test if connection is still healthy"""
+        if not self.writer or not self.is_healthy:
+            return False
+
+        try:
+            await self._command("NOOP")
+            return True
+        except Exception as e:
+            logger.warning(f"Async connection {self.connection_id} health check failed: {str(e)}")
+            self.is_healthy = False
+            return False
+
+    @staticmethod
+    def _encode_message(message: Union[str, bytes]) -> bytes:
+        """Normalise line endings to CRLF and dot-stuff the DATA payload"""
+        if isinstance(message, str):
+            message = message.encode("utf-8")
+        lines = message.replace(b"\r\n", b"\n").replace(b"\r", b"\n").split(b"\n")
+        if lines and lines[-1] == b"":
+            lines.pop()
+        return b"".join((b"." + line if line.startswith(b".") else line) + b"\r\n" for line in lines) + b".\r\n"
+
+    async def send_email(self, from_email: str, to_email: Union[str, List[str]], message: Union[str, bytes]) -> bool:
+        """Send one message over this session (raises SMTPResponseError on rejection)"""
+        if not self.is_healthy or not self.writer:
+            return False
+
+        recipients = [to_email] if isinstance(to_email, str) else list(to_email)
+        payload = self._encode_message(message)
+        envelope = [f"MAIL FROM:<{from_email}>"] + [f"RCPT TO:<{recipient}>" for recipient in recipients]
+
+        try:
+            if self.supports_pipelining:
+                # One write for the whole envelope, then read the replies in order
+                self.writer.write("".join(f"{command}\r\n" for command in envelope + ["DATA"]).encode("utf-8"))
+                await self.writer.drain()
+                replies = [await self._read_reply() for _ in range(len(envelope) + 1)]
+                for command, (code, reply) in zip(envelope, replies):
+                    if code not in (250, 251):
+                        raise SMTPResponseError(code, reply, command.split(":", 1)[0])
+                data_code, data_reply = replies[-1]
+                if data_code != 354:
+                    raise SMTPResponseError(data_code, data_reply, "DATA")
+            else:
+                for command in envelope:
+                    await self._command(command, expected=(250, 251))
+                await self._command("DATA", expected=(354,))
+
+            self.writer.write(payload)
+            await self.writer.drain()
+            code, reply = await self._read_reply()
+            if code != 250:
+                raise SMTPResponseError(code, reply, "DATA")
+
+            self.last_used = time.time()
+            self.email_count += 1
+            return True
+
+        except SMTPResponseError as e:
+            # The session itself is still usable after a rejected transaction
+            logger.error(f"Message rejected on async connection {self.connection_id}: {str(e)}")
+            if e.code == 421:
+                # 421: the server is closing the session
+                self.is_healthy = False
+            else:
+                await self._reset()
+            raise
+        except Exception as e:
+            logger.error(f"Failed to send email via async connection {self.connection_id}: {str(e)}")
+            self.is_healthy = False
+            return False
+
+    async def _reset(self):
+        """Abort a rejected transaction so the session can carry the next message"""
+        try:
+            await self._command("RSET")
+        except Exception:
+            self.is_healthy = False
+
+    async def close(self):
+        """Send QUIT and close the stream"""
+        if self.writer:
+            try:
+                if self.is_healthy:
+                    self.writer.write(b"QUIT\r\n")
+                    await asyncio.wait_for(self.writer.drain(), 5)
+                self.writer.close()
+                await asyncio.wait_for(self.writer.wait_closed(), 5)
+            except Exception:
+                pass  # Connection might already be closed
+            finally:
+                self.reader = None
+                self.writer = None
+                self.is_healthy = False
+                logger.debug(f"Async SMTP connection {self.connection_id} closed")
+
+    def should_recycle(self, max_age_seconds: int = 3600, max_emails: int = 100) -> bool:
+        """Check if connection should be recycled"""
+        age = time.time() - self.created_at
+        return (age > max_age_seconds or
+                self.email_count > max_emails or
+                not self.is_healthy)
+
+class AsyncSMTPConnectionPool:
+    """SMTP connection pool for the event loop, interface-compatible with SMTPConnectionPool"""
+
+    def __init__(self, pool_size: Optional[int] = None):
+        self.settings = get_settings()
+
+        # Configuration
+        self.smtp_server = self.settings.SMTP_SERVER
+        self.smtp_port = self.settings.SMTP_PORT
+        self.email_user = self.settings.EMAIL_USER
+        self.email_password = self.settings.EMAIL_PASSWORD
+        self.from_email = self.settings.FROM_EMAIL or self.email_user
+
+        # Pool configuration
+        self.pool_size = pool_size or self.settings.SMTP_POOL_SIZE  # Maximum number of open connections
+        self.min_idle = min(self.settings.SMTP_POOL_MIN_IDLE, self.pool_size)  # Opened by warm_up()
+        self.checkout_timeout = self.settings.SMTP_POOL_CHECKOUT_TIMEOUT
+        self.max_connection_age = 3600  # 1 hour max connection age
+        self.max_emails_per_connection = 100  # Recycle after 100 emails
+
+        # Pool state (LIFO so the most recently used, warmest connection is reused first)
+        self.pool: List[AsyncSMTPConnection] = []
+        # Senders beyond pool_size wait for a connection instead of opening (and churning) more sessions
+        self._slots = asyncio.Semaphore(self.pool_size)
+        self.stats = ConnectionStats()
+        self.stats.pool_size = self.pool_size
+        self.checkout_stats = CheckoutStats()
+        self.rejected_messages = 0
+
+        logger.info(f"Async SMTP Connection Pool initialized: {self.smtp_server}:{self.smtp_port}, pool_size={self.pool_size}")
+
+    async def _create_connection(self) -> Optional[AsyncSMTPConnection]:
+        """Create a new SMTP connection"""
+        conn = AsyncSMTPConnection(
+            self.smtp_server,
+            self.smtp_port,
+            self.email_user,
+            self.email_password
+        )
+
+        if await conn.connect():
+            self.stats.total_connections_created += 1
+            self.stats.active_connections += 1
+            return conn
+        self.stats.failed_connections += 1
+        return None
+
+    async def _discard(self, conn: AsyncSMTPConnection):
+        await conn.close()
+        self.stats.total_connections_closed += 1
+        self.stats.active_connections -= 1
+
+    async def _checkout_idle(self) -> Optional[AsyncSMTPConnection]:
+        """Take the most recently used idle connection that is still healthy"""
+        while self.pool:
+            conn = self.pool.pop()
+            if conn.should_recycle(self.max_connection_age, self.max_emails_per_connection):
+                await self._discard(conn)
+                continue
+            # Only pay a NOOP round trip when the server may have dropped an idle session
+            if time.time() - conn.last_used > IDLE_CHECK_SECONDS and not await conn.test_health():
+                await self._discard(conn)
+                continue
+            return conn
+        return None
+
+    async def _acquire_slot(self, timeout: Optional[float]):
+        """Wait (in arrival order) for one of the pool_size connection slots"""
+        if not self._slots.locked():
+            await self._slots.acquire()
+            self.checkout_stats.record(0.0, queued=False)
+            return
+
+        start = time.monotonic()
+        self.checkout_stats.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.checkout_timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            self.checkout_stats.timeouts += 1
+            raise SMTPPoolTimeout(f"No SMTP connection free after {time.monotonic() - start:.1f}s ({self.pool_size} in use)")
+        finally:
+            self.checkout_stats.waiting -= 1
+        self.checkout_stats.record(time.monotonic() - start, queued=True)
+
+    async def _release(self, conn: AsyncSMTPConnection):
+        """Return a connection to the idle list, or close it if unhealthy or due for recycling"""
+        if (conn.is_healthy and
+                not conn.should_recycle(self.max_connection_age, self.max_emails_per_connection)):
+            self.pool.append(conn)
+        else:
+            await self._discard(conn)
+
+    @asynccontextmanager
+    async def get_connection(self, timeout: Optional[float] = None):
+        """Get a connection from the pool (async context manager), waiting up to timeout for a free one"""
+        checkout_start = time.perf_counter()
+        await self._acquire_slot(timeout)
+        try:
+            conn = await self._checkout_idle()
+            if conn is None:
+                conn = await self._create_connection()
+                if conn is None:
+                    raise Exception("Failed to create SMTP connection")
+
+            self.stats.connections_in_use += 1
+            email_metrics.observe("checkout", time.perf_counter() - checkout_start)
+            try:
+                yield conn
+            finally:
+                self.stats.connections_in_use -= 1
+                await self._release(conn)
+        finally:
+            self._slots.release()
+
+    async def warm_up(self, min_idle: Optional[int] = None) -> int:
+        """Open connections until min_idle are idle; returns how many were opened"""
+        target = min(self.min_idle if min_idle is None else min_idle, self.pool_size)
+        opened = 0
+        while len(self.pool) < target and not self._slots.locked():
+            await self._slots.acquire()
+            try:
+                conn = await self._create_connection()
+                if conn is None:
+                    break
+                await self._release(conn)
+                opened += 1
+            finally:
+                self._slots.release()
+
+        logger.info(f"Async SMTP connection pool warmed up: {opened} new connection(s), {len(self.pool)} idle")
+        return opened
+
+    async def send_email_with_pool(self, to_email: str, message: Union[str, bytes]) -> bool:
+        """Send email using connection pool"""
+        try:
+            # Pace sends to the provider's limits before taking a connection
+            await smtp_rate_limiter.acquire()
+            async with self.get_connection() as conn:
+                with email_metrics.time_stage("smtp"):
+                    success = await conn.send_email(self.from_email, to_email, message)
+                if success:
+                    smtp_rate_limiter.record_success()
+                    self.stats.total_emails_sent += 1
+                    logger.debug(f"Email sent successfully to {to_email} via async connection {conn.connection_id}")
+                return success
+        except SMTPResponseError as e:
+            self.rejected_messages += 1
+            if e.is_temporary:
+                smtp_rate_limiter.record_throttle(e.code)
+            logger.error(f"Failed to send email to {to_email}: {str(e)}")
+            return False
+        except Exception as e:
+            logger.error(f"Failed to send email to {to_email}: {str(e)}")
+            return False
+
+    def get_stats(self) -> Dict:
+        """Get connection pool statistics"""
+        return {
+            "transport": "asyncio",
+            "total_connections_created": self.stats.total_connections_created,
+            "total_connections_closed": self.stats.total_connections_closed,
+            "total_emails_sent": self.stats.total_emails_sent,
+            "rejected_messages": self.rejected_messages,
+            "active_connections": self.stats.active_connections,
+            "pool_size": self.stats.pool_size,
+            "current_pool_size": len(self.pool),
+            "connections_in_use": self.stats.connections_in_use,
+            "failed_connections": self.stats.failed_connections,
+            "pool_utilization": f"{(self.stats.connections_in_use / self.pool_size * 100):.1f}%",
+            "min_idle": self.min_idle,
+            "checkout_timeout": self.checkout_timeout,
+            "checkout": self.checkout_stats.to_dict(),
+            "rate_limit": smtp_rate_limiter.get_stats()
+        }
+
+    async def shutdown(self):
+        """Gracefully shutdown the connection pool"""
+        logger.info("Shutting down async SMTP connection pool")
+
+        while self.pool:
+            await self._discard(self.pool.pop())
+
+        logger.info("Async SMTP connection pool shutdown complete")
+
+# Global async pool instance
+async_smtp_pool = AsyncSMTPConnectionPool()
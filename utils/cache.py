@@ -0,0 +1,526 @@
+"""
+Pluggable Cache Layer
+
+Common cache abstraction for application caches (event catalog data, statistics,
+admin sessions, rendered fragments) that works for a single worker and for several
+workers or nodes.
+
+Features:
+- Async get/set/delete/get_many/incr API with per-entry TTLs
+- InProcessLRUBackend: per-process LRU with byte-size accounting
+- RedisBackend: shared network cache speaking the Redis protocol (RESP) directly
+  over asyncio streams, with a small connection pool
+- Namespaced Cache wrapper with stampede protection: concurrent misses for a key
+  share one recompute (single-flight), and on shared backends a short lock key
+  keeps other workers from recomputing at the same time
+- Hit/miss/recompute statistics per namespace
+- SingleFlight helper used by the data layer to coalesce identical concurrent reads
+
+Backend selection comes from settings: CACHE_BACKEND ("memory" or "redis") and
+CACHE_URL (e.g. redis://localhost:6379/0).
+"""
+
+import asyncio
+import functools
+import logging
+import pickle
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+class CacheBackend:
+    """Interface implemented by cache backends (keys are already namespaced)"""
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    async def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Set a key only if it does not exist; returns True if it was set"""
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {}
+
+class InProcessLRUBackend(CacheBackend):
+    """LRU cache held in this process, bounded by entry count and serialized size"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (expires_at or None, serialized value)
+        self._entries: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+
+    def _expires_at(self, ttl: Optional[float]) -> Optional[float]:
+        return time.monotonic() + ttl if ttl else None
+
+    def _live_entry(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return data
+
+    def _remove(self, key: str) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= len(entry[1])
+        return True
+
+    def _store(self, key: str, data: bytes, ttl: Optional[float]):
+        self._remove(key)
+        if len(data) > self.max_bytes:
+            logger.warning(f"Cache value for {key} ({len(data)} bytes) exceeds the cache size limit")
+            return
+        self._entries[key] = (self._expires_at(ttl), data)
+        self._bytes += len(data)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    async def get(self, key: str) -> Optional[Any]:
+        data = self._live_entry(key)
+        return pickle.loads(data) if data is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._store(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ttl)
+
+    async def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        if self._live_entry(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def delete(self, key: str) -> bool:
+        return self._remove(key)
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        found = {}
+        for key in keys:
+            value = await self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        entry = self._entries.get(key)
+        current = await self.get(key)
+        value = int(current or 0) + amount
+        # Keep the original expiry when incrementing an existing counter
+        if entry is not None and current is not None and entry[0] is not None:
+            ttl = max(entry[0] - time.monotonic(), 0.001)
+        await self.set(key, value, ttl)
+        return value
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions
+        }
+
+class RedisProtocolError(Exception):
+    """Error reply or malformed data from the Redis server"""
+
+class _RedisConnection:
+    """Single RESP connection"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    @staticmethod
+    def _encode(*args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, bytes):
+                data = arg
+            else:
+                data = str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    async def _read_reply(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return payload.decode("utf-8")
+        if prefix == b"-":
+            raise RedisProtocolError(payload.decode("utf-8"))
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            data = await self.reader.readexactly(length + 2)
+            return data[:-2]
+        if prefix == b"*":
+            count = int(payload)
+            if count == -1:
+                return None
+            return [await self._read_reply() for _ in range(count)]
+        raise RedisProtocolError(f"Unexpected reply prefix: {line!r}")
+
+    async def execute(self, *args):
+        self.writer.write(self._encode(*args))
+        await self.writer.drain()
+        return await self._read_reply()
+
+    def close(self):
+        self.writer.close()
+
+class RedisBackend(CacheBackend):
+    """Shared cache backend speaking the Redis protocol"""
+
+    name = "redis"
+
+    # Value encoding: pickled objects are prefixed so that counters written by INCRBY
+    # (plain decimal strings) can be told apart
+    _PICKLE_PREFIX = b"\x80p"
+
+    def __init__(self, url: str = "redis://localhost:6379/0", pool_size: int = 10, timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int((parsed.path or "/0").lstrip("/") or 0)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._idle: List[_RedisConnection] = []
+        self._semaphore = asyncio.Semaphore(pool_size)
+        self.errors = 0
+
+    async def _connect(self) -> _RedisConnection:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        connection = _RedisConnection(reader, writer)
+        if self.password:
+            await connection.execute("AUTH", self.password)
+        if self.db:
+            await connection.execute("SELECT", self.db)
+        return connection
+
+    async def _execute(self, *args):
+        async with self._semaphore:
+            connection = self._idle.pop() if self._idle else await self._connect()
+            reusable = False
+            try:
+                result = await asyncio.wait_for(connection.execute(*args), self.timeout)
+                reusable = True
+                return result
+            except RedisProtocolError:
+                reusable = True
+                raise
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                if reusable:
+                    self._idle.append(connection)
+                else:
+                    # The connection state is unknown after a timeout, I/O error or cancellation
+                    connection.close()
+
+    @classmethod
+    def _dumps(cls, value: Any) -> bytes:
+        return cls._PICKLE_PREFIX + pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def _loads(cls, data: Optional[bytes]) -> Optional[Any]:
+        if data is None:
+            return None
+        if data.startswith(cls._PICKLE_PREFIX):
+            return pickle.loads(data[len(cls._PICKLE_PREFIX):])
+        return int(data)
+
+    @staticmethod
+    def _ttl_args(ttl: Optional[float]) -> list:
+        return ["PX", max(1, int(ttl * 1000))] if ttl else []
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self._loads(await self._execute("GET", key))
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self._execute("SET", key, self._dumps(value), *self._ttl_args(ttl))
+
+    async def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        return await self._execute("SET", key, self._dumps(value), "NX", *self._ttl_args(ttl)) == "OK"
+
+    async def delete(self, key: str) -> bool:
+        return bool(await self._execute("DEL", key))
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        values = await self._execute("MGET", *keys)
+        return {key: self._loads(value) for key, value in zip(keys, values) if value is not None}
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        value = await self._execute("INCRBY", key, amount)
+        if ttl and value == amount:
+            # First increment created the key - give it an expiry
+            await self._execute("PEXPIRE", key, max(1, int(ttl * 1000)))
+        return value
+
+    async def ping(self) -> bool:
+        return await self._execute("PING") == "PONG"
+
+    async def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "host": f"{self.host}:{self.port}/{self.db}",
+            "idle_connections": len(self._idle),
+            "pool_size": self.pool_size,
+            "errors": self.errors
+        }
+
+# Named SingleFlight instances, reported by get_cache_stats()
+_single_flights: Dict[str, "SingleFlight"] = {}
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one in-flight computation"""
+
+    def __init__(self, name: Optional[str] = None):
+        self._inflight: Dict[Any, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+        if name:
+            _single_flights[name] = self
+
+    async def do(self, key: Any, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run func for key, or wait for the identical call already in flight"""
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            # Its own task, so a cancelled caller (e.g. a client disconnect) does not cancel the other callers
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._finished, key))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Any, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            self._inflight.pop(key, None)
+        if not task.cancelled():
+            # Callers re-raise it; mark it retrieved in case every caller was cancelled
+            task.exception()
+
+    def forget(self, match: Optional[Callable[[Any], bool]] = None):
+        """
+        Stop new callers from joining matching in-flight calls (e.g. after a write);
+        callers already waiting still receive the original result.
+        """
+        for key in [key for key in self._inflight if match is None or match(key)]:
+            self._inflight.pop(key, None)
+
+    @property
+    def coalescing_ratio(self) -> float:
+        return self.coalesced / self.calls if self.calls else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalescing_ratio": round(self.coalescing_ratio, 4),
+            "in_flight": len(self._inflight)
+        }
+
+class Cache:
+    """Namespaced view of a cache backend with TTL defaults, stampede protection and stats"""
+
+    # How long a worker may hold the shared recompute lock for a key
+    LOCK_TTL = 10.0
+    LOCK_POLL_INTERVAL = 0.05
+
+    def __init__(self, namespace: str, backend: CacheBackend, default_ttl: Optional[float] = None):
+        self.namespace = namespace
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self._single_flight = SingleFlight()
+        self.stats = {"hits": 0, "misses": 0, "sets": 0, "deletes": 0, "recomputes": 0, "errors": 0}
+
+    def _key(self, key: Any) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _ttl(self, ttl: Optional[float]) -> Optional[float]:
+        return self.default_ttl if ttl is None else ttl
+
+    async def get(self, key: Any, default: Any = None) -> Any:
+        try:
+            value = await self.backend.get(self._key(key))
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Cache get failed for {self._key(key)}: {str(e)}")
+            value = None
+        self.stats["hits" if value is not None else "misses"] += 1
+        return default if value is None else value
+
+    async def set(self, key: Any, value: Any, ttl: Optional[float] = None):
+        try:
+            await self.backend.set(self._key(key), value, self._ttl(ttl))
+            self.stats["sets"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Cache set failed for {self._key(key)}: {str(e)}")
+
+    async def delete(self, key: Any) -> bool:
+        try:
+            self.stats["deletes"] += 1
+            return await self.backend.delete(self._key(key))
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Cache delete failed for {self._key(key)}: {str(e)}")
+            return False
+
+    async def get_many(self, keys: Iterable[Any]) -> Dict[Any, Any]:
+        keys = list(keys)
+        try:
+            found = await self.backend.get_many([self._key(key) for key in keys])
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Cache get_many failed in {self.namespace}: {str(e)}")
+            found = {}
+        result = {key: found[self._key(key)] for key in keys if self._key(key) in found}
+        self.stats["hits"] += len(result)
+        self.stats["misses"] += len(keys) - len(result)
+        return result
+
+    async def incr(self, key: Any, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return await self.backend.incr(self._key(key), amount, self._ttl(ttl))
+
+    async def get_or_set(self, key: Any, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        """
+        Get a cached value, computing it with loader on a miss.
+
+        Concurrent misses in this process share one loader call; on shared backends a
+        lock key keeps other workers from recomputing the same value at the same time.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+        return await self._single_flight.do(key, lambda: self._recompute(key, loader, ttl))
+
+    async def _recompute(self, key: Any, loader: Callable[[], Awaitable[Any]], ttl: Optional[float]) -> Any:
+        shared = not isinstance(self.backend, InProcessLRUBackend)
+        lock_key = self._key(f"{key}:lock")
+        have_lock = False
+
+        if shared:
+            try:
+                have_lock = await self.backend.add(lock_key, 1, self.LOCK_TTL)
+            except Exception as e:
+                logger.error(f"Cache lock failed for {lock_key}: {str(e)}")
+                have_lock = True
+
+            if not have_lock:
+                # Another worker is recomputing - wait for its result up to the lock TTL
+                deadline = time.monotonic() + self.LOCK_TTL
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(self.LOCK_POLL_INTERVAL)
+                    value = await self.backend.get(self._key(key))
+                    if value is not None:
+                        self.stats["hits"] += 1
+                        return value
+
+        try:
+            self.stats["recomputes"] += 1
+            value = await loader()
+            if value is not None:
+                await self.set(key, value, ttl)
+            return value
+        finally:
+            if shared and have_lock:
+                try:
+                    await self.backend.delete(lock_key)
+                except Exception:
+                    pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": f"{(self.stats['hits'] / lookups * 100):.1f}%" if lookups else "0.0%",
+            "single_flight": self._single_flight.get_stats()
+        }
+
+_backend: Optional[CacheBackend] = None
+_caches: Dict[str, Cache] = {}
+
+def create_backend(backend_name: str = "memory", url: str = "") -> CacheBackend:
+    """Create a cache backend by name ("memory" or "redis")"""
+    if backend_name == "redis":
+        return RedisBackend(url or "redis://localhost:6379/0")
+    return InProcessLRUBackend()
+
+def get_backend() -> CacheBackend:
+    """Get the process-wide cache backend configured in settings"""
+    global _backend
+    if _backend is None:
+        try:
+            from config.settings import settings
+            backend_name = getattr(settings, "CACHE_BACKEND", "memory")
+            url = getattr(settings, "CACHE_URL", "")
+        except Exception:
+            backend_name, url = "memory", ""
+        _backend = create_backend(backend_name, url)
+        logger.info(f"Cache backend: {_backend.name}")
+    return _backend
+
+def get_cache(namespace: str, default_ttl: Optional[float] = None) -> Cache:
+    """Get (or create) the cache for a namespace"""
+    cache = _caches.get(namespace)
+    if cache is None:
+        cache = Cache(namespace, get_backend(), default_ttl)
+        _caches[namespace] = cache
+    return cache
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Get backend and per-namespace cache statistics"""
+    return {
+        "backend": get_backend().get_stats(),
+        "namespaces": {namespace: cache.get_stats() for namespace, cache in _caches.items()},
+        "single_flight": {name: flight.get_stats() for name, flight in _single_flights.items()}
+    }
+
+async def close_cache():
+    """Close backend connections (application shutdown)"""
+    if _backend is not None:
+        await _backend.close()
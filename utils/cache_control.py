@@ -1,11 +1,34 @@
 """
 Cache Control Utilities
 Provides utilities for managing browser cache behavior, especially for authentication-related pages.
+
+Public event pages get versioned ETags (event catalog version + login state) so that
+browsers can revalidate with If-None-Match and a reverse proxy can serve anonymous
+traffic; authenticated responses stay private. Event detail pages also include the
+event's registration count, since they show registration stats and can_register.
 """
 
-from fastapi import Response
+import hashlib
+import logging
+import re
+import time
+from typing import Optional
+
+from fastapi import Request, Response
 from fastapi.responses import RedirectResponse, HTMLResponse
 
+logger = logging.getLogger(__name__)
+
+# Seconds a shared cache (reverse proxy) may serve an anonymous public page
+PUBLIC_PAGE_S_MAXAGE = 60
+
+# Public pages also show time-relative text (e.g. registration time remaining), so
+# ETags roll over at least this often even when no event changed
+ETAG_TIME_BUCKET_SECONDS = 60
+
+PUBLIC_EVENT_DETAIL_PATH = re.compile(r"^/client/events/(?P<event_id>[^/]+)$")
+PUBLIC_PAGE_PATHS = {"/", "/client", "/client/", "/client/events"}
+
 
 class CacheControl:
     """Utility class for managing cache control headers"""
@@ -40,15 +63,127 @@ class CacheControl:
         return template_response
 
 
+    @staticmethod
+    def public_page(response: Response, etag: str, authenticated: bool) -> Response:
+        """Add ETag/Cache-Control/Vary headers to a public page"""
+        response.headers["ETag"] = etag
+        response.headers["Vary"] = "Cookie"
+        if authenticated:
+            # Personalised render - browsers may revalidate it, shared caches must not store it
+            response.headers["Cache-Control"] = "private, no-cache"
+        else:
+            response.headers["Cache-Control"] = f"public, max-age=0, s-maxage={PUBLIC_PAGE_S_MAXAGE}, must-revalidate"
+        return response
+
+    @staticmethod
+    def not_modified(etag: str, authenticated: bool) -> Response:
+        """Create a 304 Not Modified response for a public page"""
+        return CacheControl.public_page(Response(status_code=304), etag, authenticated)
+
+
+def _session_identity(request: Request) -> Optional[str]:
+    """Identify the logged-in student/admin from the session, or None for anonymous visitors"""
+    session = request.scope.get("session") or {}
+    student = session.get("student")
+    if student:
+        return f"student:{student.get('enrollment_no', '') if isinstance(student, dict) else student}"
+    admin = session.get("admin")
+    if admin:
+        return f"admin:{admin.get('username', '') if isinstance(admin, dict) else admin}"
+    return None
+
+
+def is_public_page(path: str) -> bool:
+    """Check whether a path is a public event page eligible for conditional GET"""
+    return path in PUBLIC_PAGE_PATHS or PUBLIC_EVENT_DETAIL_PATH.match(path) is not None
+
+
+async def _registration_count(event_id: str) -> Optional[int]:
+    """Registrations in the event's collection (what the detail page counts), from collection metadata"""
+    from config.database import Database
+
+    try:
+        event_collection = await Database.get_event_collection(event_id)
+        if event_collection is None:
+            return None
+        return await event_collection.estimated_document_count()
+    except Exception as e:
+        logger.error(f"Error counting registrations for ETag of event {event_id}: {str(e)}")
+        return None
+
+
+async def compute_public_etag(request: Request) -> Optional[str]:
+    """
+    Build a weak ETag for a public page from the data versions it is rendered from:
+    event catalog version (or the single event's version and registration count),
+    login state, homepage statistics and a coarse time bucket.
+
+    Returns None when a version cannot be determined; the page is then served without an ETag.
+    """
+    from utils.event_catalog import event_catalog
+    from utils.statistics import StatisticsManager
+    from utils.student_counter import student_counter
+
+    path = request.url.path
+    detail_match = PUBLIC_EVENT_DETAIL_PATH.match(path)
+    if detail_match:
+        event_id = detail_match.group("event_id")
+        registrations = await _registration_count(event_id)
+        if registrations is None:
+            return None
+        data_version = f"event:{event_id}:{event_catalog.event_version(event_id)}:{registrations}"
+    else:
+        snapshot = StatisticsManager._snapshot or {}
+        data_version = f"catalog:{event_catalog.version}:{snapshot.get('updated_at')}:{student_counter.count}"
+
+    parts = [
+        path,
+        request.url.query,
+        data_version,
+        _session_identity(request) or "anonymous",
+        str(int(time.time() // ETAG_TIME_BUCKET_SECONDS))
+    ]
+    digest = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # Weak comparison: ignore the W/ prefix on either side
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return any((candidate[2:] if candidate.startswith("W/") else candidate) == bare for candidate in candidates)
+
+
 def add_cache_control_middleware(app):
     """Add cache control middleware to the FastAPI app"""
     
     @app.middleware("http")
     async def cache_control_middleware(request, call_next):
+        path = request.url.path
+        
+        # Conditional GET for public event pages: answer 304 before rendering anything
+        if request.method in ("GET", "HEAD") and is_public_page(path):
+            authenticated = _session_identity(request) is not None
+            etag = await compute_public_etag(request)
+            if etag is None:
+                return await call_next(request)
+            if _etag_matches(request.headers.get("if-none-match"), etag):
+                return CacheControl.not_modified(etag, authenticated)
+            
+            response = await call_next(request)
+            # If the data changed while the page rendered, the HTML may come from either
+            # version, so it gets no ETag rather than one that could validate stale content
+            if response.status_code == 200 and await compute_public_etag(request) == etag:
+                response = CacheControl.public_page(response, etag, authenticated)
+            return response
+        
         response = await call_next(request)
         
         # Apply cache control based on request path
-        path = request.url.path
         
         # No cache for authentication-related paths
         if any(auth_path in path for auth_path in ['/login', '/logout', '/auth', '/dashboard']):
@@ -0,0 +1,184 @@
+"""
+Certificate Template Cache
+
+Keeps certificate HTML templates in memory, pre-split at their {{ placeholder }}
+markers, so that certificate requests neither re-read the template from disk nor
+run one str.replace pass per placeholder.
+
+Features:
+- Templates are parsed once into literal segments and placeholder slots; rendering
+  is a single join
+- Entries are validated against the file's mtime/size (at most one stat per entry
+  every few seconds) so edited templates are picked up without a restart
+- LRU bound on the number of cached templates
+- Startup preloading of the bundled and event-configured templates
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import aiofiles
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+@dataclass
+class CompiledCertificateTemplate:
+    """A certificate template split at its placeholders"""
+    path: str
+    source: str
+    mtime: float
+    size: int
+    # Alternating literal segments and placeholders: segments[i] is literal text and
+    # slots[i] is the (name, original marker) that follows it
+    segments: List[str] = field(default_factory=list)
+    slots: List[Tuple[str, str]] = field(default_factory=list)
+    checked_at: float = 0.0
+
+    @classmethod
+    def compile(cls, path: str, source: str, mtime: float, size: int) -> "CompiledCertificateTemplate":
+        segments, slots = [], []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(source):
+            segments.append(source[position:match.start()])
+            slots.append((match.group(1), match.group(0)))
+            position = match.end()
+        segments.append(source[position:])
+        return cls(path=path, source=source, mtime=mtime, size=size, segments=segments, slots=slots,
+                   checked_at=time.monotonic())
+
+    @property
+    def placeholders(self) -> List[str]:
+        return sorted({name for name, _ in self.slots})
+
+    def render(self, values: Dict[str, Any]) -> str:
+        """Substitute placeholders in one pass; unknown placeholders are left untouched"""
+        parts = []
+        for segment, (name, marker) in zip(self.segments, self.slots):
+            parts.append(segment)
+            value = values.get(name)
+            parts.append(marker if value is None else str(value))
+        parts.append(self.segments[-1])
+        return "".join(parts)
+
+class CertificateTemplateCache:
+    """mtime-validated LRU cache of compiled certificate templates"""
+
+    def __init__(self, max_entries: int = 64, stat_interval: float = 5.0):
+        self.max_entries = max_entries
+        self.stat_interval = stat_interval
+        self._entries: "OrderedDict[str, CompiledCertificateTemplate]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        self.stats = {"hits": 0, "misses": 0, "reloads": 0, "evictions": 0}
+
+    @staticmethod
+    def _key(path: Union[str, Path]) -> str:
+        return os.path.normpath(str(path))
+
+    async def _load(self, key: str) -> CompiledCertificateTemplate:
+        try:
+            stat = os.stat(key)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Certificate template not found: {key}")
+
+        async with aiofiles.open(key, 'r', encoding='utf-8') as file:
+            source = await file.read()
+
+        compiled = CompiledCertificateTemplate.compile(key, source, stat.st_mtime, stat.st_size)
+        self._entries[key] = compiled
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+        return compiled
+
+    def _is_current(self, compiled: CompiledCertificateTemplate) -> bool:
+        """Re-stat the file at most once per stat_interval"""
+        now = time.monotonic()
+        if now - compiled.checked_at < self.stat_interval:
+            return True
+        try:
+            stat = os.stat(compiled.path)
+        except FileNotFoundError:
+            return False
+        compiled.checked_at = now
+        return stat.st_mtime == compiled.mtime and stat.st_size == compiled.size
+
+    async def get(self, path: Union[str, Path]) -> CompiledCertificateTemplate:
+        """Get a compiled template, loading or reloading it from disk if needed"""
+        key = self._key(path)
+        compiled = self._entries.get(key)
+        if compiled is not None and self._is_current(compiled):
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return compiled
+
+        async with self._lock:
+            # Another request may have reloaded it while we waited
+            compiled = self._entries.get(key)
+            if compiled is not None and self._is_current(compiled):
+                self.stats["hits"] += 1
+                return compiled
+
+            if compiled is not None:
+                self.stats["reloads"] += 1
+                logger.info(f"Certificate template changed on disk, reloading: {key}")
+            else:
+                self.stats["misses"] += 1
+            self._entries.pop(key, None)
+            return await self._load(key)
+
+    async def get_source(self, path: Union[str, Path]) -> str:
+        """Get the raw template HTML"""
+        return (await self.get(path)).source
+
+    async def render(self, path: Union[str, Path], values: Dict[str, Any]) -> str:
+        """Render a template with the given placeholder values"""
+        return (await self.get(path)).render(values)
+
+    async def preload(self, paths: List[Union[str, Path]]) -> int:
+        """Load templates ahead of the first certificate request"""
+        loaded = 0
+        for path in paths:
+            try:
+                await self.get(path)
+                loaded += 1
+            except Exception as e:
+                logger.warning(f"Could not preload certificate template {path}: {str(e)}")
+        return loaded
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["reloads"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_rate": f"{(self.stats['hits'] / lookups * 100):.1f}%" if lookups else "0.0%",
+            "templates": list(self._entries.keys())
+        }
+
+# Global certificate template cache instance
+certificate_template_cache = CertificateTemplateCache()
+
+async def preload_certificate_templates(data_dir: str = "data") -> int:
+    """Preload bundled templates and every template configured on an event"""
+    from utils.db_operations import DatabaseOperations
+
+    paths: List[Union[str, Path]] = sorted(Path(data_dir).glob("*.html"))
+    try:
+        events = await DatabaseOperations.find_many("events", {"certificate_template": {"$nin": [None, ""]}})
+        paths.extend(event["certificate_template"] for event in events if event.get("certificate_template"))
+    except Exception as e:
+        logger.warning(f"Could not list event certificate templates for preloading: {str(e)}")
+
+    loaded = await certificate_template_cache.preload(list(dict.fromkeys(str(path) for path in paths)))
+    logger.info(f"Preloaded {loaded} certificate templates")
+    return loaded
@@ -1,12 +1,72 @@
 from typing import Dict, List, Optional
 from config.database import Database
+from utils import identity_map
+from utils.cache import SingleFlight
 from bson import ObjectId
+from pymongo import ReturnDocument
+import copy
 import json
 
+DEFAULT_DB_NAME = "CampusConnect"
+
+# Collections whose concurrent identical find_one calls share one round trip
+COALESCED_COLLECTIONS = {"events"}
+
+# In-flight find_one reads keyed by (db_name, collection_name, query)
+_find_one_flight = SingleFlight("find_one")
+
+def _forget_inflight_reads(db_name: str, collection_name: str, query: Dict):
+    """Make reads issued after a write start a fresh query instead of joining an older one"""
+    if collection_name in COALESCED_COLLECTIONS:
+        _find_one_flight.forget(lambda key: key[0] == db_name and key[1] == collection_name)
+    if collection_name == "events" and db_name == DEFAULT_DB_NAME:
+        # Imported here: the event status manager reads events through this module
+        from utils.event_status_manager import _event_lookup_flight
+        event_id = query.get("event_id")
+        if isinstance(event_id, str):
+            _event_lookup_flight.forget(lambda key: key == event_id)
+        else:
+            _event_lookup_flight.forget()
+
+def _invalidate_reads(db_name: str, collection_name: str, query: Dict):
+    """Drop identity-map entries and in-flight reads that a write to the collection can make stale"""
+    if db_name == DEFAULT_DB_NAME:
+        identity_map.evict(collection_name, query)
+    _forget_inflight_reads(db_name, collection_name, query)
+
+def _after_write(db_name: str, collection_name: str, query: Dict):
+    """Invalidate reads, and the event catalog for event writes, once a write has finished"""
+    _invalidate_reads(db_name, collection_name, query)
+    if collection_name == "events" and db_name == DEFAULT_DB_NAME:
+        # Imported here: the catalog loads events through this module
+        from utils.event_catalog import event_catalog
+        event_id = query.get("event_id")
+        event_catalog.invalidate(event_id if isinstance(event_id, str) else None)
+
 class DatabaseOperations:
     @classmethod
     async def find_one(cls, collection_name: str, query: Dict, db_name: str = "CampusConnect") -> Optional[Dict]:
         """Find a single document in the specified collection"""
+        # Students and events already loaded in this request come from the identity map
+        use_identity_map = db_name == DEFAULT_DB_NAME
+        if use_identity_map:
+            document = identity_map.lookup(collection_name, query)
+            if document is not None:
+                return document
+
+        if collection_name in COALESCED_COLLECTIONS:
+            # Concurrent identical reads share one in-flight query; each caller gets its own copy
+            flight_key = (db_name, collection_name, repr(sorted(query.items(), key=lambda item: item[0])))
+            document = await _find_one_flight.do(flight_key, lambda: cls._find_one_from_db(collection_name, query, db_name))
+            document = copy.deepcopy(document)
+        else:
+            document = await cls._find_one_from_db(collection_name, query, db_name)
+        if use_identity_map:
+            identity_map.store(collection_name, query, document)
+        return document
+
+    @classmethod
+    async def _find_one_from_db(cls, collection_name: str, query: Dict, db_name: str) -> Optional[Dict]:
         db = await Database.get_database(db_name)
         if db is None:
             return None
@@ -35,7 +95,12 @@ class DatabaseOperations:
         db = await Database.get_database(db_name)
         if db is None:
             return None
-        result = await db[collection_name].insert_one(document)
+        _invalidate_reads(db_name, collection_name, document)
+        try:
+            result = await db[collection_name].insert_one(document)
+        finally:
+            # Reads that started while the write ran may have returned the old document
+            _after_write(db_name, collection_name, document)
         return str(result.inserted_id) if result.inserted_id else None
 
     @classmethod
@@ -44,7 +109,12 @@ class DatabaseOperations:
         db = await Database.get_database(db_name)
         if db is None:
             return False
-        result = await db[collection_name].update_one(query, update)
+        _invalidate_reads(db_name, collection_name, query)
+        try:
+            result = await db[collection_name].update_one(query, update)
+        finally:
+            # Reads that started while the write ran may have returned the old document
+            _after_write(db_name, collection_name, query)
         return result.modified_count > 0
 
     @classmethod
@@ -53,7 +123,12 @@ class DatabaseOperations:
         db = await Database.get_database(db_name)
         if db is None:
             return False
-        result = await db[collection_name].delete_one(query)
+        _invalidate_reads(db_name, collection_name, query)
+        try:
+            result = await db[collection_name].delete_one(query)
+        finally:
+            # Reads that started while the write ran may have returned the old document
+            _after_write(db_name, collection_name, query)
         return result.deleted_count > 0
 
     @classmethod
@@ -63,3 +138,59 @@ class DatabaseOperations:
         if db is None:
             return 0
         return await db[collection_name].count_documents(query)
+
+    @classmethod
+    async def aggregate(cls, collection_name: str, pipeline: List[Dict], db_name: str = "CampusConnect") -> List[Dict]:
+        """Run an aggregation pipeline on the specified collection"""
+        db = await Database.get_database(db_name)
+        if db is None:
+            return []
+        return await db[collection_name].aggregate(pipeline).to_list(length=None)
+
+    @classmethod
+    async def facet_counts(cls, collection_name: str, queries: Dict[str, Dict], db_name: str = "CampusConnect") -> Dict[str, int]:
+        """Count documents for several queries with a single $facet aggregation"""
+        if not queries:
+            return {}
+        pipeline = [{"$facet": {
+            name: [{"$match": query}, {"$count": "count"}]
+            for name, query in queries.items()
+        }}]
+        result = await cls.aggregate(collection_name, pipeline, db_name)
+        facets = result[0] if result else {}
+        return {name: (facets.get(name) or [{}])[0].get("count", 0) for name in queries}
+
+    @classmethod
+    async def estimated_document_count(cls, collection_name: str, db_name: str = "CampusConnect") -> int:
+        """Get the collection-metadata document count (no collection scan)"""
+        db = await Database.get_database(db_name)
+        if db is None:
+            return 0
+        return await db[collection_name].estimated_document_count()
+
+    @classmethod
+    async def find_one_and_update(cls, collection_name: str, query: Dict, update: Dict, return_updated: bool = True, upsert: bool = False, sort_by: Optional[List] = None, db_name: str = "CampusConnect") -> Optional[Dict]:
+        """Atomically update a single document and return it (after the update by default)"""
+        db = await Database.get_database(db_name)
+        if db is None:
+            return None
+        _invalidate_reads(db_name, collection_name, query)
+        try:
+            return await db[collection_name].find_one_and_update(
+                query,
+                update,
+                sort=sort_by,
+                upsert=upsert,
+                return_document=ReturnDocument.AFTER if return_updated else ReturnDocument.BEFORE
+            )
+        finally:
+            # Reads that started while the write ran may have returned the old document
+            _after_write(db_name, collection_name, query)
+
+    @classmethod
+    async def create_index(cls, collection_name: str, keys: List, db_name: str = "CampusConnect", **kwargs) -> Optional[str]:
+        """Create an index on the specified collection (no-op if it already exists)"""
+        db = await Database.get_database(db_name)
+        if db is None:
+            return None
+        return await db[collection_name].create_index(keys, **kwargs)
@@ -7,6 +7,7 @@ event status changes should occur, eliminating delays and unnecessary runs.
 
 import asyncio
 import heapq
+import time
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass, field
@@ -14,6 +15,8 @@ from enum import Enum
 import logging
 from config.database import Database
 from utils.db_operations import DatabaseOperations
+from utils.metrics import Histogram, LabeledHistogram, TimeSeries, render_prometheus
+from utils.event_catalog import event_catalog
 
 # Configure logging
 logging.basicConfig(
@@ -43,6 +46,40 @@ class ScheduledTrigger:
         """Enable heap ordering by trigger_time"""
         return self.trigger_time < other.trigger_time
 
+class SchedulerMetrics:
+    """Lag and throughput metrics for the dynamic event scheduler"""
+    
+    def __init__(self):
+        self.trigger_lateness = Histogram(
+            "scheduler_trigger_lateness_seconds",
+            buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 900.0, 3600.0),
+            description="Delay between a trigger's scheduled time and when it fired"
+        )
+        self.execution_duration = LabeledHistogram(
+            "scheduler_trigger_duration_seconds",
+            label="trigger_type",
+            description="Time spent executing a trigger, by trigger type"
+        )
+        self.db_ops_per_trigger = Histogram(
+            "scheduler_trigger_db_operations",
+            buckets=(0, 1, 2, 3, 4, 5, 10, 20),
+            description="Database operations issued while executing a trigger"
+        )
+        self.heap_size = TimeSeries("scheduler_heap_size", description="Number of queued triggers over time")
+        self.triggers_executed = 0
+        self.triggers_failed = 0
+        self.status_changes = 0
+        
+    def record_trigger(self, trigger_type: str, lateness: float, duration: float, db_ops: int, success: bool):
+        """Record the outcome of a single trigger execution"""
+        self.trigger_lateness.observe(max(lateness, 0.0))
+        self.execution_duration.observe(trigger_type, duration)
+        self.db_ops_per_trigger.observe(db_ops)
+        if success:
+            self.triggers_executed += 1
+        else:
+            self.triggers_failed += 1
+
 class DynamicEventScheduler:
     """
     Dynamic event scheduler that triggers updates exactly when event status changes occur
@@ -53,6 +90,7 @@ class DynamicEventScheduler:
         self.running = False
         self._scheduler_task: Optional[asyncio.Task] = None
         self._stop_event = asyncio.Event()
+        self.metrics = SchedulerMetrics()
         
     async def initialize(self):
         """Initialize the scheduler with all events from database"""
@@ -132,6 +170,8 @@ class DynamicEventScheduler:
         """Add triggers for a newly created event"""
         current_time = datetime.now()
         triggers_added = await self._add_event_triggers(event, current_time)
+        self.metrics.heap_size.record(len(self.trigger_queue))
+        event_catalog.invalidate(event.get('event_id'))
         
         if triggers_added > 0:
             logger.info(f"Added {triggers_added} triggers for new event: {event.get('event_id')}")
@@ -141,6 +181,7 @@ class DynamicEventScheduler:
         """Update triggers for an event when its dates change"""
         # Remove existing triggers for this event
         await self._remove_event_triggers(event_id)
+        event_catalog.invalidate(event_id)
         
         # Add new triggers
         current_time = datetime.now()
@@ -159,10 +200,12 @@ class DynamicEventScheduler:
         ]
         # Re-heapify the queue
         heapq.heapify(self.trigger_queue)
+        self.metrics.heap_size.record(len(self.trigger_queue))
         
     async def remove_event(self, event_id: str):
         """Remove all triggers for a deleted event"""
         await self._remove_event_triggers(event_id)
+        event_catalog.invalidate(event_id)
         logger.info(f"Removed all triggers for deleted event: {event_id}")
         
     def _get_next_trigger_info(self) -> str:
@@ -224,6 +267,7 @@ class DynamicEventScheduler:
         while self.running:
             try:
                 current_time = datetime.now()
+                self.metrics.heap_size.record(len(self.trigger_queue))
                 
                 # Check for triggers that are ready to execute
                 ready_triggers = []
@@ -283,25 +327,42 @@ class DynamicEventScheduler:
                 
     async def _execute_trigger(self, trigger: ScheduledTrigger):
         """Execute a specific trigger"""
+        lateness = (datetime.now() - trigger.trigger_time).total_seconds()
+        started = time.perf_counter()
+        db_ops = 0
+        success = False
+        
         try:
             logger.info(f"Executing trigger: {trigger.trigger_type.value} for event {trigger.event_id}")
             
             # Update the specific event's status
-            await self._update_event_status(trigger.event_id, trigger.trigger_type)
+            db_ops = await self._update_event_status(trigger.event_id, trigger.trigger_type)
+            success = True
             
             logger.info(f"Successfully executed trigger: {trigger.trigger_type.value} for event {trigger.event_id}")
             
         except Exception as e:
             logger.error(f"Error executing trigger {trigger.trigger_type.value} for event {trigger.event_id}: {str(e)}")
             
-    async def _update_event_status(self, event_id: str, trigger_type: EventTriggerType):
-        """Update the status of a specific event"""
+        finally:
+            self.metrics.record_trigger(
+                trigger.trigger_type.value,
+                lateness,
+                time.perf_counter() - started,
+                db_ops,
+                success
+            )
+            
+    async def _update_event_status(self, event_id: str, trigger_type: EventTriggerType) -> int:
+        """Update the status of a specific event, returning the number of database operations issued"""
+        db_ops = 0
         try:
             # Fetch the current event data
             event = await DatabaseOperations.find_one("events", {"event_id": event_id})
+            db_ops += 1
             if not event:
                 logger.warning(f"Event {event_id} not found for status update")
-                return
+                return db_ops
                   # Determine new status based on current time and event dates
             current_time = datetime.now()
             new_status, new_sub_status = await self._calculate_event_status(event, current_time)
@@ -319,12 +380,16 @@ class DynamicEventScheduler:
                         "last_status_update": current_time,
                         "updated_by_scheduler": True
                     }}                )
+                db_ops += 1
                 
                 if success:
                     logger.info(f"Updated event {event_id} status: {current_status}/{current_sub_status} -> {new_status}/{new_sub_status}")
+                    self.metrics.status_changes += 1
+                    event_catalog.invalidate(event_id)
                     
                     # Log the status change for auditing
                     await self._log_status_change(event_id, f"{current_status}/{current_sub_status}", f"{new_status}/{new_sub_status}", trigger_type)
+                    db_ops += 1
                 else:
                     logger.error(f"Failed to update status for event {event_id}")
             else:
@@ -333,6 +398,8 @@ class DynamicEventScheduler:
         except Exception as e:
             logger.error(f"Error updating status for event {event_id}: {str(e)}")
             
+        return db_ops
+            
     async def _calculate_event_status(self, event: Dict[str, Any], current_time: datetime) -> tuple[str, str]:
         """Calculate the appropriate status and sub_status for an event based on current time"""
         # Convert string dates to datetime objects
@@ -413,6 +480,46 @@ class DynamicEventScheduler:
             ]
         }
 
+    def _current_lag_seconds(self) -> float:
+        """Seconds the oldest queued trigger is overdue (0 when the scheduler is keeping up)"""
+        if not self.trigger_queue:
+            return 0.0
+        overdue = (datetime.now() - self.trigger_queue[0].trigger_time).total_seconds()
+        return max(overdue, 0.0)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get lag and throughput metrics in a machine-readable structure"""
+        metrics = self.metrics
+        return {
+            "running": self.running,
+            "triggers_queued": len(self.trigger_queue),
+            "current_lag_seconds": self._current_lag_seconds(),
+            "triggers_executed": metrics.triggers_executed,
+            "triggers_failed": metrics.triggers_failed,
+            "status_changes": metrics.status_changes,
+            "trigger_lateness_seconds": metrics.trigger_lateness.snapshot(),
+            "execution_duration_seconds": metrics.execution_duration.snapshot(),
+            "db_operations_per_trigger": metrics.db_ops_per_trigger.snapshot(),
+            "heap_size": metrics.heap_size.snapshot()
+        }
+
+    def get_metrics_prometheus(self) -> str:
+        """Get lag and throughput metrics in Prometheus text exposition format"""
+        metrics = self.metrics
+        return render_prometheus(
+            histograms=[metrics.trigger_lateness, metrics.execution_duration, metrics.db_ops_per_trigger],
+            gauges={
+                "scheduler_running": int(self.running),
+                "scheduler_heap_size": len(self.trigger_queue),
+                "scheduler_current_lag_seconds": self._current_lag_seconds()
+            },
+            counters={
+                "scheduler_triggers_executed_total": metrics.triggers_executed,
+                "scheduler_triggers_failed_total": metrics.triggers_failed,
+                "scheduler_status_changes_total": metrics.status_changes
+            }
+        )
+
     def get_scheduled_triggers(self) -> List[Dict[str, Any]]:
         """Get all scheduled triggers formatted for the admin dashboard"""
         triggers = []
@@ -491,5 +598,11 @@ async def get_scheduler_status():
     """Get current scheduler status"""
     return await dynamic_scheduler.get_status()
 
+def get_scheduler_metrics(output_format: str = "json"):
+    """Get scheduler lag and throughput metrics as JSON data or Prometheus text"""
+    if output_format == "prometheus":
+        return dynamic_scheduler.get_metrics_prometheus()
+    return dynamic_scheduler.get_metrics()
+
 # Backward compatibility alias
 scheduler = dynamic_scheduler
\ No newline at end of file
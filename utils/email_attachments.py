@@ -0,0 +1,115 @@
+"""
+In-memory Email Attachments
+
+Attachments are passed to the email services as bytes/memoryview or as the
+base64 text the browser already produced, so certificate PDFs never go through
+temporary files and base64 data is not decoded only to be encoded again.
+
+Features:
+- EmailAttachment built from bytes, memoryview, base64 text or a file path
+- PDF header validation in memory (base64 input only decodes its first bytes)
+- MIME parts built directly from base64 text when it is already available
+"""
+
+import base64
+import binascii
+import os
+import re
+from dataclasses import dataclass
+from email.mime.base import MIMEBase
+from typing import Optional, Union
+
+PDF_MAGIC = b"%PDF"
+
+# Base64 text as sent by browsers (whitespace tolerated, no data: URI prefix)
+_BASE64_PATTERN = re.compile(rb"[A-Za-z0-9+/]*={0,2}")
+_WHITESPACE = re.compile(rb"\s+")
+
+# RFC 2045 line length for base64 bodies
+_BASE64_LINE_LENGTH = 76
+
+class InvalidAttachmentError(ValueError):
+    """Attachment data is not valid base64 or not the expected file type"""
+
+@dataclass
+class EmailAttachment:
+    """An email attachment held in memory"""
+    filename: str
+    content_type: str = "application/octet-stream"
+    data: Optional[Union[bytes, memoryview]] = None
+    base64_data: Optional[bytes] = None
+
+    @classmethod
+    def from_bytes(cls, filename: str, data: Union[bytes, bytearray, memoryview],
+                   content_type: str = "application/octet-stream") -> "EmailAttachment":
+        if isinstance(data, bytearray):
+            data = memoryview(data)
+        return cls(filename=filename, content_type=content_type, data=data)
+
+    @classmethod
+    def from_base64(cls, filename: str, encoded: Union[str, bytes],
+                    content_type: str = "application/octet-stream") -> "EmailAttachment":
+        """Keep base64 text as-is (validated, whitespace stripped) for the MIME body"""
+        if isinstance(encoded, str):
+            encoded = encoded.encode("ascii", errors="strict")
+        encoded = _WHITESPACE.sub(b"", encoded)
+        if not encoded or len(encoded) % 4 or not _BASE64_PATTERN.fullmatch(encoded):
+            raise InvalidAttachmentError(f"Attachment {filename} is not valid base64")
+        return cls(filename=filename, content_type=content_type, base64_data=encoded)
+
+    @classmethod
+    def from_path(cls, path: str, content_type: str = "application/octet-stream") -> "EmailAttachment":
+        with open(path, "rb") as attachment_file:
+            return cls(filename=os.path.basename(path), content_type=content_type, data=attachment_file.read())
+
+    @classmethod
+    def pdf(cls, filename: str, data: Union[str, bytes, bytearray, memoryview], is_base64: bool = False) -> "EmailAttachment":
+        """Build a PDF attachment and check its header"""
+        if is_base64:
+            attachment = cls.from_base64(filename, data, "application/pdf")
+        else:
+            attachment = cls.from_bytes(filename, data, "application/pdf")
+        if not attachment.has_header(PDF_MAGIC):
+            raise InvalidAttachmentError(f"Attachment {filename} is not a PDF")
+        return attachment
+
+    @property
+    def size(self) -> int:
+        """Decoded size in bytes"""
+        if self.data is not None:
+            return len(self.data)
+        padding = self.base64_data.count(b"=", -2)
+        return len(self.base64_data) * 3 // 4 - padding
+
+    def head(self, length: int) -> bytes:
+        """The first bytes of the attachment (base64 input decodes only what is needed)"""
+        if self.data is not None:
+            return bytes(self.data[:length])
+        chunk = self.base64_data[:((length + 2) // 3) * 4]
+        try:
+            return base64.b64decode(chunk)[:length]
+        except binascii.Error:
+            return b""
+
+    def has_header(self, magic: bytes) -> bool:
+        return self.head(len(magic)) == magic
+
+    def to_mime_part(self) -> MIMEBase:
+        """Build the MIME part, encoding to base64 only if the data is not already base64"""
+        maintype, _, subtype = self.content_type.partition("/")
+        part = MIMEBase(maintype, subtype or "octet-stream")
+        encoded = self.base64_data if self.base64_data is not None else base64.b64encode(self.data)
+        part.set_payload(b"\n".join(
+            encoded[i:i + _BASE64_LINE_LENGTH] for i in range(0, len(encoded), _BASE64_LINE_LENGTH)
+        ).decode("ascii"))
+        part["Content-Transfer-Encoding"] = "base64"
+        part.add_header("Content-Disposition", "attachment", filename=self.filename)
+        return part
+
+def as_attachment(attachment: Union[str, EmailAttachment]) -> Optional[EmailAttachment]:
+    """Normalise an attachment argument (file path or EmailAttachment); missing files are skipped"""
+    if isinstance(attachment, EmailAttachment):
+        return attachment
+    if attachment and os.path.exists(attachment):
+        return EmailAttachment.from_path(attachment)
+    return None
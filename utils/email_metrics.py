@@ -0,0 +1,141 @@
+"""
+Email Delivery Metrics
+
+Per-message timings for every stage of sending an email, aggregated into
+percentile histograms per email type, so a slow delivery day can be traced to
+template rendering, the SMTP pool, the provider or the database.
+
+Features:
+- Stage histograms (render, MIME build, connection checkout, SMTP transaction,
+  DB mark-sent, outbox completion) labelled by email type
+- Enqueue-to-delivery latency for emails sent through the outbox
+- Sent/failed counters per email type
+- The current email type follows the sending task (and executor threads) through
+  a context variable, so the pools record stages without extra arguments
+- JSON and Prometheus text output for the admin metrics endpoint
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from utils.metrics import LabeledHistogram, render_prometheus
+
+class EmailType:
+    REGISTRATION = "registration"
+    CERTIFICATE = "certificate"
+    FEEDBACK = "feedback"
+    REMINDER = "reminder"
+    ATTENDANCE = "attendance"
+    PAYMENT = "payment"
+    ACCOUNT = "account"
+    ANNOUNCEMENT = "announcement"
+    DIGEST = "digest"
+    OTHER = "other"
+
+# Email templates and the email type they send
+TEMPLATE_EMAIL_TYPES = {
+    "registration_confirmation.html": EmailType.REGISTRATION,
+    "team_registration_confirmation.html": EmailType.REGISTRATION,
+    "certificate_notification.html": EmailType.CERTIFICATE,
+    "feedback_confirmation.html": EmailType.FEEDBACK,
+    "event_reminder.html": EmailType.REMINDER,
+    "attendance_confirmation.html": EmailType.ATTENDANCE,
+    "payment_confirmation.html": EmailType.PAYMENT,
+    "welcome_account_created.html": EmailType.ACCOUNT,
+    "new_event_notification.html": EmailType.ANNOUNCEMENT,
+    "notification_digest.html": EmailType.DIGEST,
+}
+
+# Per-message stages, in the order a message goes through them
+STAGES = ("render", "mime_build", "checkout", "smtp", "db_mark_sent", "outbox_complete")
+
+# SMTP-side stages are milliseconds to seconds; queue latency can reach hours with retries
+DELIVERY_LATENCY_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0, 3600.0, 14400.0, 86400.0)
+
+_current_email_type: contextvars.ContextVar[str] = contextvars.ContextVar("email_type", default=EmailType.OTHER)
+
+def email_type_for_template(template_name: str) -> str:
+    return TEMPLATE_EMAIL_TYPES.get(template_name, EmailType.OTHER)
+
+def set_email_type(email_type: str):
+    """Tag the rest of the current task's sending work with an email type"""
+    _current_email_type.set(email_type)
+
+def current_email_type() -> str:
+    return _current_email_type.get()
+
+class EmailMetrics:
+    """Stage timings, delivery latency and outcomes per email type"""
+
+    def __init__(self):
+        self.stages = {
+            stage: LabeledHistogram(
+                f"email_{stage}_seconds",
+                label="email_type",
+                description=f"Time spent in the {stage.replace('_', ' ')} stage of sending an email"
+            )
+            for stage in STAGES
+        }
+        self.delivery_latency = LabeledHistogram(
+            "email_enqueue_to_delivery_seconds",
+            label="email_type",
+            buckets=DELIVERY_LATENCY_BUCKETS,
+            description="Time from adding an email to the outbox until it was sent"
+        )
+        self._outcomes: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, email_type: Optional[str] = None):
+        self.stages[stage].observe(email_type or current_email_type(), seconds)
+
+    @contextmanager
+    def time_stage(self, stage: str, email_type: Optional[str] = None):
+        """Time a block as one stage of the current email"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, email_type)
+
+    def observe_delivery(self, seconds: float, email_type: Optional[str] = None):
+        self.delivery_latency.observe(email_type or current_email_type(), max(seconds, 0.0))
+
+    def record_outcome(self, success: bool, email_type: Optional[str] = None):
+        email_type = email_type or current_email_type()
+        with self._lock:
+            outcomes = self._outcomes.setdefault(email_type, {"sent": 0, "failed": 0})
+            outcomes["sent" if success else "failed"] += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Per email type: outcomes, then a percentile snapshot for each stage"""
+        with self._lock:
+            outcomes = {email_type: dict(counts) for email_type, counts in self._outcomes.items()}
+
+        by_type: Dict[str, Dict[str, Any]] = {}
+        for email_type, counts in outcomes.items():
+            by_type.setdefault(email_type, {"outcomes": counts, "stages": {}})
+        for stage, histogram in self.stages.items():
+            for email_type, snapshot in histogram.snapshot().items():
+                by_type.setdefault(email_type, {"outcomes": {"sent": 0, "failed": 0}, "stages": {}})
+                by_type[email_type]["stages"][stage] = snapshot
+        for email_type, snapshot in self.delivery_latency.snapshot().items():
+            by_type.setdefault(email_type, {"outcomes": {"sent": 0, "failed": 0}, "stages": {}})
+            by_type[email_type]["enqueue_to_delivery"] = snapshot
+
+        return {"stages": list(STAGES), "email_types": by_type}
+
+    def get_metrics_prometheus(self) -> str:
+        with self._lock:
+            outcomes = {email_type: dict(counts) for email_type, counts in self._outcomes.items()}
+        lines = [render_prometheus(histograms=[*self.stages.values(), self.delivery_latency]).rstrip("\n")]
+        for outcome in ("sent", "failed"):
+            lines.append(f"# TYPE email_messages_{outcome}_total counter")
+            for email_type, counts in sorted(outcomes.items()):
+                lines.append(f'email_messages_{outcome}_total{{email_type="{email_type}"}} {counts[outcome]}')
+        return "\n".join(lines) + "\n"
+
+# Global email metrics instance
+email_metrics = EmailMetrics()
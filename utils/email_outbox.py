@@ -0,0 +1,466 @@
+"""
+Durable Email Outbox
+
+Outgoing emails are stored in the `email_outbox` MongoDB collection and delivered
+by background workers, so queued mail survives restarts and can be drained by any
+worker process on any node.
+
+Features:
+- Idempotency keys: the message _id is the caller's key, so enqueueing the same
+  email twice stores it once
+- Claim/lease semantics with find_one_and_update: a worker leases one message at
+  a time, and messages whose lease expired (crashed worker) are claimed again;
+  the lease is renewed while the handler runs, so a slow send is not reclaimed
+- Exponential retry backoff with jitter, and a dead-letter state after
+  max_attempts
+- Handlers registered per message kind; workers only claim kinds they can send
+- Batch messages: items added to a pending message until it falls due, so
+  several notifications can be delivered as one email; reserve() records the
+  items' idempotency keys so a repeat is not batched (or sent) again
+- Backlog depth and oldest-message age for the admin stats
+- Enqueue-to-delivery latency recorded per email type
+"""
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.db_operations import DatabaseOperations
+from utils.email_metrics import EmailType, email_metrics, set_email_type
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_COLLECTION = "email_outbox"
+
+# Sent messages are kept (without their payload) for this long before MongoDB expires them
+SENT_RETENTION_SECONDS = 7 * 24 * 3600
+
+class OutboxStatus:
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    DEAD = "dead"
+
+# A handler sends one message payload and returns True on success
+OutboxHandler = Callable[[Dict[str, Any], Dict[str, Any]], Awaitable[bool]]
+
+class EmailOutbox:
+    """MongoDB-backed outbox with leased claims, retries and a dead-letter state"""
+
+    def __init__(
+        self,
+        max_workers: int = 5,
+        lease_seconds: int = 120,
+        poll_interval: float = 2.0,
+        base_retry_delay: float = 30.0,
+        max_retry_delay: float = 3600.0,
+        max_attempts: int = 5
+    ):
+        self.max_workers = max_workers
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.base_retry_delay = base_retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        self.handlers: Dict[str, OutboxHandler] = {}
+        self.workers: List[asyncio.Task] = []
+        self.running = False
+        self.node_id = f"{socket.gethostname()}:{os.getpid()}"
+        # Set when this process enqueues, so idle local workers don't wait for the next poll
+        self._wakeup = asyncio.Event()
+        self.stats = {
+            "total_enqueued": 0,
+            "total_duplicates": 0,
+            "total_batched": 0,
+            "total_sent": 0,
+            "total_retried": 0,
+            "total_dead": 0,
+            "active_workers": 0
+        }
+
+    def register_handler(self, kind: str, handler: OutboxHandler):
+        """Register the sender for a message kind"""
+        self.handlers[kind] = handler
+
+    async def ensure_indexes(self):
+        """Create the indexes used by claims and the sent-message expiry"""
+        try:
+            await DatabaseOperations.create_index(OUTBOX_COLLECTION, [("status", 1), ("next_attempt_at", 1)])
+            await DatabaseOperations.create_index(OUTBOX_COLLECTION, [("status", 1), ("lease_until", 1)])
+            await DatabaseOperations.create_index(OUTBOX_COLLECTION, [("sent_at", 1)], expireAfterSeconds=SENT_RETENTION_SECONDS)
+        except Exception as e:
+            logger.error(f"Error creating email outbox indexes: {str(e)}")
+
+    async def start(self):
+        """Start the outbox workers"""
+        if self.running:
+            return
+
+        self.running = True
+        await self.ensure_indexes()
+        for i in range(self.max_workers):
+            self.workers.append(asyncio.create_task(self._worker(f"worker-{i+1}")))
+
+        logger.info(f"Email outbox started with {self.max_workers} workers on {self.node_id} (kinds: {', '.join(self.handlers)})")
+
+    async def stop(self):
+        """Stop the outbox workers; leased messages are reclaimed after their lease expires"""
+        if not self.running:
+            return
+
+        self.running = False
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers.clear()
+        logger.info("Email outbox stopped")
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        idempotency_key: str,
+        max_attempts: Optional[int] = None,
+        revive_dead: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Store a message for delivery. Returns the outbox document, or None on error.
+
+        A message with the same idempotency key is stored only once; if the earlier
+        one was dead-lettered and revive_dead is set, it is queued again with the new payload.
+        """
+        now = datetime.utcnow()
+        # Tells us whether the upsert inserted this message or found an existing one
+        enqueue_id = uuid.uuid4().hex
+        try:
+            document = await DatabaseOperations.find_one_and_update(
+                OUTBOX_COLLECTION,
+                {"_id": idempotency_key},
+                {"$setOnInsert": {
+                    "enqueue_id": enqueue_id,
+                    "kind": kind,
+                    "payload": payload,
+                    "status": OutboxStatus.PENDING,
+                    "attempts": 0,
+                    "max_attempts": max_attempts or self.max_attempts,
+                    "next_attempt_at": now,
+                    "lease_until": None,
+                    "worker_id": None,
+                    "last_error": None,
+                    "created_at": now,
+                    "updated_at": now
+                }},
+                upsert=True
+            )
+            if document is None:
+                return None
+
+            if document.get("enqueue_id") == enqueue_id:
+                self.stats["total_enqueued"] += 1
+            elif document["status"] == OutboxStatus.DEAD and revive_dead:
+                document = await DatabaseOperations.find_one_and_update(
+                    OUTBOX_COLLECTION,
+                    {"_id": idempotency_key, "status": OutboxStatus.DEAD},
+                    {"$set": {
+                        "enqueue_id": enqueue_id,
+                        "payload": payload,
+                        "status": OutboxStatus.PENDING,
+                        "attempts": 0,
+                        "next_attempt_at": now,
+                        "created_at": now,
+                        "updated_at": now
+                    }}
+                ) or document
+                self.stats["total_enqueued"] += 1
+                logger.info(f"Re-queued dead-lettered email {idempotency_key}")
+            else:
+                self.stats["total_duplicates"] += 1
+                logger.info(f"Email {idempotency_key} already in outbox ({document['status']}), not queued again")
+
+            self._wakeup.set()
+            return document
+
+        except Exception as e:
+            logger.error(f"Error adding email {idempotency_key} to outbox: {str(e)}")
+            return None
+
+    async def reserve(self, idempotency_key: str, kind: str) -> Optional[bool]:
+        """
+        Record an idempotency key without a message of its own (e.g. an email merged into a batch).
+
+        Returns True if the key was new, False if a message or reservation already used it,
+        None on error. Reservations are stored as sent, so no worker claims them and they
+        expire with the sent messages.
+        """
+        now = datetime.utcnow()
+        reservation_id = uuid.uuid4().hex
+        try:
+            document = await DatabaseOperations.find_one_and_update(
+                OUTBOX_COLLECTION,
+                {"_id": idempotency_key},
+                {"$setOnInsert": {
+                    "enqueue_id": reservation_id,
+                    "kind": kind,
+                    "status": OutboxStatus.SENT,
+                    "sent_at": now,
+                    "created_at": now,
+                    "updated_at": now
+                }},
+                upsert=True
+            )
+            if document is None:
+                return None
+            if document.get("enqueue_id") != reservation_id:
+                self.stats["total_duplicates"] += 1
+                return False
+            return True
+        except Exception as e:
+            logger.error(f"Error reserving email key {idempotency_key}: {str(e)}")
+            return None
+
+    async def release(self, idempotency_key: str, kind: str) -> bool:
+        """Drop a reservation made with reserve(), so the key can be enqueued as a message"""
+        try:
+            return await DatabaseOperations.delete_one(OUTBOX_COLLECTION, {"_id": idempotency_key, "kind": kind})
+        except Exception as e:
+            logger.error(f"Error releasing email key {idempotency_key}: {str(e)}")
+            return False
+
+    async def add_to_batch(
+        self,
+        kind: str,
+        batch_key: str,
+        item: Dict[str, Any],
+        deliver_at: datetime,
+        fields: Optional[Dict[str, Any]] = None,
+        max_attempts: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Add an item to the pending batch message batch_key, creating it (due at deliver_at) on first use.
+
+        Items are stored in payload.items; adding an identical item twice stores it once.
+        Returns None on error, and when the batch is no longer pending (already claimed
+        or sent), so the caller can send the item on its own instead.
+        """
+        now = datetime.utcnow()
+        update = {
+            # _id and status are set from the query when the upsert inserts
+            "$setOnInsert": {
+                "enqueue_id": uuid.uuid4().hex,
+                "kind": kind,
+                "attempts": 0,
+                "max_attempts": max_attempts or self.max_attempts,
+                "next_attempt_at": deliver_at,
+                "lease_until": None,
+                "worker_id": None,
+                "last_error": None,
+                "created_at": now
+            },
+            "$set": {"updated_at": now, **{f"payload.{name}": value for name, value in (fields or {}).items()}},
+            "$addToSet": {"payload.items": item}
+        }
+        try:
+            document = await DatabaseOperations.find_one_and_update(
+                OUTBOX_COLLECTION,
+                {"_id": batch_key, "status": OutboxStatus.PENDING},
+                update,
+                upsert=True
+            )
+            if document is not None:
+                self.stats["total_batched"] += 1
+            return document
+        except Exception as e:
+            # A duplicate key error means the batch left the pending state
+            logger.warning(f"Could not add item to email batch {batch_key}: {str(e)}")
+            return None
+
+    async def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Lease the next due message this process has a handler for"""
+        if not self.handlers:
+            return None
+        now = datetime.utcnow()
+        return await DatabaseOperations.find_one_and_update(
+            OUTBOX_COLLECTION,
+            {
+                "kind": {"$in": list(self.handlers)},
+                "$or": [
+                    {"status": OutboxStatus.PENDING, "next_attempt_at": {"$lte": now}},
+                    # The worker holding this lease died or stalled
+                    {"status": OutboxStatus.SENDING, "lease_until": {"$lt": now}}
+                ]
+            },
+            {
+                "$set": {
+                    "status": OutboxStatus.SENDING,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    "worker_id": worker_id,
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort_by=[("next_attempt_at", 1)]
+        )
+
+    async def renew_lease(self, message: Dict[str, Any], worker_id: str) -> bool:
+        """Extend the lease on a message this worker holds; False if the lease was lost"""
+        now = datetime.utcnow()
+        return await DatabaseOperations.update_one(
+            OUTBOX_COLLECTION,
+            {"_id": message["_id"], "worker_id": worker_id, "status": OutboxStatus.SENDING},
+            {"$set": {"lease_until": now + timedelta(seconds=self.lease_seconds), "updated_at": now}}
+        )
+
+    async def _keep_leased(self, message: Dict[str, Any], worker_id: str):
+        """Heartbeat: renew the lease until cancelled when the handler returns"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await self.renew_lease(message, worker_id):
+                    logger.warning(f"Lost the lease on email {message['_id']}, another worker may send it")
+                    return
+            except Exception as e:
+                # Keep trying; the lease still has up to two thirds of its time left
+                logger.error(f"Error renewing lease on email {message['_id']}: {str(e)}")
+
+    async def complete(self, message: Dict[str, Any], worker_id: str) -> bool:
+        """Mark a leased message as sent and drop its payload"""
+        now = datetime.utcnow()
+        return await DatabaseOperations.update_one(
+            OUTBOX_COLLECTION,
+            {"_id": message["_id"], "worker_id": worker_id, "status": OutboxStatus.SENDING},
+            {
+                "$set": {"status": OutboxStatus.SENT, "sent_at": now, "lease_until": None, "updated_at": now},
+                "$unset": {"payload": ""}
+            }
+        )
+
+    def retry_delay(self, attempts: int) -> float:
+        """Exponential backoff with jitter (half fixed, half random)"""
+        delay = min(self.max_retry_delay, self.base_retry_delay * (2 ** max(0, attempts - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def fail(self, message: Dict[str, Any], worker_id: str, error: str) -> str:
+        """Schedule a retry for a leased message, or dead-letter it after max_attempts"""
+        now = datetime.utcnow()
+        attempts = message.get("attempts", 1)
+        if attempts >= message.get("max_attempts", self.max_attempts):
+            status, update = OutboxStatus.DEAD, {"status": OutboxStatus.DEAD, "dead_at": now}
+            self.stats["total_dead"] += 1
+            logger.error(f"Email {message['_id']} dead-lettered after {attempts} attempts: {error}")
+        else:
+            delay = self.retry_delay(attempts)
+            status, update = OutboxStatus.PENDING, {
+                "status": OutboxStatus.PENDING,
+                "next_attempt_at": now + timedelta(seconds=delay)
+            }
+            self.stats["total_retried"] += 1
+            logger.warning(f"Email {message['_id']} attempt {attempts} failed, retrying in {delay:.0f}s: {error}")
+
+        await DatabaseOperations.update_one(
+            OUTBOX_COLLECTION,
+            {"_id": message["_id"], "worker_id": worker_id, "status": OutboxStatus.SENDING},
+            {"$set": {**update, "lease_until": None, "last_error": error, "updated_at": now}}
+        )
+        return status
+
+    async def _process(self, message: Dict[str, Any], worker_id: str):
+        if message.get("attempts", 1) > message.get("max_attempts", self.max_attempts):
+            # Reclaimed after its lease expired on the final attempt (e.g. a worker crashed mid-send)
+            await self.fail(message, worker_id, message.get("last_error") or "lease expired on final attempt")
+            return
+
+        # The handler's template render sets the real email type for the metrics
+        set_email_type(EmailType.OTHER)
+        heartbeat = asyncio.create_task(self._keep_leased(message, worker_id))
+        try:
+            success = await self.handlers[message["kind"]](message.get("payload") or {}, message)
+            error = None if success else "handler reported failure"
+        except Exception as e:
+            success, error = False, str(e)
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+        if success:
+            with email_metrics.time_stage("outbox_complete"):
+                await self.complete(message, worker_id)
+            if message.get("created_at"):
+                email_metrics.observe_delivery((datetime.utcnow() - message["created_at"]).total_seconds())
+            self.stats["total_sent"] += 1
+        else:
+            await self.fail(message, worker_id, error)
+
+    async def _worker(self, worker_name: str):
+        """Claim and deliver messages until stopped"""
+        worker_id = f"{self.node_id}:{worker_name}"
+        logger.info(f"Email outbox worker {worker_id} started")
+
+        while self.running:
+            try:
+                message = await self.claim(worker_id)
+                if message is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                self.stats["active_workers"] += 1
+                try:
+                    await self._process(message, worker_id)
+                finally:
+                    self.stats["active_workers"] -= 1
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Email outbox worker {worker_id} error: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+        logger.info(f"Email outbox worker {worker_id} stopped")
+
+    async def get_backlog_stats(self) -> Dict[str, Any]:
+        """Backlog depth per status and the age of the oldest undelivered message"""
+        try:
+            counts = await DatabaseOperations.facet_counts(OUTBOX_COLLECTION, {
+                OutboxStatus.PENDING: {"status": OutboxStatus.PENDING},
+                OutboxStatus.SENDING: {"status": OutboxStatus.SENDING},
+                OutboxStatus.DEAD: {"status": OutboxStatus.DEAD}
+            })
+            oldest = await DatabaseOperations.find_many(
+                OUTBOX_COLLECTION,
+                {"status": {"$in": [OutboxStatus.PENDING, OutboxStatus.SENDING]}},
+                limit=1,
+                sort_by=[("created_at", 1)]
+            )
+            oldest_age = (datetime.utcnow() - oldest[0]["created_at"]).total_seconds() if oldest else 0
+            return {
+                "backlog": counts[OutboxStatus.PENDING] + counts[OutboxStatus.SENDING],
+                "pending": counts[OutboxStatus.PENDING],
+                "sending": counts[OutboxStatus.SENDING],
+                "dead": counts[OutboxStatus.DEAD],
+                "oldest_age_seconds": round(oldest_age, 1)
+            }
+        except Exception as e:
+            logger.error(f"Error getting email outbox backlog: {str(e)}")
+            return {"backlog": None, "error": str(e)}
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Process counters plus the shared backlog"""
+        return {
+            **self.stats,
+            **await self.get_backlog_stats(),
+            "running": self.running,
+            "max_workers": self.max_workers,
+            "node_id": self.node_id,
+            "kinds": list(self.handlers)
+        }
+
+# Global email outbox instance
+email_outbox = EmailOutbox()
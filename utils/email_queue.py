@@ -3,25 +3,41 @@ Email Queue System for Certificate Delivery
 
 This module implements a background queue system for sending certificate emails
 to handle high concurrent loads efficiently without blocking the main application.
+
+Tasks are persisted in the durable email outbox (utils/email_outbox.py), so they
+survive restarts, are retried with backoff and can be drained by any worker process.
+
+Duplicate requests are dropped without reading the student document: concurrent
+requests for the same student and event share one enqueue, and the participation's
+certificate_email_state is moved pending -> sending -> sent with conditional writes.
 """
 
 import asyncio
 import logging
-from datetime import datetime
-from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Union
 from dataclasses import dataclass
-from pathlib import Path
-import base64
-from tempfile import NamedTemporaryFile
-from concurrent.futures import ThreadPoolExecutor
 import threading
 
 from utils.optimized_email_service import optimized_email_service
+from utils.email_metrics import email_metrics
+from utils.email_outbox import email_outbox
 from utils.db_operations import DatabaseOperations
 from utils.js_certificate_generator import generate_certificate_file_name
+from utils.email_attachments import EmailAttachment, InvalidAttachmentError
 
 logger = logging.getLogger(__name__)
 
+class CertificateEmailState:
+    """event_participations.<event_id>.certificate_email_state values"""
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+# A pending or sending state older than this is treated as abandoned and can be queued again
+STALE_STATE_AFTER = timedelta(hours=1)
+
 @dataclass
 class CertificateEmailTask:
     """Represents a certificate email task in the queue"""
@@ -31,61 +47,127 @@ class CertificateEmailTask:
     student_name: str
     student_email: str
     event_title: str
-    pdf_base64: str
+    pdf_base64: Optional[str]
     file_name: str
     created_at: datetime
     attempts: int = 0
     max_attempts: int = 3
+    pdf_bytes: Optional[bytes] = None
+    
+    def attachment(self) -> EmailAttachment:
+        """The certificate PDF as an in-memory attachment"""
+        file_name = f"{generate_certificate_file_name(self.student_name, self.event_title)}.pdf"
+        if self.pdf_bytes is not None:
+            return EmailAttachment.pdf(file_name, self.pdf_bytes)
+        return EmailAttachment.pdf(file_name, self.pdf_base64, is_base64=True)
     
 class CertificateEmailQueue:
-    """Background queue system for certificate email delivery"""
+    """Certificate email delivery through the durable email outbox"""
+    
+    KIND = "certificate"
     
     def __init__(self, max_workers: int = 5, batch_size: int = 10):
-        self.queue = asyncio.Queue(maxsize=1000)  # Max 1000 pending emails
         self.max_workers = max_workers
         self.batch_size = batch_size
-        self.workers = []
-        self.running = False
+        self.outbox = email_outbox
+        self.outbox.max_workers = max_workers
+        self.outbox.register_handler(self.KIND, self._handle_outbox_message)
         self.stats = {
             "total_queued": 0,
+            "total_duplicates": 0,
             "total_sent": 0,
-            "total_failed": 0,
-            "current_queue_size": 0,
-            "active_workers": 0
+            "total_failed": 0
         }
         self._lock = threading.Lock()
+        # (enrollment_no, event_id) -> result of the enqueue in progress for that certificate
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        
+    @property
+    def running(self) -> bool:
+        return self.outbox.running
         
     async def start(self):
-        """Start the email queue workers"""
+        """Start the email outbox workers"""
         if self.running:
             return
             
-        self.running = True
-        # Use the global optimized email service (no need to create instance)
-        
-        # Start worker tasks
-        for i in range(self.max_workers):
-            worker = asyncio.create_task(self._worker(f"worker-{i+1}"))
-            self.workers.append(worker)
-            
-        logger.info(f"Certificate email queue started with {self.max_workers} workers")
+        await self.outbox.start()
+        logger.info(f"Certificate email queue started with {self.max_workers} outbox workers")
         
     async def stop(self):
-        """Stop the email queue workers"""
+        """Stop the email outbox workers"""
         if not self.running:
             return
             
-        self.running = False
+        await self.outbox.stop()
+        logger.info("Certificate email queue stopped")
         
-        # Cancel all workers
-        for worker in self.workers:
-            worker.cancel()
-            
-        # Wait for workers to finish
-        await asyncio.gather(*self.workers, return_exceptions=True)
+    @staticmethod
+    def idempotency_key(enrollment_no: str, event_id: str) -> str:
+        """One certificate email per student per event"""
+        return f"certificate:{event_id}:{enrollment_no}"
         
-        self.workers.clear()
-        logger.info("Certificate email queue stopped")
+    @staticmethod
+    def _state_fields(event_id: str) -> Tuple[str, str, str]:
+        participation = f"event_participations.{event_id}"
+        return f"{participation}.certificate_email_state", f"{participation}.certificate_email_state_at", f"{participation}.certificate_email_sent"
+        
+    @staticmethod
+    def _claim_field(event_id: str) -> str:
+        """Outbox attempt number that holds the sending claim"""
+        return f"event_participations.{event_id}.certificate_email_attempt"
+        
+    async def _mark_pending(self, enrollment_no: str, event_id: str) -> bool:
+        """Set the certificate email state to pending unless it is already queued, sending or sent"""
+        state, state_at, sent = self._state_fields(event_id)
+        now = datetime.utcnow()
+        return await DatabaseOperations.update_one(
+            "students",
+            {
+                "enrollment_no": enrollment_no,
+                f"event_participations.{event_id}": {"$exists": True},
+                sent: {"$ne": True},
+                "$or": [
+                    {state: {"$nin": [CertificateEmailState.PENDING, CertificateEmailState.SENDING, CertificateEmailState.SENT]}},
+                    {state: {"$in": [CertificateEmailState.PENDING, CertificateEmailState.SENDING]}, state_at: {"$lt": now - STALE_STATE_AFTER}}
+                ]
+            },
+            {"$set": {state: CertificateEmailState.PENDING, state_at: now}}
+        )
+        
+    async def _claim(self, task: CertificateEmailTask) -> bool:
+        """Move the certificate email state to sending; False if it was sent or another worker is sending it"""
+        state, state_at, sent = self._state_fields(task.event_id)
+        claim = self._claim_field(task.event_id)
+        return await DatabaseOperations.update_one(
+            "students",
+            {
+                "enrollment_no": task.enrollment_no,
+                sent: {"$ne": True},
+                "$or": [
+                    # Tasks queued before the state existed have none
+                    {state: {"$nin": [CertificateEmailState.SENDING, CertificateEmailState.SENT]}},
+                    # Held by an earlier attempt of this message: the outbox only hands the message out
+                    # again after that attempt's lease (renewed while it runs) expired, so its worker is gone
+                    {state: CertificateEmailState.SENDING, claim: {"$lt": task.attempts}}
+                ]
+            },
+            {"$set": {state: CertificateEmailState.SENDING, state_at: datetime.utcnow(), claim: task.attempts}}
+        )
+        
+    async def _release(self, task: CertificateEmailTask, new_state: str) -> bool:
+        """Move a claimed certificate email out of the sending state"""
+        state, state_at, sent = self._state_fields(task.event_id)
+        update = {state: new_state, state_at: datetime.utcnow()}
+        if new_state == CertificateEmailState.SENT:
+            # Still read by the certificate routes
+            update[sent] = True
+            # Recorded even if a later attempt took the claim over: the email did go out
+            query = {"enrollment_no": task.enrollment_no, state: {"$ne": CertificateEmailState.SENT}}
+        else:
+            # Only while this attempt still holds the claim, never over a takeover or a sent email
+            query = {"enrollment_no": task.enrollment_no, state: CertificateEmailState.SENDING, self._claim_field(task.event_id): task.attempts}
+        return await DatabaseOperations.update_one("students", query, {"$set": update})
         
     async def add_certificate_email(
         self, 
@@ -94,166 +176,196 @@ class CertificateEmailQueue:
         student_name: str,
         student_email: str,
         event_title: str,
-        pdf_base64: str,
-        file_name: str
+        pdf_base64: Optional[str],
+        file_name: str,
+        pdf_bytes: Optional[Union[bytes, memoryview]] = None
     ) -> bool:
-        """Add a certificate email task to the queue"""
+        """Add a certificate email task to the outbox (PDF as base64 text or raw bytes)"""
         
-        try:
-            # Check if already sent (one-time logic)
-            student_doc = await DatabaseOperations.find_one("students", {"enrollment_no": enrollment_no})
-            if not student_doc:
-                logger.error(f"Student {enrollment_no} not found")
-                return False
-                
-            event_participations = student_doc.get("event_participations", {})
-            participation = event_participations.get(event_id, {})
+        # Concurrent requests for the same certificate wait for the first one instead of storing the PDF again
+        key = (enrollment_no, event_id)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            with self._lock:
+                self.stats["total_duplicates"] += 1
+            logger.info(f"Certificate email for {enrollment_no} and event {event_id} is already being queued")
+            return await asyncio.shield(inflight)
             
-            if participation.get("certificate_email_sent", False):
-                logger.info(f"Certificate email already sent for student {enrollment_no} and event {event_id}")
-                return True  # Return success since email was already sent
-            
-            # Create task
-            task = CertificateEmailTask(
-                task_id=f"{enrollment_no}_{event_id}_{datetime.now().timestamp()}",
-                event_id=event_id,
-                enrollment_no=enrollment_no,
-                student_name=student_name,
-                student_email=student_email,
-                event_title=event_title,
-                pdf_base64=pdf_base64,
-                file_name=file_name,
-                created_at=datetime.now()
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        success = False
+        try:
+            success = await self._add_certificate_email(
+                event_id, enrollment_no, student_name, student_email, event_title, pdf_base64, file_name, pdf_bytes
             )
+            return success
+        finally:
+            self._inflight.pop(key, None)
+            future.set_result(success)
             
-            # Add to queue (non-blocking)
+    async def _add_certificate_email(
+        self,
+        event_id: str,
+        enrollment_no: str,
+        student_name: str,
+        student_email: str,
+        event_title: str,
+        pdf_base64: Optional[str],
+        file_name: str,
+        pdf_bytes: Optional[Union[bytes, memoryview]]
+    ) -> bool:
+        try:
+            # Reject anything that isn't a PDF before it is stored
             try:
-                self.queue.put_nowait(task)
-                with self._lock:
-                    self.stats["total_queued"] += 1
-                    self.stats["current_queue_size"] = self.queue.qsize()
-                    
-                logger.info(f"Added certificate email task to queue: {task.task_id}")
-                return True
+                if pdf_bytes is not None:
+                    pdf_bytes = bytes(EmailAttachment.pdf(file_name, pdf_bytes).data)
+                else:
+                    pdf_base64 = EmailAttachment.pdf(file_name, pdf_base64, is_base64=True).base64_data.decode("ascii")
+            except InvalidAttachmentError as e:
+                logger.error(f"Rejected certificate email for {enrollment_no}: {str(e)}")
+                return False
                 
-            except asyncio.QueueFull:
-                logger.error("Certificate email queue is full, rejecting new task")
+            # One conditional write instead of reading the student (one-time logic)
+            if not await self._mark_pending(enrollment_no, event_id):
+                # Only on this rare path: tell a missing participation apart from a duplicate
+                has_participation = await DatabaseOperations.count_documents(
+                    "students",
+                    {"enrollment_no": enrollment_no, f"event_participations.{event_id}": {"$exists": True}}
+                )
+                if not has_participation:
+                    logger.error(f"Student {enrollment_no} is not registered for event {event_id}, certificate email not queued")
+                    return False
+                with self._lock:
+                    self.stats["total_duplicates"] += 1
+                logger.info(f"Certificate email already queued or sent for student {enrollment_no} and event {event_id}")
+                return True  # Return success since the email is on its way or was already sent
+            
+            # Persist the task; a repeated request for the same student and event is stored once
+            task_id = self.idempotency_key(enrollment_no, event_id)
+            document = await self.outbox.enqueue(
+                self.KIND,
+                {
+                    "event_id": event_id,
+                    "enrollment_no": enrollment_no,
+                    "student_name": student_name,
+                    "student_email": student_email,
+                    "event_title": event_title,
+                    # Raw uploads are stored as BSON binary, base64 uploads as text
+                    "pdf_base64": pdf_base64 if pdf_bytes is None else None,
+                    "pdf_bytes": pdf_bytes,
+                    "file_name": file_name
+                },
+                idempotency_key=task_id,
+                max_attempts=CertificateEmailTask.max_attempts
+            )
+            if document is None:
+                logger.error(f"Failed to add certificate email task to outbox: {task_id}")
+                state, state_at, _ = self._state_fields(event_id)
+                await DatabaseOperations.update_one(
+                    "students",
+                    {"enrollment_no": enrollment_no, state: CertificateEmailState.PENDING},
+                    {"$unset": {state: "", state_at: ""}}
+                )
                 return False
                 
+            with self._lock:
+                self.stats["total_queued"] += 1
+            logger.info(f"Added certificate email task to outbox: {task_id}")
+            return True
+                
         except Exception as e:
             logger.error(f"Error adding certificate email to queue: {str(e)}")
             return False
             
-    async def _worker(self, worker_name: str):
-        """Background worker to process email tasks"""
-        logger.info(f"Certificate email worker {worker_name} started")
+    async def _handle_outbox_message(self, payload: Dict, message: Dict) -> bool:
+        """Outbox handler: rebuild the task and send it"""
+        task = CertificateEmailTask(
+            task_id=message["_id"],
+            event_id=payload["event_id"],
+            enrollment_no=payload["enrollment_no"],
+            student_name=payload["student_name"],
+            student_email=payload["student_email"],
+            event_title=payload["event_title"],
+            pdf_base64=payload.get("pdf_base64"),
+            pdf_bytes=payload.get("pdf_bytes"),
+            file_name=payload["file_name"],
+            created_at=message.get("created_at"),
+            attempts=message.get("attempts", 1),
+            max_attempts=message.get("max_attempts", CertificateEmailTask.max_attempts)
+        )
+        success = await self._process_email_task(task, message.get("worker_id") or "outbox")
         
-        while self.running:
-            try:
-                # Get task from queue with timeout
-                task = await asyncio.wait_for(self.queue.get(), timeout=1.0)
-                
-                with self._lock:
-                    self.stats["active_workers"] += 1
-                    self.stats["current_queue_size"] = self.queue.qsize()
-                
-                # Process the task
-                success = await self._process_email_task(task, worker_name)
-                
-                # Update stats
-                with self._lock:
-                    self.stats["active_workers"] -= 1
-                    if success:
-                        self.stats["total_sent"] += 1
-                    else:
-                        self.stats["total_failed"] += 1
-                
-                # Mark task as done
-                self.queue.task_done()
-                
-            except asyncio.TimeoutError:
-                # No task available, continue
-                continue
-            except asyncio.CancelledError:
-                # Worker cancelled
-                break
-            except Exception as e:
-                logger.error(f"Worker {worker_name} error: {str(e)}")
-                continue
-                
-        logger.info(f"Certificate email worker {worker_name} stopped")
+        with self._lock:
+            if success:
+                self.stats["total_sent"] += 1
+            else:
+                self.stats["total_failed"] += 1
+        return success
         
     async def _process_email_task(self, task: CertificateEmailTask, worker_name: str) -> bool:
         """Process a single email task"""
-        temp_file_path = None
-        
         try:
-            logger.info(f"[{worker_name}] Processing certificate email for {task.enrollment_no}")
+            logger.info(f"[{worker_name}] Processing certificate email for {task.enrollment_no} (attempt {task.attempts}/{task.max_attempts})")
             
-            # Check if already sent (double-check)
-            student_doc = await DatabaseOperations.find_one("students", {"enrollment_no": task.enrollment_no})
-            if student_doc:
-                participation = student_doc.get("event_participations", {}).get(task.event_id, {})
-                if participation.get("certificate_email_sent", False):
-                    logger.info(f"[{worker_name}] Email already sent for {task.enrollment_no}, skipping")
-                    return True
-            
-            # Decode and validate PDF data
-            pdf_data = base64.b64decode(task.pdf_base64)
-            if not pdf_data.startswith(b'%PDF'):
-                logger.error(f"[{worker_name}] Invalid PDF data for task {task.task_id}")
-                return False
-                
-            # Create temporary file
-            safe_file_name = generate_certificate_file_name(task.student_name, task.event_title)
-            with NamedTemporaryFile(delete=False, suffix='.pdf', prefix=f'{safe_file_name}_') as temp_file:
-                temp_file.write(pdf_data)
-                temp_file_path = temp_file.name
-                  # Send email using optimized email service
-            success = await optimized_email_service.send_certificate_notification(
-                student_email=task.student_email,
-                student_name=task.student_name,
-                event_title=task.event_title,
-                certificate_url=f"/client/events/{task.event_id}/certificate",
-                event_date=None,  # We can add this to the task if needed
-                certificate_pdf_path=temp_file_path
-            )
+            # Claim the send (pending -> sending); fails if it was already sent or is being sent
+            if not await self._claim(task):
+                logger.info(f"[{worker_name}] Email already sent or being sent for {task.enrollment_no}, skipping")
+                return True
             
-            if success:
-                # Mark as sent in database
-                await DatabaseOperations.update_one(
-                    "students",
-                    {"enrollment_no": task.enrollment_no},
-                    {"$set": {f"event_participations.{task.event_id}.certificate_email_sent": True}}
+            success = False
+            try:
+                # Attach the PDF from memory (validated when it was queued)
+                try:
+                    attachment = task.attachment()
+                except InvalidAttachmentError as e:
+                    logger.error(f"[{worker_name}] Invalid PDF data for task {task.task_id}: {str(e)}")
+                    return False
+                    
+                # Send email using optimized email service
+                success = await optimized_email_service.send_certificate_notification(
+                    student_email=task.student_email,
+                    student_name=task.student_name,
+                    event_title=task.event_title,
+                    certificate_url=f"/client/events/{task.event_id}/certificate",
+                    event_date=None,  # We can add this to the task if needed
+                    certificate_attachment=attachment
                 )
+            finally:
+                if success:
+                    # Mark as sent in database
+                    with email_metrics.time_stage("db_mark_sent"):
+                        await self._release(task, CertificateEmailState.SENT)
+                else:
+                    # Let the outbox retry claim it again, or allow a new request after the last attempt
+                    final = task.attempts >= task.max_attempts
+                    await self._release(task, CertificateEmailState.FAILED if final else CertificateEmailState.PENDING)
+                    
+            if success:
                 logger.info(f"[{worker_name}] Certificate email sent successfully for {task.enrollment_no}")
-                return True
             else:
                 logger.error(f"[{worker_name}] Failed to send email for {task.enrollment_no}")
-                return False
+            return success
                 
         except Exception as e:
             logger.error(f"[{worker_name}] Error processing email task {task.task_id}: {str(e)}")
             return False
-            
-        finally:
-            # Clean up temporary file
-            if temp_file_path and Path(temp_file_path).exists():
-                try:
-                    Path(temp_file_path).unlink()
-                    logger.debug(f"[{worker_name}] Cleaned up temporary file: {temp_file_path}")
-                except Exception as cleanup_error:
-                    logger.warning(f"[{worker_name}] Failed to clean up temporary file: {cleanup_error}")
                     
     def get_stats(self) -> Dict:
-        """Get queue statistics"""
+        """Get this process's queue counters"""
         with self._lock:
             return {
                 **self.stats,
-                "current_queue_size": self.queue.qsize(),
+                "active_workers": self.outbox.stats["active_workers"],
                 "running": self.running,
                 "max_workers": self.max_workers
             }
+            
+    async def get_outbox_stats(self) -> Dict:
+        """Queue counters plus the shared outbox backlog depth and age"""
+        return {
+            **self.get_stats(),
+            "outbox": await self.outbox.get_stats()
+        }
 
 # Global email queue instance
 certificate_email_queue = CertificateEmailQueue(max_workers=5, batch_size=10)
@@ -1,50 +1,56 @@
-import smtplib
-import ssl
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
-from jinja2 import Environment, FileSystemLoader
+from utils.template_environment import get_email_environment
+from utils.mail_merge import mail_merge
+from utils.email_attachments import EmailAttachment
+from utils.email_transport import email_transport
+from utils.email_metrics import email_metrics, email_type_for_template, set_email_type
 import os
-from typing import Optional, List
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, List, Union
 from pathlib import Path
 import logging
 from datetime import datetime
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-import threading
-import time
 from config.settings import get_settings
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# A file path or an in-memory attachment
+Attachment = Union[str, EmailAttachment]
+
+@dataclass
+class ComposedEmail:
+    """What a send method would send: recipient, subject, and the template with its context"""
+    to_email: str
+    subject: str
+    template_name: str
+    context: Dict[str, Any] = field(default_factory=dict)
+
+# Set by outbox handlers, which retry failed deliveries themselves: attempts per send_email_async call
+_send_attempts: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("email_send_attempts", default=None)
+
+# Set while compose() runs a send method, which then records its email here instead of sending it
+_composing: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("composing_email", default=None)
+
 class EmailService:
     def __init__(self):
-        """Initialize the EmailService with SMTP configuration from settings"""
+        """Initialize the EmailService on top of the process-wide email transport"""
         try:
             self.settings = get_settings()
             
             # SMTP Configuration from settings
             self.smtp_server = self.settings.SMTP_SERVER
             self.smtp_port = self.settings.SMTP_PORT
-            self.email_user = self.settings.EMAIL_USER
-            self.email_password = self.settings.EMAIL_PASSWORD
-            self.from_email = self.settings.FROM_EMAIL or self.email_user
             
             # Email Templates Configuration
-            template_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates', 'email')
-            self.env = Environment(loader=FileSystemLoader(template_dir))
+            self.env = get_email_environment()
             
-            # Thread pool for async email sending
-            self.executor = ThreadPoolExecutor(max_workers=3)
-            
-            # Connection management
-            self._connection = None
-            self._connection_lock = threading.Lock()
-            self._last_activity = None
-            self.connection_timeout = 300  # 5 minutes timeout
+            # Connection pool and executor are shared by every email service in the process
+            self.transport = email_transport
+            self.from_email = self.transport.from_email
             self.max_retries = 3
             
             logger.info(f"EmailService initialized with SMTP server: {self.smtp_server}:{self.smtp_port}")
@@ -53,151 +59,57 @@ class EmailService:
             logger.error(f"Failed to initialize EmailService: {str(e)}")
             raise
 
-    def _get_connection(self):
-        """Get or create SMTP connection with connection pooling"""
-        with self._connection_lock:
-            current_time = time.time()
-            
-            # Check if connection exists and is still valid
-            if (self._connection and 
-                self._last_activity and 
-                (current_time - self._last_activity) < self.connection_timeout):
-                try:
-                    # Test connection with NOOP command
-                    self._connection.noop()
-                    logger.debug("Reusing existing SMTP connection")
-                    return self._connection
-                except Exception as e:
-                    logger.warning(f"Existing connection invalid: {str(e)}")
-                    self._close_connection()
-            
-            # Create new connection
-            return self._create_new_connection()
-    
-    def _create_new_connection(self):
-        """Create a new SMTP connection"""
+    async def send_email_async(self, to_email: str, subject: str, html_content: str, text_content: Optional[str] = None, attachments: Optional[List[Attachment]] = None) -> bool:
+        """Asynchronous email sending method with attachment support and retry logic"""
+        composing = _composing.get()
+        if composing is not None:
+            composing.update(to_email=to_email, subject=subject)
+            return True
+
         try:
-            logger.info(f"Creating new SMTP connection to {self.smtp_server}:{self.smtp_port}")
-            
-            context = ssl.create_default_context()
-            connection = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            
-            logger.debug("SMTP connection established, starting TLS")
-            connection.starttls(context=context)
-            
-            logger.debug("TLS started, attempting login")
-            connection.login(self.email_user, self.email_password)
-            
-            self._connection = connection
-            self._last_activity = time.time()
-            
-            logger.info("SMTP connection and authentication successful")
-            return connection
-            
+            message = await self.transport.build_message_async(to_email, subject, html_content, text_content, attachments)
         except Exception as e:
-            logger.error(f"Failed to create SMTP connection: {str(e)}")
-            raise
-    
-    def _close_connection(self):
-        """Close the current SMTP connection"""
-        if self._connection:
-            try:
-                self._connection.quit()
-                logger.debug("SMTP connection closed")
-            except:
-                pass  # Connection might already be closed
-            finally:
-                self._connection = None
-                self._last_activity = None
-    
-    def _send_email_sync(self, to_email: str, subject: str, html_content: str, text_content: Optional[str] = None, attachments: Optional[List[str]] = None) -> bool:
-        """Synchronous email sending method with connection reuse and retry logic"""
-        for attempt in range(self.max_retries):
+            logger.error(f"Failed to build email to {to_email}: {str(e)}")
+            return False
+
+        attempts = _send_attempts.get() or self.max_retries
+        for attempt in range(attempts):
             try:
-                # Create message
-                message = MIMEMultipart("mixed")
-                message["Subject"] = subject
-                message["From"] = self.from_email
-                message["To"] = to_email
-
-                # Create alternative container for text and HTML content
-                msg_alternative = MIMEMultipart("alternative")
-
-                # Add text content if provided
-                if text_content:
-                    text_part = MIMEText(text_content, "plain")
-                    msg_alternative.attach(text_part)
-
-                # Add HTML content
-                html_part = MIMEText(html_content, "html")
-                msg_alternative.attach(html_part)
-
-                # Attach the alternative container to the main message
-                message.attach(msg_alternative)
-
-                # Add attachments if provided
-                if attachments:
-                    for attachment_path in attachments:
-                        if os.path.exists(attachment_path):
-                            with open(attachment_path, "rb") as attachment:
-                                part = MIMEBase('application', 'octet-stream')
-                                part.set_payload(attachment.read())
-                            
-                            encoders.encode_base64(part)
-                            
-                            # Get filename from path
-                            filename = os.path.basename(attachment_path)
-                            part.add_header(
-                                'Content-Disposition',
-                                f'attachment; filename= {filename}',
-                            )
-                            message.attach(part)
-                            logger.debug(f"Added attachment: {filename}")
-
-                # Get connection and send email
-                connection = self._get_connection()
-                connection.sendmail(self.from_email, to_email, message.as_string())
-                
-                # Update last activity time
-                with self._connection_lock:
-                    self._last_activity = time.time()
-                
-                logger.info(f"Email sent successfully to {to_email} (attempt {attempt + 1})")
-                return True
-                
+                if await self.transport.send_message(to_email, message):
+                    logger.info(f"Email sent successfully to {to_email} (attempt {attempt + 1})")
+                    return True
+                logger.warning(f"Failed to send email to {to_email} (attempt {attempt + 1})")
             except Exception as e:
                 logger.warning(f"Failed to send email to {to_email} (attempt {attempt + 1}): {str(e)}")
-                
-                # Close connection on error to force reconnection
-                with self._connection_lock:
-                    self._close_connection()
-                
-                if attempt == self.max_retries - 1:
-                    logger.error(f"Failed to send email to {to_email} after {self.max_retries} attempts")
-                    return False
-                else:
-                    # Wait before retrying
-                    time.sleep(2 ** attempt)  # Exponential backoff
-        
+
+            if attempt < attempts - 1:
+                await asyncio.sleep(2 ** attempt)  # Exponential backoff
+
+        logger.error(f"Failed to send email to {to_email} after {attempts} attempts")
         return False
 
-    async def send_email_async(self, to_email: str, subject: str, html_content: str, text_content: Optional[str] = None, attachments: Optional[List[str]] = None) -> bool:
-        """Asynchronous email sending method with attachment support"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor, 
-            self._send_email_sync, 
-            to_email,            subject, 
-            html_content, 
-            text_content,
-            attachments
-        )
+    @contextmanager
+    def single_attempt(self):
+        """Send without in-process retries inside the block (for callers that retry themselves, e.g. the outbox)"""
+        token = _send_attempts.set(1)
+        try:
+            yield
+        finally:
+            _send_attempts.reset(token)
         
     def render_template(self, template_name: str, **kwargs) -> str:
         """Render email template with provided context"""
+        composing = _composing.get()
+        if composing is not None:
+            composing.update(template_name=template_name, context=kwargs)
+            return ""
+
+        # Tags the rest of this send (MIME build, SMTP, ...) with the email type for metrics
+        set_email_type(email_type_for_template(template_name))
         try:
-            template = self.env.get_template(template_name)
-            return template.render(**kwargs)
+            with email_metrics.time_stage("render"):
+                template = self.env.get_template(template_name)
+                return template.render(**kwargs)
         except Exception as e:
             logger.error(f"Failed to render template {template_name}: {str(e)}")
             return f"<html><body><h1>Email Content</h1><p>Error rendering template: {str(e)}</p></body></html>"    
@@ -359,7 +271,8 @@ class EmailService:
         event_title: str, 
         certificate_url: str,
         event_date: Optional[str] = None,
-        certificate_pdf_path: Optional[str] = None
+        certificate_pdf_path: Optional[str] = None,
+        certificate_attachment: Optional[EmailAttachment] = None
     ) -> bool:
         """Send certificate available notification email"""
         try:
@@ -374,7 +287,9 @@ class EmailService:
             )
             
             attachments = []
-            if certificate_pdf_path and Path(certificate_pdf_path).exists():
+            if certificate_attachment is not None:
+                attachments.append(certificate_attachment)
+            elif certificate_pdf_path and Path(certificate_pdf_path).exists():
                 attachments.append(str(certificate_pdf_path))
             
             return await self.send_email_async(student_email, subject, html_content, attachments=attachments)
@@ -477,11 +392,13 @@ class EmailService:
         try:
             subject = f"Team Registration Confirmed - {event_title}"
             
-            # Send email to all team members
-            email_tasks = []
-            for member in team_members:
-                html_content = self.render_template(
-                    'team_registration_confirmation.html',
+            # The body is the same for every member, so it is rendered once
+            report = await mail_merge.send_campaign(
+                campaign=f"team-registration:{team_registration_id}",
+                template_name='team_registration_confirmation.html',
+                subject=subject,
+                recipients=team_members,
+                shared_context=dict(
                     team_name=team_name,
                     event_title=event_title,
                     event_date=event_date,
@@ -492,15 +409,10 @@ class EmailService:
                     payment_required=payment_required,
                     payment_amount=payment_amount
                 )
-                
-                task = self.send_email_async(member['email'], subject, html_content)
-                email_tasks.append(task)
-            
-            results = await asyncio.gather(*email_tasks, return_exceptions=True)
-            success_count = sum(1 for result in results if isinstance(result, bool) and result)
+            )
             
-            logger.info(f"Team registration emails sent: {success_count}/{len(team_members)} successful")
-            return success_count > 0
+            logger.info(f"Team registration emails sent: {report.sent}/{len(team_members)} successful")
+            return report.sent > 0
             
         except Exception as e:
             logger.error(f"Failed to send team registration confirmation: {str(e)}")
@@ -516,63 +428,101 @@ class EmailService:
     ) -> List[bool]:
         """Send event reminders to all registered students for an event"""
         try:
-            email_tasks = []
-            for student in registered_students:
-                task = self.send_event_reminder(
-                    student['email'],
-                    student['full_name'],
-                    event_title,
-                    event_date,
-                    event_venue,
-                    reminder_type
-                )
-                email_tasks.append(task)
-            
-            if email_tasks:
-                results = await asyncio.gather(*email_tasks, return_exceptions=True)
-                success_results = [isinstance(result, bool) and result for result in results]
-                
-                success_count = sum(success_results)
-                logger.info(f"Event reminder emails sent: {success_count}/{len(registered_students)} successful")
-                
-                return success_results
-            return []
+            # Rendered once for the event; only the student name differs per message
+            report = await mail_merge.send_campaign(
+                campaign=f"event-reminder:{event_title}:{reminder_type}",
+                template_name='event_reminder.html',
+                subject=f"Reminder: {event_title} - {reminder_type.title()}",
+                recipients=[
+                    {"email": student.get('email'), "student_name": student.get('full_name')}
+                    for student in registered_students
+                ],
+                shared_context=dict(
+                    event_title=event_title,
+                    event_date=event_date,
+                    event_venue=event_venue,
+                    reminder_type=reminder_type
+                ),
+                merge_fields=["student_name"]
+            )
+            
+            logger.info(f"Event reminder emails sent: {report.sent}/{len(registered_students)} successful")
+            return report.results
             
         except Exception as e:
             logger.error(f"Failed to send bulk event reminders: {str(e)}")
             return [False] * len(registered_students)
 
+    async def compose(self, method: str, **kwargs) -> Optional[ComposedEmail]:
+        """Run a send method without sending anything and return the email it would have sent"""
+        composing: Dict[str, Any] = {}
+        token = _composing.set(composing)
+        try:
+            await getattr(self, method)(**kwargs)
+        finally:
+            _composing.reset(token)
+
+        if "template_name" not in composing or "subject" not in composing:
+            logger.error(f"{method} did not produce an email to compose")
+            return None
+        return ComposedEmail(**composing)
+
+    def render_digest_section(self, email: ComposedEmail) -> Dict[str, str]:
+        """Render the header title and main content blocks of a composed email for a digest"""
+        template = self.env.get_template(email.template_name)
+        context = template.new_context(email.context)
+
+        def render_block(name: str) -> str:
+            if name not in template.blocks:
+                return ""
+            return "".join(template.blocks[name](context)).strip()
+
+        return {
+            "title": render_block("header_title") or email.subject,
+            "subject": email.subject,
+            "html": render_block("main_content")
+        }
+
+    async def send_digest(self, student_email: str, student_name: str, emails: List[ComposedEmail]) -> bool:
+        """Send several composed emails to one student as a single digest email"""
+        try:
+            sections = []
+            for email in emails:
+                try:
+                    sections.append(self.render_digest_section(email))
+                except Exception as e:
+                    logger.error(f"Failed to render digest section {email.template_name}: {str(e)}")
+                    return False
+
+            subject = f"Your CampusConnect Updates - {len(sections)} new notifications"
+
+            html_content = self.render_template(
+                'notification_digest.html',
+                student_name=student_name,
+                sections=sections
+            )
+
+            return await self.send_email_async(student_email, subject, html_content)
+
+        except Exception as e:
+            logger.error(f"Failed to send notification digest: {str(e)}")
+            return False
+
     def close_connection(self):
-        """Manually close the SMTP connection"""
-        with self._connection_lock:
-            self._close_connection()
-            logger.info("SMTP connection manually closed")
+        """Connections belong to the shared transport and are closed at application shutdown"""
+        logger.debug("close_connection() is a no-op, SMTP connections are pooled per process")
     
     def is_connected(self) -> bool:
-        """Check if there's an active SMTP connection"""
-        with self._connection_lock:
-            if not self._connection:
-                return False
-            try:
-                self._connection.noop()
-                return True
-            except:
-                self._close_connection()
-                return False
+        """Check if the shared pool holds an open SMTP connection"""
+        return self.transport.pool.get_stats()["active_connections"] > 0
     
     def get_connection_stats(self) -> dict:
         """Get connection statistics"""
-        with self._connection_lock:
-            return {
-                "is_connected": self.is_connected(),
-                "last_activity": self._last_activity,
-                "connection_timeout": self.connection_timeout,
-                "max_retries": self.max_retries
-            }
-
-    def __del__(self):
-        """Clean up the thread pool executor and SMTP connection"""
-        if hasattr(self, '_connection'):
-            self._close_connection()
-        if hasattr(self, 'executor'):
-            self.executor.shutdown(wait=False)
\ No newline at end of file
+        return {
+            "is_connected": self.is_connected(),
+            "max_retries": self.max_retries,
+            **self.transport.get_stats()
+        }
+
+# Global email service instance shared by the routes and helpers
+email_service = EmailService()
@@ -0,0 +1,183 @@
+"""
+Shared Email Transport
+
+One email transport per process: both EmailService and OptimizedEmailService
+build and send their messages through it, so every email shares one SMTP
+connection pool and one thread pool executor instead of each service instance
+opening its own SMTP session and executor.
+
+Features:
+- Transport selected once from SMTP_TRANSPORT ("asyncio" sends on the event loop,
+  "smtplib" runs the blocking pool in the shared executor)
+- MIME message building shared by every email service, run in the executor for
+  async callers (base64-encoding multi-MB PDFs would otherwise block the event loop)
+- Shared executor for blocking email work (smtplib sends, sync callers)
+- MIME build time and per-type outcomes recorded in utils/email_metrics.py
+- start/shutdown lifecycle hooks for the application startup and shutdown events;
+  start warms up SMTP_POOL_MIN_IDLE connections in the background
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from config.settings import get_settings
+from utils.async_smtp import async_smtp_pool
+from utils.email_attachments import EmailAttachment, as_attachment
+from utils.email_metrics import email_metrics
+from utils.smtp_pool import smtp_pool
+
+logger = logging.getLogger(__name__)
+
+# A file path or an in-memory attachment
+Attachment = Union[str, EmailAttachment]
+
+class EmailTransport:
+    """Process-wide SMTP pool and executor shared by the email services"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        settings = get_settings()
+        # One thread per pooled connection, so smtplib sends are bounded by the pool and not the executor
+        self.max_workers = max_workers or settings.SMTP_POOL_SIZE
+        # "asyncio" sends on the event loop; "smtplib" keeps the blocking client in the executor
+        self.transport = settings.SMTP_TRANSPORT.lower()
+        self.pool = async_smtp_pool if self.transport == "asyncio" else smtp_pool
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._warm_up_task: Optional[asyncio.Task] = None
+        self.started = False
+
+    @property
+    def from_email(self) -> str:
+        return self.pool.from_email
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """The shared executor, created on first use (also after shutdown)"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="email")
+        return self._executor
+
+    async def start(self):
+        """Startup hook: create the executor and warm up the SMTP pool before the first email is sent"""
+        if self.started:
+            return
+        self.started = True
+        _ = self.executor
+        # In the background so an unreachable SMTP server does not hold up startup
+        self._warm_up_task = asyncio.create_task(self._warm_up())
+        logger.info(f"Email transport started ({self.transport} SMTP pool, {self.max_workers} executor threads)")
+
+    async def _warm_up(self):
+        try:
+            if self.transport == "asyncio":
+                await async_smtp_pool.warm_up()
+            else:
+                await self.run_blocking(smtp_pool.warm_up)
+        except Exception as e:
+            logger.warning(f"SMTP pool warm-up failed, connections will be opened on demand: {str(e)}")
+
+    async def shutdown(self):
+        """Shutdown hook: close both SMTP pools and the executor"""
+        if self._warm_up_task is not None:
+            self._warm_up_task.cancel()
+            await asyncio.gather(self._warm_up_task, return_exceptions=True)
+            self._warm_up_task = None
+        smtp_pool.shutdown()
+        await async_smtp_pool.shutdown()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.started = False
+        logger.info("Email transport shutdown complete")
+
+    async def run_blocking(self, func: Callable[..., Any], *args) -> Any:
+        """Run blocking email work in the shared executor (keeping the caller's context, e.g. the email type)"""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, functools.partial(context.run, func, *args))
+
+    def build_message(self, to_email: str, subject: str, html_content: str, text_content: Optional[str] = None, attachments: Optional[List[Attachment]] = None) -> str:
+        """Build the MIME message for an email"""
+        with email_metrics.time_stage("mime_build"):
+            return self._build_message(to_email, subject, html_content, text_content, attachments)
+
+    async def build_message_async(self, to_email: str, subject: str, html_content: str, text_content: Optional[str] = None, attachments: Optional[List[Attachment]] = None) -> str:
+        """Build the MIME message in the shared executor"""
+        return await self.run_blocking(self.build_message, to_email, subject, html_content, text_content, attachments)
+
+    def _build_message(self, to_email: str, subject: str, html_content: str, text_content: Optional[str], attachments: Optional[List[Attachment]]) -> str:
+        message = MIMEMultipart("mixed")
+        message["Subject"] = subject
+        message["From"] = self.from_email
+        message["To"] = to_email
+
+        # Create alternative container for text and HTML content
+        msg_alternative = MIMEMultipart("alternative")
+        if text_content:
+            msg_alternative.attach(MIMEText(text_content, "plain"))
+        msg_alternative.attach(MIMEText(html_content, "html"))
+        message.attach(msg_alternative)
+
+        # Add attachments if provided (in-memory attachments or file paths)
+        if attachments:
+            for attachment in attachments:
+                attachment = as_attachment(attachment)
+                if attachment is not None:
+                    message.attach(attachment.to_mime_part())
+                    logger.debug(f"Added attachment: {attachment.filename} ({attachment.size} bytes)")
+
+        return message.as_string()
+
+    async def send_message(self, to_email: str, message: str) -> bool:
+        """Send an already-built MIME message through the configured transport"""
+        if self.transport == "asyncio":
+            success = await async_smtp_pool.send_email_with_pool(to_email, message)
+        else:
+            success = await self.run_blocking(smtp_pool.send_email_with_pool, to_email, message)
+        email_metrics.record_outcome(success)
+        return success
+
+    async def send_email(self, to_email: str, subject: str, html_content: str, text_content: Optional[str] = None, attachments: Optional[List[Attachment]] = None) -> bool:
+        """Build and send one email"""
+        try:
+            message = await self.build_message_async(to_email, subject, html_content, text_content, attachments)
+            success = await self.send_message(to_email, message)
+
+            if success:
+                logger.info(f"Email sent successfully to {to_email}")
+            else:
+                logger.error(f"Failed to send email to {to_email}")
+
+            return success
+
+        except Exception as e:
+            logger.error(f"Error sending email to {to_email}: {str(e)}")
+            return False
+
+    def send_email_blocking(self, to_email: str, subject: str, html_content: str, text_content: Optional[str] = None, attachments: Optional[List[Attachment]] = None) -> bool:
+        """Send one email from synchronous code using the smtplib pool (never call it on the event loop)"""
+        try:
+            message = self.build_message(to_email, subject, html_content, text_content, attachments)
+            success = smtp_pool.send_email_with_pool(to_email, message)
+            email_metrics.record_outcome(success)
+            return success
+        except Exception as e:
+            logger.error(f"Error sending email to {to_email}: {str(e)}")
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "transport": self.transport,
+            "started": self.started,
+            "executor_workers": self.max_workers,
+            "executor_active": self._executor is not None,
+            "pool": self.pool.get_stats()
+        }
+
+# Global email transport shared by every email service in the process
+email_transport = EmailTransport()
@@ -0,0 +1,156 @@
+"""
+Event Catalog Cache
+
+This module keeps an in-process, status-partitioned copy of the events collection so
+that public pages (homepage, client homepage, event listing) do not scan the events
+collection several times per request.
+
+Features:
+- One full scan per refresh, partitioned into upcoming / ongoing / completed
+- Precomputed event type counts for the client-facing (upcoming + ongoing) catalog
+- Write-through invalidation: every events write through DatabaseOperations
+  invalidates the catalog (and the event's version when the write names its event_id)
+- Per-event version numbers for downstream caches (HTTP ETags, rendered fragments)
+- TTL safety net in case an invalidation is ever missed
+- Hit/miss counters for monitoring
+"""
+
+import time
+import logging
+from typing import Callable, Dict, List, Any, Optional
+
+from utils.cache import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+class EventCatalog:
+    """Status-partitioned event catalog with write-through invalidation"""
+
+    STATUSES = ("upcoming", "ongoing", "completed")
+
+    def __init__(self, ttl_seconds: int = 60):
+        self.ttl_seconds = ttl_seconds
+        self._partitions: Dict[str, List[Dict[str, Any]]] = {status: [] for status in self.STATUSES}
+        self._event_type_counts: Dict[str, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._version = 0
+        self._loaded_version = -1
+        self._event_versions: Dict[str, int] = {}
+        self._refresh_flight = SingleFlight("event_catalog_refresh")
+        self._invalidation_listeners: List[Callable[[Optional[str]], None]] = []
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "invalidations": 0,
+            "refresh_errors": 0
+        }
+
+    @property
+    def version(self) -> int:
+        """Catalog-wide version, bumped on every invalidation"""
+        return self._version
+
+    def event_version(self, event_id: str) -> int:
+        """Version of a single event, bumped whenever that event is invalidated"""
+        return self._event_versions.get(event_id, 0)
+
+    def add_invalidation_listener(self, listener: Callable[[Optional[str]], None]):
+        """Register a callback run with the event_id whenever the catalog is invalidated"""
+        self._invalidation_listeners.append(listener)
+
+    def invalidate(self, event_id: Optional[str] = None):
+        """Invalidate the catalog (and the given event's version) after an event write"""
+        self._version += 1
+        if event_id:
+            self._event_versions[event_id] = self._event_versions.get(event_id, 0) + 1
+        self.stats["invalidations"] += 1
+        logger.debug(f"Event catalog invalidated (event={event_id}, version={self._version})")
+
+        for listener in self._invalidation_listeners:
+            try:
+                listener(event_id)
+            except Exception as e:
+                logger.error(f"Error in event catalog invalidation listener: {str(e)}")
+
+    def _is_fresh(self) -> bool:
+        if self._loaded_at is None or self._loaded_version != self._version:
+            return False
+        return (time.monotonic() - self._loaded_at) < self.ttl_seconds
+
+    async def _ensure_loaded(self):
+        """Refresh the catalog if it is stale; concurrent callers share a single refresh"""
+        if self._is_fresh():
+            self.stats["hits"] += 1
+            return
+
+        self.stats["misses"] += 1
+        await self._refresh_flight.do("refresh", self._refresh)
+
+    async def _refresh(self):
+        """Reload every event once and rebuild the status partitions"""
+        from utils.event_status_manager import EventStatusManager
+
+        version_at_start = self._version
+        try:
+            events = await EventStatusManager.get_available_events("all")
+        except Exception as e:
+            self.stats["refresh_errors"] += 1
+            logger.error(f"Error refreshing event catalog: {str(e)}")
+            return
+
+        partitions = {status: [] for status in self.STATUSES}
+        for event in events:
+            status = event.get('status')
+            if status in partitions:
+                partitions[status].append(event)
+
+        event_type_counts = {}
+        for event in partitions["upcoming"] + partitions["ongoing"]:
+            event_type = (event.get('event_type') or 'other').lower()
+            event_type_counts[event_type] = event_type_counts.get(event_type, 0) + 1
+
+        self._partitions = partitions
+        self._event_type_counts = event_type_counts
+        self._loaded_at = time.monotonic()
+        # If an invalidation raced with this refresh the catalog stays stale and
+        # the next request reloads it
+        self._loaded_version = version_at_start
+        self.stats["refreshes"] += 1
+        logger.info(f"Event catalog refreshed: {len(events)} events, version {version_at_start}")
+
+    async def get_events(self, status_filter: str) -> List[Dict[str, Any]]:
+        """
+        Get events for a status partition ("upcoming", "ongoing", "completed" or "all").
+
+        Returns shallow copies so callers can reformat fields without touching the cache.
+        """
+        await self._ensure_loaded()
+
+        if status_filter == "all":
+            events = [event for status in self.STATUSES for event in self._partitions[status]]
+        else:
+            events = self._partitions.get(status_filter, [])
+
+        return [dict(event) for event in events]
+
+    async def get_event_type_counts(self) -> Dict[str, int]:
+        """Get event type counts across upcoming and ongoing events"""
+        await self._ensure_loaded()
+        return dict(self._event_type_counts)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get catalog cache statistics"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": f"{(self.stats['hits'] / lookups * 100):.1f}%" if lookups else "0.0%",
+            "refresh_coalescing": self._refresh_flight.get_stats(),
+            "version": self._version,
+            "is_fresh": self._is_fresh(),
+            "ttl_seconds": self.ttl_seconds,
+            "events_cached": {status: len(events) for status, events in self._partitions.items()}
+        }
+
+# Global event catalog instance
+event_catalog = EventCatalog(ttl_seconds=60)
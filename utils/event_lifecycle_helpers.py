@@ -246,8 +246,7 @@ async def generate_certificate(enrollment_no: str, event_id: str):
         
         # Send certificate notification email
         try:
-            from utils.email_service import EmailService
-            email_service = EmailService()
+            from utils.email_service import email_service
             
             # Get event details for email
             event_data = await DatabaseOperations.find_one("events", {"event_id": event_id})
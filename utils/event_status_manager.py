@@ -11,9 +11,15 @@ from datetime import datetime, timedelta
 import logging
 from utils.db_operations import DatabaseOperations
 from utils.dynamic_event_scheduler import dynamic_scheduler
+from utils.event_catalog import event_catalog
+from utils.cache import SingleFlight
+import copy
 
 logger = logging.getLogger(__name__)
 
+# Concurrent get_event_by_id calls for the same event share one lookup/status check
+_event_lookup_flight = SingleFlight("get_event_by_id")
+
 class EventStatusManager:
     """
     Manages event statuses and provides high-level methods for event retrieval
@@ -99,6 +105,7 @@ class EventStatusManager:
                     )
                     event['status'] = calculated_status
                     event['sub_status'] = calculated_sub_status
+                    event_catalog.invalidate(event.get('event_id'))
                     logger.info(f"Updated event {event.get('event_id')} status to {calculated_status}/{calculated_sub_status}")
                   # Apply status filter after status update
                 if status_filter == "all" or event.get('status') == status_filter:
@@ -174,6 +181,7 @@ class EventStatusManager:
                         
                         if success:
                             stats["updated"] += 1
+                            event_catalog.invalidate(event_id)
                             logger.info(f"Updated event {event_id}: {current_status}/{current_sub_status} -> {new_status}/{new_sub_status}")
                         else:
                             logger.error(f"Failed to update event {event_id}")
@@ -445,31 +453,39 @@ class EventStatusManager:
             Event dictionary or None if not found
         """
         try:
-            event = await DatabaseOperations.find_one("events", {"event_id": event_id})
-            
-            if not event:
-                return None
-            
-            # Update status to ensure accuracy
-            current_time = datetime.now()
-            calculated_status, calculated_sub_status = await EventStatusManager._calculate_event_status(event, current_time)
-            
-            if event.get('status') != calculated_status or event.get('sub_status') != calculated_sub_status:
-                await DatabaseOperations.update_one(
-                    "events",
-                    {"event_id": event_id},
-                    {"$set": {
-                        "status": calculated_status,
-                        "sub_status": calculated_sub_status,
-                        "last_status_update": current_time
-                    }}
-                )
-                event['status'] = calculated_status
-                event['sub_status'] = calculated_sub_status
-                logger.info(f"Updated event {event_id} status to {calculated_status}/{calculated_sub_status}")
-            
-            return event
+            event = await _event_lookup_flight.do(event_id, lambda: EventStatusManager._load_event_with_status(event_id))
+            # Each caller gets its own copy of the shared result
+            return copy.deepcopy(event)
             
         except Exception as e:
             logger.error(f"Error getting event by ID {event_id}: {str(e)}")
             return None
+    
+    @staticmethod
+    async def _load_event_with_status(event_id: str) -> Optional[Dict[str, Any]]:
+        """Load an event and bring its stored status up to date"""
+        event = await DatabaseOperations.find_one("events", {"event_id": event_id})
+        
+        if not event:
+            return None
+
+        # Update status to ensure accuracy
+        current_time = datetime.now()
+        calculated_status, calculated_sub_status = await EventStatusManager._calculate_event_status(event, current_time)
+        
+        if event.get('status') != calculated_status or event.get('sub_status') != calculated_sub_status:
+            await DatabaseOperations.update_one(
+                "events",
+                {"event_id": event_id},
+                {"$set": {
+                    "status": calculated_status,
+                    "sub_status": calculated_sub_status,
+                    "last_status_update": current_time
+                }}
+            )
+            event['status'] = calculated_status
+            event['sub_status'] = calculated_sub_status
+            event_catalog.invalidate(event_id)
+            logger.info(f"Updated event {event_id} status to {calculated_status}/{calculated_sub_status}")
+        
+        return event
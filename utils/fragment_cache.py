@@ -0,0 +1,139 @@
+"""
+Rendered Fragment Cache
+
+Jinja extension that caches the rendered HTML of per-event template fragments
+(event cards, event detail body sections) so they are rendered once per event
+version instead of once per visitor.
+
+Usage in templates:
+    {% cache_fragment "event_card", event.event_id, event %}
+        ... markup that depends only on the event ...
+    {% endcache_fragment %}
+
+The first argument names the fragment, the second is the event_id; any further
+arguments become part of the cache key, with dicts and objects (the event the
+fragment renders) keyed by a hash of their data. Keying on the data means a write
+made by another worker process changes the key too, since the page reads the new
+document. Keys also include the event's catalog version, and entries for an event are
+evicted when this process's catalog invalidates it.
+Only put markup inside the block that is the same for every visitor.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+logger = logging.getLogger(__name__)
+
+class FragmentCache:
+    """Size-bounded LRU cache of rendered template fragments"""
+
+    def __init__(self, max_entries: int = 2000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[Hashable, ...], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key: Tuple[Hashable, ...]) -> Optional[str]:
+        with self._lock:
+            html = self._entries.get(key)
+            if html is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return html
+
+    def set(self, key: Tuple[Hashable, ...], html: str):
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, event_id: Optional[str] = None):
+        """Drop cached fragments for one event (or all fragments if no event is given)"""
+        with self._lock:
+            if event_id is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[1] == event_id]:
+                    del self._entries[key]
+            self.stats["invalidations"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": f"{(self.stats['hits'] / lookups * 100):.1f}%" if lookups else "0.0%"
+            }
+
+# Global fragment cache instance
+fragment_cache = FragmentCache()
+
+class FragmentCacheExtension(Extension):
+    """Jinja extension implementing the {% cache_fragment %} tag"""
+
+    tags = {"cache_fragment"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+
+        body = parser.parse_statements(("name:endcache_fragment",), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_render_cached", [nodes.List(args)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render_cached(self, key_parts, caller):
+        from utils.event_catalog import event_catalog
+
+        fragment_name = key_parts[0]
+        event_id = str(key_parts[1]) if len(key_parts) > 1 else None
+        extra = tuple(_key_part(part) for part in key_parts[2:])
+        key = (fragment_name, event_id, event_catalog.event_version(event_id) if event_id else 0) + extra
+
+        html = fragment_cache.get(key)
+        if html is None:
+            html = caller()
+            fragment_cache.set(key, html)
+        return Markup(html)
+
+def _key_part(value: Any) -> str:
+    """Scalars as they are; dicts and objects as a hash of their data"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return str(value)
+    if hasattr(value, "model_dump"):
+        value = value.model_dump()
+    elif not isinstance(value, dict) and hasattr(value, "__dict__"):
+        value = vars(value)
+    if isinstance(value, dict):
+        value = sorted((str(name), repr(item)) for name, item in value.items())
+    return hashlib.sha1(repr(value).encode("utf-8")).hexdigest()
+
+def install_fragment_cache(templates):
+    """Enable {% cache_fragment %} on a Jinja2Templates instance"""
+    templates.env.add_extension(FragmentCacheExtension)
+    return templates
+
+def _on_event_invalidated(event_id: Optional[str]):
+    fragment_cache.invalidate(event_id)
+
+def _register_invalidation_listener():
+    from utils.event_catalog import event_catalog
+    event_catalog.add_invalidation_listener(_on_event_invalidated)
+
+_register_invalidation_listener()
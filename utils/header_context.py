@@ -1,11 +1,18 @@
 """
 Header context utility for admin layout
 Provides enhanced statistics and notifications for the admin header
+
+All sidebar and header counts for a role are gathered with one $facet aggregation
+per collection, run concurrently, and cached briefly per role. Unfiltered totals
+come from collection metadata (and the in-memory student counter) instead, since
+a $match {} inside $facet scans the whole collection.
 """
-from typing import Dict, Any
+from typing import Dict, Any, List
 from utils.db_operations import DatabaseOperations
-from utils.navigation_counts import get_navigation_counts
+from utils.navigation_counts import get_navigation_counts, navigation_cache, navigation_event_queries
+from utils.student_counter import student_counter
 from datetime import datetime, timedelta
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,186 +25,174 @@ async def get_header_context(current_user=None) -> Dict[str, Any]:
     - Recent activity indicators
     - Role-specific metrics
     """
+    if not current_user:
+        return await get_navigation_counts()
+
+    # Event admins see counts for their own events, so cache them per user
+    cache_key = f"header:{current_user.role}"
+    if current_user.role == 'event_admin':
+        cache_key += f":{current_user.username}"
+
     try:
-        # Get base navigation counts
-        nav_counts = await get_navigation_counts()
-        
-        # Initialize header context with navigation counts
-        header_context = nav_counts.copy()
-        
-        if not current_user:
-            return header_context
-        
-        # Add role-specific enhancements
-        if current_user.role == 'super_admin':
-            header_context.update(await get_super_admin_metrics())
-        elif current_user.role == 'executive_admin':
-            header_context.update(await get_executive_admin_metrics())
-        elif current_user.role == 'content_admin':
-            header_context.update(await get_content_admin_metrics())
-        elif current_user.role == 'event_admin':
-            header_context.update(await get_event_admin_metrics(current_user))
-        
-        # Add common metrics
-        header_context.update({
-            'today_registrations': await get_today_registrations(),
-            'pending_actions': await get_pending_actions(current_user),
-            'system_health': await get_system_health(),
-            'last_activity': await get_last_activity(current_user)
-        })
-        
+        header_context = await navigation_cache.get_or_set(cache_key, lambda: _collect_header_counts(current_user))
+        header_context['last_activity'] = await get_last_activity(current_user)
         return header_context
-        
+
     except Exception as e:
         logger.error(f"Error getting header context: {str(e)}")
-        return nav_counts if 'nav_counts' in locals() else {}
+        return await get_navigation_counts()
 
-async def get_super_admin_metrics() -> Dict[str, Any]:
-    """Get metrics specific to super admin role"""
-    try:
-        # Get recent admin activities
-        recent_logins = await DatabaseOperations.find_many(
-            "users", 
-            {"is_admin": True, "last_login": {"$gte": datetime.now() - timedelta(days=7)}}
-        )
-        
-        # Get system-wide statistics
-        total_registrations = await DatabaseOperations.count_documents("registrations", {})
-        total_feedback = await DatabaseOperations.count_documents("feedback", {})
-        
-        return {
-            'recent_admin_logins': len(recent_logins),
-            'total_registrations': total_registrations,
-            'total_feedback': total_feedback,
-            'system_alerts': await get_system_alerts()
-        }
-    except Exception as e:
-        logger.error(f"Error getting super admin metrics: {str(e)}")
-        return {}
+def _facet_queries(role: str, username: str = None) -> Dict[str, Dict[str, Dict]]:
+    """Build the per-collection facet queries needed for a role"""
+    now = datetime.now()
+    today_start = now.replace(hour=0, minute=0, second=0)
+    week_start = now - timedelta(days=now.weekday())
 
-async def get_executive_admin_metrics() -> Dict[str, Any]:
-    """Get metrics specific to executive admin role"""
-    try:
-        # Events needing approval or attention
-        pending_events = await DatabaseOperations.find_many(
-            "events", 
-            {"status": {"$in": ["pending", "draft"]}}
-        )
-        
-        # Recent event activities
-        recent_events = await DatabaseOperations.find_many(
-            "events",
-            {"created_at": {"$gte": datetime.now() - timedelta(days=7)}}
-        )
-        
-        return {
-            'pending_events': len(pending_events),
-            'recent_events': len(recent_events),
-            'events_this_week': await get_events_this_week()
-        }
-    except Exception as e:
-        logger.error(f"Error getting executive admin metrics: {str(e)}")
-        return {}
+    queries = {
+        "events": {
+            **navigation_event_queries(),
+            "pending_status_events": {"status": "pending"}
+        },
+        "students": {"student_count": {}},
+        "users": {"admin_count": {"is_admin": True}},
+        "registrations": {"today_registrations": {"registration_date": {"$gte": today_start}}}
+    }
 
-async def get_content_admin_metrics() -> Dict[str, Any]:
-    """Get metrics specific to content admin role"""
-    try:
-        # Student-related statistics
-        new_students_today = await DatabaseOperations.find_many(
-            "students",
-            {"created_at": {"$gte": datetime.now().replace(hour=0, minute=0, second=0)}}
-        )
-        
-        # Recent registrations
-        recent_registrations = await DatabaseOperations.find_many(
-            "registrations",
-            {"registration_date": {"$gte": datetime.now() - timedelta(days=1)}}
-        )
-        
-        return {
-            'new_students_today': len(new_students_today),
-            'recent_registrations': len(recent_registrations),
-            'student_activity': await get_student_activity()
+    if role == 'super_admin':
+        queries["users"]["recent_admin_logins"] = {"is_admin": True, "last_login": {"$gte": now - timedelta(days=7)}}
+        queries["registrations"]["total_registrations"] = {}
+        queries["feedback"] = {"total_feedback": {}}
+        queries["events"]["system_alerts"] = {"status": {"$in": ["cancelled", "error"]}}
+    elif role == 'executive_admin':
+        queries["events"]["pending_events"] = {"status": {"$in": ["pending", "draft"]}}
+        queries["events"]["recent_events"] = {"created_at": {"$gte": now - timedelta(days=7)}}
+        queries["events"]["events_this_week"] = {"start_datetime": {"$gte": week_start, "$lt": week_start + timedelta(days=7)}}
+    elif role == 'content_admin':
+        queries["students"]["new_students_today"] = {"created_at": {"$gte": today_start}}
+        queries["students"]["active_this_week"] = {"last_login": {"$gte": today_start - timedelta(days=7)}}
+        queries["registrations"]["recent_registrations"] = {"registration_date": {"$gte": now - timedelta(days=1)}}
+    elif role == 'event_admin':
+        upcoming = now + timedelta(days=3)  # Next 3 days
+        queries["events"]["total_events"] = {"assigned_admin": username}
+        queries["events"]["upcoming_deadlines"] = {
+            "assigned_admin": username,
+            "$or": [
+                {"registration_end_date": {"$lte": upcoming}},
+                {"start_datetime": {"$lte": upcoming}}
+            ]
         }
-    except Exception as e:
-        logger.error(f"Error getting content admin metrics: {str(e)}")
-        return {}
 
-async def get_event_admin_metrics(current_user) -> Dict[str, Any]:
-    """Get metrics specific to event admin role"""
-    try:
-        # Get events assigned to this admin
-        assigned_events = await DatabaseOperations.find_many(
-            "events",
-            {"assigned_admin": current_user.username}
-        )
-        
-        # Get registrations for assigned events
-        event_ids = [event.get('event_id') for event in assigned_events]
-        total_registrations = 0
-        
-        if event_ids:
-            registrations = await DatabaseOperations.find_many(
-                "registrations",
-                {"event_id": {"$in": event_ids}}
+    return queries
+
+async def _collection_total(collection: str) -> int:
+    """Document count of a whole collection without scanning it"""
+    if collection == "students" and student_counter.count:
+        # Kept current by the account write paths
+        return student_counter.count
+    return await DatabaseOperations.estimated_document_count(collection)
+
+async def _collect_header_counts(current_user) -> Dict[str, Any]:
+    """Run one $facet aggregation per collection concurrently and shape the header context"""
+    role = current_user.role
+    queries = _facet_queries(role, getattr(current_user, 'username', None))
+
+    # Unfiltered totals: collection metadata instead of a $facet scan
+    totals = {name: collection for collection, named in queries.items() for name, query in named.items() if not query}
+    filtered = {
+        collection: {name: query for name, query in named.items() if query}
+        for collection, named in queries.items()
+    }
+    filtered = {collection: named for collection, named in filtered.items() if named}
+
+    collections = list(filtered.keys())
+    total_names = list(totals.keys())
+    results = await asyncio.gather(
+        *(DatabaseOperations.facet_counts(collection, filtered[collection]) for collection in collections),
+        *(_collection_total(totals[name]) for name in total_names)
+    )
+    counts: Dict[str, Any] = {}
+    for result in results[:len(collections)]:
+        counts.update(result)
+    counts.update(zip(total_names, results[len(collections):]))
+
+    if role == 'event_admin':
+        assigned_event_ids = await _get_assigned_event_ids(current_user.username)
+        counts['my_event_registrations'] = 0
+        if assigned_event_ids:
+            registration_counts = await DatabaseOperations.facet_counts(
+                "registrations", {"my_event_registrations": {"event_id": {"$in": assigned_event_ids}}}
             )
-            total_registrations = len(registrations)
-        
-        return {
-            'total_events': len(assigned_events),
-            'my_event_registrations': total_registrations,
-            'upcoming_deadlines': await get_upcoming_deadlines(event_ids)
-        }
-    except Exception as e:
-        logger.error(f"Error getting event admin metrics: {str(e)}")
-        return {}
+            counts.update(registration_counts)
 
-async def get_today_registrations() -> int:
-    """Get count of registrations made today"""
-    try:
-        today_start = datetime.now().replace(hour=0, minute=0, second=0)
-        registrations = await DatabaseOperations.find_many(
-            "registrations",
-            {"registration_date": {"$gte": today_start}}
-        )
-        return len(registrations)
-    except Exception:
-        return 0
+    header_context = {
+        "all_events_count": counts["all_events_count"],
+        "ongoing_events_count": counts["ongoing_events_count"],
+        "upcoming_events_count": counts["upcoming_events_count"],
+        "completed_events_count": counts["completed_events_count"],
+        "student_count": counts["student_count"],
+        "admin_count": counts["admin_count"]
+    }
 
-async def get_pending_actions(current_user) -> int:
+    # Add role-specific enhancements
+    if role == 'super_admin':
+        header_context.update({
+            'recent_admin_logins': counts['recent_admin_logins'],
+            'total_registrations': counts['total_registrations'],
+            'total_feedback': counts['total_feedback'],
+            'system_alerts': counts['system_alerts']
+        })
+    elif role == 'executive_admin':
+        header_context.update({
+            'pending_events': counts['pending_events'],
+            'recent_events': counts['recent_events'],
+            'events_this_week': counts['events_this_week']
+        })
+    elif role == 'content_admin':
+        header_context.update({
+            'new_students_today': counts['new_students_today'],
+            'recent_registrations': counts['recent_registrations'],
+            'student_activity': {'active_this_week': counts['active_this_week']}
+        })
+    elif role == 'event_admin':
+        header_context.update({
+            'total_events': counts['total_events'],
+            'my_event_registrations': counts['my_event_registrations'],
+            'upcoming_deadlines': counts['upcoming_deadlines']
+        })
+
+    # Add common metrics
+    header_context.update({
+        'today_registrations': counts['today_registrations'],
+        'pending_actions': get_pending_actions(current_user, counts),
+        'system_health': get_system_health(counts['all_events_count'], counts['student_count'])
+    })
+
+    return header_context
+
+async def _get_assigned_event_ids(username: str) -> List[str]:
+    """Get the event ids assigned to an event admin"""
+    result = await DatabaseOperations.aggregate("events", [
+        {"$match": {"assigned_admin": username}},
+        {"$group": {"_id": None, "event_ids": {"$addToSet": "$event_id"}}}
+    ])
+    return result[0]["event_ids"] if result else []
+
+def get_pending_actions(current_user, counts: Dict[str, Any]) -> int:
     """Get count of pending actions for the current user"""
-    try:
-        pending_count = 0
-        
-        if current_user.role == 'super_admin':
-            # Pending admin approvals, system alerts, etc.
-            pending_events = await DatabaseOperations.count_documents("events", {"status": "pending"})
-            pending_count += pending_events
-            
-        elif current_user.role == 'executive_admin':
-            # Pending event approvals
-            pending_events = await DatabaseOperations.count_documents("events", {"status": "pending"})
-            pending_count += pending_events
-            
-        return pending_count
-    except Exception:
-        return 0
+    if current_user.role in ('super_admin', 'executive_admin'):
+        # Pending event approvals
+        return counts.get('pending_status_events', 0)
+    return 0
 
-async def get_system_health() -> str:
+def get_system_health(events_count: int, students_count: int) -> str:
     """Get system health status"""
-    try:
-        # Simple health check - can be expanded
-        events_count = await DatabaseOperations.count_documents("events", {})
-        students_count = await DatabaseOperations.count_documents("students", {})
-        
-        if events_count > 0 and students_count > 0:
-            return "healthy"
-        elif events_count > 0 or students_count > 0:
-            return "warning"
-        else:
-            return "error"
-    except Exception:
-        return "unknown"
+    # Simple health check - can be expanded
+    if events_count > 0 and students_count > 0:
+        return "healthy"
+    elif events_count > 0 or students_count > 0:
+        return "warning"
+    else:
+        return "error"
 
 async def get_last_activity(current_user) -> str:
     """Get last activity timestamp for user"""
@@ -207,78 +202,3 @@ async def get_last_activity(current_user) -> str:
         return "Unknown"
     except Exception:
         return "Unknown"
-
-async def get_system_alerts() -> int:
-    """Get count of system alerts"""
-    try:
-        # This can be expanded to check for various system conditions
-        alerts = 0
-        
-        # Check for events with issues
-        problematic_events = await DatabaseOperations.find_many(
-            "events",
-            {"status": {"$in": ["cancelled", "error"]}}
-        )
-        alerts += len(problematic_events)
-        
-        return alerts
-    except Exception:
-        return 0
-
-async def get_events_this_week() -> int:
-    """Get count of events happening this week"""
-    try:
-        week_start = datetime.now() - timedelta(days=datetime.now().weekday())
-        week_end = week_start + timedelta(days=7)
-        
-        events = await DatabaseOperations.find_many(
-            "events",
-            {
-                "start_datetime": {
-                    "$gte": week_start,
-                    "$lt": week_end
-                }
-            }
-        )
-        return len(events)
-    except Exception:
-        return 0
-
-async def get_student_activity() -> Dict[str, int]:
-    """Get student activity metrics"""
-    try:
-        today = datetime.now().replace(hour=0, minute=0, second=0)
-        
-        # Active students (logged in recently)
-        active_students = await DatabaseOperations.find_many(
-            "students",
-            {"last_login": {"$gte": today - timedelta(days=7)}}
-        )
-        
-        return {
-            'active_this_week': len(active_students)
-        }
-    except Exception:
-        return {'active_this_week': 0}
-
-async def get_upcoming_deadlines(event_ids) -> int:
-    """Get count of upcoming deadlines for events"""
-    try:
-        if not event_ids:
-            return 0
-            
-        upcoming = datetime.now() + timedelta(days=3)  # Next 3 days
-        
-        events_with_deadlines = await DatabaseOperations.find_many(
-            "events",
-            {
-                "event_id": {"$in": event_ids},
-                "$or": [
-                    {"registration_end_date": {"$lte": upcoming}},
-                    {"start_datetime": {"$lte": upcoming}}
-                ]
-            }
-        )
-        return len(events_with_deadlines)
-    except Exception:
-        return 0
@@ -0,0 +1,88 @@
+"""
+Request-scoped Identity Map
+
+Keeps the student and event documents already loaded during the current request so
+that repeated DatabaseOperations.find_one lookups (route -> eligibility check ->
+email helper, ...) are served without another round trip to MongoDB.
+
+The map lives in a ContextVar that IdentityMapMiddleware sets for every HTTP
+request, so nothing is shared between requests and code running outside a request
+(scheduler, email workers) is unaffected. Writes made through DatabaseOperations
+evict the affected entries.
+"""
+
+import copy
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+# Collections tracked by the identity map and the field that identifies a document
+IDENTITY_FIELDS = {
+    "students": "enrollment_no",
+    "events": "event_id"
+}
+
+# {collection: {identity value: {query key: document}}}
+_identity_map: ContextVar[Optional[Dict[str, Dict[Any, Dict[str, Dict]]]]] = ContextVar("identity_map", default=None)
+
+def _identity_value(collection_name: str, query: Dict) -> Any:
+    """Get the identity value a query/document selects on, or None if not cacheable"""
+    field = IDENTITY_FIELDS.get(collection_name)
+    if field is None or not isinstance(query, dict):
+        return None
+    value = query.get(field)
+    if isinstance(value, (str, int)):
+        return value
+    return None
+
+def _query_key(query: Dict) -> str:
+    return repr(sorted(query.items(), key=lambda item: item[0]))
+
+def lookup(collection_name: str, query: Dict) -> Optional[Dict]:
+    """Get a copy of a document loaded earlier in this request for the same query"""
+    identity_map = _identity_map.get()
+    if identity_map is None:
+        return None
+    identity = _identity_value(collection_name, query)
+    if identity is None:
+        return None
+    document = identity_map.get(collection_name, {}).get(identity, {}).get(_query_key(query))
+    return copy.deepcopy(document) if document is not None else None
+
+def store(collection_name: str, query: Dict, document: Optional[Dict]):
+    """Remember a document loaded by find_one for the rest of this request"""
+    identity_map = _identity_map.get()
+    if identity_map is None or document is None:
+        return
+    identity = _identity_value(collection_name, query)
+    if identity is None:
+        return
+    entries = identity_map.setdefault(collection_name, {}).setdefault(identity, {})
+    entries[_query_key(query)] = copy.deepcopy(document)
+
+def evict(collection_name: str, query: Optional[Dict] = None):
+    """Evict entries affected by a write (the whole collection if the write is not keyed)"""
+    identity_map = _identity_map.get()
+    if identity_map is None or collection_name not in identity_map:
+        return
+    identity = _identity_value(collection_name, query or {})
+    if identity is None:
+        identity_map.pop(collection_name, None)
+    else:
+        identity_map[collection_name].pop(identity, None)
+
+class IdentityMapMiddleware:
+    """ASGI middleware that gives every HTTP request its own identity map"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _identity_map.set({})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _identity_map.reset(token)
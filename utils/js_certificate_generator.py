@@ -6,18 +6,17 @@ It handles data preparation and email sending for certificates generated in the
 Supports concurrent operations for handling multiple simultaneous certificate downloads.
 """
 
-import base64
 import asyncio
 from datetime import datetime
 from pathlib import Path
-from tempfile import NamedTemporaryFile
-from typing import Tuple, Optional, Dict, Any
+from typing import Tuple, Optional, Dict, Any, Union
 from concurrent.futures import ThreadPoolExecutor
 
 from utils.db_operations import DatabaseOperations
-from utils.email_service import EmailService
+from utils.email_service import email_service
+from utils.email_attachments import EmailAttachment, InvalidAttachmentError
+from utils.certificate_template_cache import certificate_template_cache
 from utils.logger import get_logger
-import aiofiles
 
 logger = get_logger(__name__)
 
@@ -128,8 +127,9 @@ async def get_certificate_data_for_js(event_id: str, enrollment_no: str) -> Tupl
 async def send_certificate_email_from_js(
     event_id: str, 
     enrollment_no: str, 
-    pdf_base64: str, 
-    file_name: str
+    pdf_base64: Optional[str], 
+    file_name: str,
+    pdf_bytes: Optional[Union[bytes, memoryview]] = None
 ) -> Tuple[bool, str]:
     """
     Send certificate email with PDF attachment from JavaScript-generated certificate
@@ -138,14 +138,14 @@ async def send_certificate_email_from_js(
     Args:
         event_id: Event ID
         enrollment_no: Student enrollment number
-        pdf_base64: Base64 encoded PDF data
+        pdf_base64: Base64 encoded PDF data (or None when pdf_bytes is given)
         file_name: Name for the PDF file
+        pdf_bytes: Raw PDF data uploaded as binary
     
     Returns:
         Tuple of (success, message)
     """
     async with _async_semaphore:  # Limit concurrent operations
-        temp_file_path = None
         try:
             # Use asyncio.gather for concurrent database operations
             student_task = DatabaseOperations.find_one("students", {"enrollment_no": enrollment_no})
@@ -169,81 +169,45 @@ async def send_certificate_email_from_js(
             student_email = student_data.get("email")
             if not student_email:
                 return False, "Student email not found"
-              # Create temporary PDF file
+            
             try:
-                # Decode base64 PDF data
-                pdf_data = base64.b64decode(pdf_base64)
-                
-                # Validate that we have actual PDF data
-                if not pdf_data.startswith(b'%PDF'):
-                    logger.error(f"Invalid PDF data received - does not start with PDF header")
-                    return False, "Invalid PDF data received"
-                
-                logger.info(f"PDF data validation: {len(pdf_data)} bytes, starts with PDF header: {pdf_data[:10]}")
-                
-                # Create temporary file using the naming convention: student_full_name[0]_eventname[0]
+                # Attach the PDF straight from memory: the header is checked without
+                # decoding the whole upload, and base64 input is reused for the MIME body
                 safe_file_name = generate_certificate_file_name(
                     student_data.get("full_name", ""), 
                     event_data.get("event_name", "")
                 )
-                
-                # Create temporary file
-                with NamedTemporaryFile(delete=False, suffix='.pdf', prefix=f'{safe_file_name}_') as temp_file:
-                    temp_file.write(pdf_data)
-                    temp_file_path = temp_file.name
-                
-                logger.info(f"Created temporary PDF file: {temp_file_path} ({len(pdf_data)} bytes)")
-                
-                # Verify the temporary file is a valid PDF
-                try:
-                    with open(temp_file_path, 'rb') as verify_file:
-                        header = verify_file.read(10)
-                        if not header.startswith(b'%PDF'):
-                            logger.error(f"Temporary PDF file validation failed - invalid header: {header}")
-                            return False, "Created PDF file is invalid"
-                    logger.info("Temporary PDF file validation successful")
-                except Exception as verify_error:
-                    logger.error(f"PDF file verification failed: {str(verify_error)}")
-                    return False, f"PDF file verification failed: {str(verify_error)}"
-                
-                # Send email with attachment using thread pool for I/O operation
-                email_service = EmailService()
-                
-                success = await email_service.send_certificate_notification(
-                    student_email=student_email,
-                    student_name=student_data.get("full_name", ""),
-                    event_title=event_data.get("event_name", ""),
-                    certificate_url=f"/client/events/{event_id}/certificate",
-                    event_date=event_data.get("start_datetime").strftime("%B %d, %Y") if event_data.get("start_datetime") else None,
-                    certificate_pdf_path=temp_file_path
+                attachment = EmailAttachment.pdf(
+                    f"{safe_file_name}.pdf",
+                    pdf_bytes if pdf_bytes is not None else pdf_base64,
+                    is_base64=pdf_bytes is None
                 )
-                
-                if success:
-                    # Mark email as sent in the database
-                    await DatabaseOperations.update_one(
-                        "students",
-                        {"enrollment_no": enrollment_no},
-                        {"$set": {f"event_participations.{event_id}.certificate_email_sent": True}}
-                    )
-                    logger.info(f"Certificate email sent and marked for student {enrollment_no} for event {event_id}")
-                    return True, "Certificate email sent successfully! You will receive it shortly."
-                else:
-                    return False, "Failed to send certificate email"
-                    
-            except Exception as pdf_error:
-                logger.error(f"Error processing PDF data: {str(pdf_error)}")
-                return False, f"Error processing PDF: {str(pdf_error)}"
+                logger.info(f"PDF data validation successful: {attachment.size} bytes")
+            except InvalidAttachmentError as pdf_error:
+                logger.error(f"Invalid PDF data received: {str(pdf_error)}")
+                return False, "Invalid PDF data received"
+            
+            # Send email with the in-memory attachment
+            success = await email_service.send_certificate_notification(
+                student_email=student_email,
+                student_name=student_data.get("full_name", ""),
+                event_title=event_data.get("event_name", ""),
+                certificate_url=f"/client/events/{event_id}/certificate",
+                event_date=event_data.get("start_datetime").strftime("%B %d, %Y") if event_data.get("start_datetime") else None,
+                certificate_attachment=attachment
+            )
             
-            finally:
-                # Clean up temporary file
-                if temp_file_path and Path(temp_file_path).exists():
-                    try:
-                        await asyncio.get_event_loop().run_in_executor(
-                            _thread_pool, Path(temp_file_path).unlink
-                        )
-                        logger.info(f"Cleaned up temporary file: {temp_file_path}")
-                    except Exception as cleanup_error:
-                        logger.warning(f"Failed to clean up temporary file {temp_file_path}: {cleanup_error}")
+            if success:
+                # Mark email as sent in the database
+                await DatabaseOperations.update_one(
+                    "students",
+                    {"enrollment_no": enrollment_no},
+                    {"$set": {f"event_participations.{event_id}.certificate_email_sent": True}}
+                )
+                logger.info(f"Certificate email sent and marked for student {enrollment_no} for event {event_id}")
+                return True, "Certificate email sent successfully! You will receive it shortly."
+            else:
+                return False, "Failed to send certificate email"
                         
         except Exception as e:
             logger.error(f"Error sending certificate email: {str(e)}")
@@ -288,29 +252,20 @@ async def process_certificate_template(template_path: str, certificate_data: Dic
         Processed HTML content with placeholders replaced
     """
     try:
-        # Read template file
+        # Template is cached pre-split at its placeholders (no disk read per certificate)
         template_file_path = Path("data") / template_path
-        if not template_file_path.exists():
-            raise FileNotFoundError(f"Template file not found: {template_path}")
         
-        with open(template_file_path, 'r', encoding='utf-8') as file:
-            html_content = file.read()
-        
-        # Replace placeholders
         placeholders = {
-            "{{ participant_name }}": certificate_data.get("participant_name", ""),
-            "{{ department_name }}": certificate_data.get("department_name", ""),
+            "participant_name": certificate_data.get("participant_name", ""),
+            "department_name": certificate_data.get("department_name", ""),
         }
         
         # Add team name placeholder if team-based event
         if certificate_data.get("is_team_based") and certificate_data.get("team_name"):
-            placeholders["{{ team_name }}"] = certificate_data.get("team_name", "")
-        
-        # Replace all placeholders
-        for placeholder, value in placeholders.items():
-            html_content = html_content.replace(placeholder, value)
+            placeholders["team_name"] = certificate_data.get("team_name", "")
         
-        return html_content
+        # Substitute all placeholders in a single pass
+        return await certificate_template_cache.render(template_file_path, placeholders)
         
     except Exception as e:
         logger.error(f"Error processing certificate template: {str(e)}")
@@ -553,14 +508,8 @@ async def get_certificate_template_content(template_name: str) -> str:
     try:
         template_path = Path("data") / template_name
         
-        if not template_path.exists():
-            raise FileNotFoundError(f"Certificate template not found: {template_name}")
-        
-        # Use aiofiles for async file reading
-        async with aiofiles.open(template_path, 'r', encoding='utf-8') as file:
-            content = await file.read()
-            
-        return content
+        # Served from the mtime-validated template cache
+        return await certificate_template_cache.get_source(template_path)
         
     except Exception as e:
         logger.error(f"Error reading certificate template: {str(e)}")
@@ -0,0 +1,186 @@
+"""
+Mail Merge Engine for Event-wide Sends
+
+Renders a campaign's email template once, leaving the per-recipient fields as
+slots, then produces each recipient's message by filling the slots instead of
+re-running the template.
+
+Features:
+- One Jinja render per campaign; per-recipient substitution is a single join
+- MIME messages are built lazily by a generator as senders become free, so a
+  large campaign never holds every message in memory
+- Bounded-concurrency delivery through the shared email transport
+- Per-campaign throughput and failure reports (recent campaigns kept for stats);
+  failures are reported by recipient index, never by address
+"""
+
+import asyncio
+import html
+import logging
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.template_environment import get_email_environment
+from utils.email_metrics import email_metrics, email_type_for_template, set_email_type
+
+logger = logging.getLogger(__name__)
+
+# Unlikely to appear in rendered HTML, and untouched by Jinja when autoescape is off
+MERGE_MARKER = "\x1emerge:{name}\x1e"
+MERGE_MARKER_PATTERN = re.compile("\x1emerge:(\\w+)\x1e")
+
+@dataclass
+class MergeTemplate:
+    """A campaign body rendered once, split at its per-recipient fields"""
+    segments: List[str]
+    slots: List[str]
+
+    @classmethod
+    def render(cls, template_name: str, shared_context: Dict[str, Any], merge_fields: List[str]) -> "MergeTemplate":
+        markers = {name: MERGE_MARKER.format(name=name) for name in merge_fields}
+        rendered = get_email_environment().get_template(template_name).render(**shared_context, **markers)
+
+        segments, slots = [], []
+        position = 0
+        for match in MERGE_MARKER_PATTERN.finditer(rendered):
+            segments.append(rendered[position:match.start()])
+            slots.append(match.group(1))
+            position = match.end()
+        segments.append(rendered[position:])
+        return cls(segments=segments, slots=slots)
+
+    def substitute(self, values: Dict[str, Any]) -> str:
+        """Fill the per-recipient fields (HTML-escaped) in one pass"""
+        parts = []
+        for segment, name in zip(self.segments, self.slots):
+            parts.append(segment)
+            value = values.get(name)
+            parts.append("" if value is None else html.escape(str(value)))
+        parts.append(self.segments[-1])
+        return "".join(parts)
+
+@dataclass
+class CampaignReport:
+    """Outcome of one mail merge campaign"""
+    campaign: str
+    template_name: str
+    total: int
+    sent: int = 0
+    failed: int = 0
+    render_ms: float = 0.0
+    elapsed_seconds: float = 0.0
+    # (recipient index, reason); no addresses or server replies, the report is shown on a stats page
+    failures: List[Tuple[int, str]] = field(default_factory=list)
+    results: List[bool] = field(default_factory=list)
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.sent / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "campaign": self.campaign,
+            "template_name": self.template_name,
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "render_ms": round(self.render_ms, 2),
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "messages_per_second": round(self.messages_per_second, 1),
+            # Only the first few failures, the full list can be large
+            "failures": [{"index": index, "error": error} for index, error in self.failures[:20]]
+        }
+
+# Sends one pre-built MIME message: (to_email, message) -> success
+MessageSender = Callable[[str, str], Awaitable[bool]]
+
+class MailMergeEngine:
+    """Template-once, bounded-concurrency bulk sender"""
+
+    def __init__(self, concurrency: int = 10, history_size: int = 20):
+        self.concurrency = concurrency
+        self.history: "deque[CampaignReport]" = deque(maxlen=history_size)
+
+    def _default_sender(self) -> Tuple[Callable[..., str], MessageSender]:
+        from utils.email_transport import email_transport
+        return email_transport.build_message, email_transport.send_message
+
+    async def send_campaign(
+        self,
+        campaign: str,
+        template_name: str,
+        subject: str,
+        recipients: List[Dict[str, Any]],
+        shared_context: Optional[Dict[str, Any]] = None,
+        merge_fields: Optional[List[str]] = None,
+        email_field: str = "email",
+        concurrency: Optional[int] = None
+    ) -> CampaignReport:
+        """
+        Send one template to many recipients.
+
+        shared_context is rendered once; merge_fields name the recipient dict keys that
+        differ per message. Results are reported in recipient order.
+        """
+        report = CampaignReport(campaign=campaign, template_name=template_name, total=len(recipients))
+        report.results = [False] * len(recipients)
+        if not recipients:
+            return report
+
+        # Set before the senders start so each of them inherits the email type
+        set_email_type(email_type_for_template(template_name))
+        start = time.perf_counter()
+        merge_fields = merge_fields or []
+        merge_template = MergeTemplate.render(template_name, shared_context or {}, merge_fields)
+        report.render_ms = (time.perf_counter() - start) * 1000
+        email_metrics.observe("render", report.render_ms / 1000)
+
+        build_message, send_message = self._default_sender()
+
+        def messages() -> Iterator[Tuple[int, str, str]]:
+            # Built on demand as each sender frees up
+            for index, recipient in enumerate(recipients):
+                to_email = recipient.get(email_field)
+                if not to_email:
+                    report.failures.append((index, f"no {email_field}"))
+                    continue
+                html_content = merge_template.substitute(recipient) if merge_fields else merge_template.segments[0]
+                yield index, to_email, build_message(to_email, subject, html_content)
+
+        message_stream = messages()
+
+        async def sender():
+            for index, to_email, message in message_stream:
+                try:
+                    success = await send_message(to_email, message)
+                    error = None if success else "send failed"
+                except Exception as e:
+                    logger.error(f"Mail merge campaign '{campaign}': error sending to {to_email}: {str(e)}")
+                    success, error = False, type(e).__name__
+                report.results[index] = success
+                if not success:
+                    report.failures.append((index, error))
+
+        await asyncio.gather(*(sender() for _ in range(min(concurrency or self.concurrency, len(recipients)))))
+
+        report.sent = sum(report.results)
+        report.failed = report.total - report.sent
+        report.elapsed_seconds = time.perf_counter() - start
+        self.history.append(report)
+        logger.info(
+            f"Mail merge campaign '{campaign}': {report.sent}/{report.total} sent in {report.elapsed_seconds:.2f}s "
+            f"({report.messages_per_second:.1f} msg/s, render {report.render_ms:.1f}ms, {report.failed} failed)"
+        )
+        return report
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "recent_campaigns": [report.to_dict() for report in reversed(self.history)]
+        }
+
+# Global mail merge engine instance
+mail_merge = MailMergeEngine()
@@ -0,0 +1,189 @@
+"""
+In-process Metrics Primitives
+
+This module provides small, dependency-free metric types (counters, histograms and
+sampled time series) that subsystems use to expose machine-readable metrics.
+
+Features:
+- Cumulative bucket histograms compatible with the Prometheus text format
+- Percentile estimates from a bounded window of recent observations
+- Labelled histogram families (e.g. one histogram per trigger type)
+- Thread-safe updates so metrics can be recorded from executor threads
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Default latency buckets in seconds (1ms .. 5min)
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class Histogram:
+    """Cumulative bucket histogram with a sliding window for percentile estimates"""
+
+    def __init__(self, name: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS, description: str = "", window_size: int = 2048):
+        self.name = name
+        self.description = description
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        self._bucket_counts = [0] * len(self.buckets)
+        self._count = 0
+        self._sum = 0.0
+        self._min: Optional[float] = None
+        self._max: Optional[float] = None
+        self._window = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Record a single observation"""
+        with self._lock:
+            self._count += 1
+            self._sum += value
+            self._min = value if self._min is None else min(self._min, value)
+            self._max = value if self._max is None else max(self._max, value)
+            self._window.append(value)
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    self._bucket_counts[index] += 1
+                    break
+
+    @staticmethod
+    def _percentile(sorted_values: List[float], percentile: float) -> Optional[float]:
+        if not sorted_values:
+            return None
+        rank = max(0, math.ceil(percentile / 100.0 * len(sorted_values)) - 1)
+        return sorted_values[rank]
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Estimate a percentile (0-100) from the recent observation window"""
+        with self._lock:
+            values = sorted(self._window)
+        return self._percentile(values, percentile)
+
+    def snapshot(self) -> Dict:
+        """Get a JSON-serializable view of the histogram"""
+        with self._lock:
+            values = sorted(self._window)
+            cumulative = 0
+            buckets = {}
+            for upper_bound, bucket_count in zip(self.buckets, self._bucket_counts):
+                cumulative += bucket_count
+                buckets[str(upper_bound)] = cumulative
+            buckets["+Inf"] = self._count
+
+            return {
+                "count": self._count,
+                "sum": round(self._sum, 6),
+                "avg": round(self._sum / self._count, 6) if self._count else None,
+                "min": self._min,
+                "max": self._max,
+                "p50": self._percentile(values, 50),
+                "p95": self._percentile(values, 95),
+                "p99": self._percentile(values, 99),
+                "buckets": buckets
+            }
+
+    def prometheus_lines(self, labels: Optional[Dict[str, str]] = None) -> List[str]:
+        """Render histogram samples in Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        label_pairs = [f'{key}="{value}"' for key, value in (labels or {}).items()]
+        lines = []
+        for upper_bound, cumulative in snapshot["buckets"].items():
+            bucket_labels = ",".join(label_pairs + [f'le="{upper_bound}"'])
+            lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+        base_labels = f"{{{','.join(label_pairs)}}}" if label_pairs else ""
+        lines.append(f"{self.name}_sum{base_labels} {snapshot['sum']}")
+        lines.append(f"{self.name}_count{base_labels} {snapshot['count']}")
+        return lines
+
+
+class LabeledHistogram:
+    """Family of histograms sharing a name and buckets, keyed by one label"""
+
+    def __init__(self, name: str, label: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS, description: str = ""):
+        self.name = name
+        self.label = label
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._children: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, value: str) -> Histogram:
+        """Get (or create) the histogram for a label value"""
+        with self._lock:
+            histogram = self._children.get(value)
+            if histogram is None:
+                histogram = Histogram(self.name, self.buckets, self.description)
+                self._children[value] = histogram
+            return histogram
+
+    def observe(self, label_value: str, value: float):
+        self.labels(label_value).observe(value)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            children = dict(self._children)
+        return {label_value: histogram.snapshot() for label_value, histogram in children.items()}
+
+    def prometheus_lines(self) -> List[str]:
+        with self._lock:
+            children = dict(self._children)
+        lines = []
+        for label_value, histogram in sorted(children.items()):
+            lines.extend(histogram.prometheus_lines({self.label: label_value}))
+        return lines
+
+
+class TimeSeries:
+    """Bounded series of (timestamp, value) samples for gauges tracked over time"""
+
+    def __init__(self, name: str, max_samples: int = 1440, description: str = ""):
+        self.name = name
+        self.description = description
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def record(self, value: float, timestamp: Optional[float] = None):
+        with self._lock:
+            self._samples.append((timestamp or time.time(), value))
+
+    @property
+    def latest(self) -> Optional[float]:
+        with self._lock:
+            return self._samples[-1][1] if self._samples else None
+
+    def snapshot(self, limit: int = 60) -> Dict:
+        with self._lock:
+            samples = list(self._samples)
+        values = [value for _, value in samples]
+        return {
+            "latest": values[-1] if values else None,
+            "min": min(values) if values else None,
+            "max": max(values) if values else None,
+            "samples": [{"timestamp": ts, "value": value} for ts, value in samples[-limit:]]
+        }
+
+
+def render_prometheus(
+    histograms: Iterable = (),
+    gauges: Optional[Dict[str, float]] = None,
+    counters: Optional[Dict[str, float]] = None
+) -> str:
+    """Render a set of metrics as a Prometheus text exposition document"""
+    lines = []
+    for histogram in histograms:
+        if histogram.description:
+            lines.append(f"# HELP {histogram.name} {histogram.description}")
+        lines.append(f"# TYPE {histogram.name} histogram")
+        lines.extend(histogram.prometheus_lines())
+    for name, value in (counters or {}).items():
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {value}")
+    for name, value in (gauges or {}).items():
+        if value is None:
+            continue
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
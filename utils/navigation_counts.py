@@ -1,48 +1,50 @@
 """
 Navigation counts utility for admin sidebar
 Provides consistent navigation count calculations across all admin pages
+
+Counts are computed with one $facet aggregation per collection (run concurrently)
+and cached for a few seconds, since the sidebar is rendered on every admin page.
 """
 from typing import Dict
 from utils.db_operations import DatabaseOperations
-from utils.event_status_manager import EventStatusManager
+from utils.cache import get_cache
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# How long (seconds) sidebar/header counts are reused between admin page views
+NAVIGATION_CACHE_TTL = 10
+
+# Shared across workers when a network cache backend is configured
+navigation_cache = get_cache("navigation", default_ttl=NAVIGATION_CACHE_TTL)
+
+def navigation_event_queries() -> Dict[str, Dict]:
+    """Facet queries on the events collection used by the sidebar"""
+    # Event status is kept current by the dynamic event scheduler
+    return {
+        "all_events_count": {},
+        "ongoing_events_count": {"status": "ongoing"},
+        "upcoming_events_count": {"status": "upcoming"},
+        "completed_events_count": {"status": "completed"}
+    }
+
 async def get_navigation_counts() -> Dict[str, int]:
     """
     Calculate all navigation counts for the admin sidebar.
     Returns a dictionary with all count variables needed by the layout template.
     """
+    async def load_counts():
+        event_counts, student_counts, user_counts = await asyncio.gather(
+            DatabaseOperations.facet_counts("events", navigation_event_queries()),
+            DatabaseOperations.facet_counts("students", {"student_count": {}}),
+            DatabaseOperations.facet_counts("users", {"admin_count": {"is_admin": True}})
+        )
+        return {**event_counts, **student_counts, **user_counts}
+
     try:
-        # Get all events count (regardless of publication status)
-        all_events = await DatabaseOperations.find_many("events", {})
-        all_events_count = len(all_events)
-        
-        # Use EventStatusManager to get accurate event counts by status
-        ongoing_events = await EventStatusManager.get_available_events("ongoing")
-        upcoming_events = await EventStatusManager.get_available_events("upcoming") 
-        completed_events = await EventStatusManager.get_available_events("completed")
-        
-        ongoing_events_count = len(ongoing_events)
-        upcoming_events_count = len(upcoming_events)
-        completed_events_count = len(completed_events)
-        
-        # Get student count
-        student_count = await DatabaseOperations.count_documents("students", {})
-        
-        # Get admin count
-        admin_count = await DatabaseOperations.count_documents("users", {"is_admin": True})
-        
-        return {
-            "all_events_count": all_events_count,
-            "ongoing_events_count": ongoing_events_count,
-            "upcoming_events_count": upcoming_events_count,
-            "completed_events_count": completed_events_count,
-            "student_count": student_count,
-            "admin_count": admin_count
-        }
-        
+        return await navigation_cache.get_or_set("sidebar", load_counts)
+
     except Exception as e:
         logger.error(f"Error calculating navigation counts: {str(e)}")
         # Return zeros if there's an error to prevent template crashes
@@ -10,112 +10,59 @@ Key improvements over the original EmailService:
 - Thread-safe for concurrent operations
 - Automatic connection health management
 - Detailed performance monitoring
+- Sends natively on the event loop through the asyncio SMTP pool (SMTP_TRANSPORT),
+  so concurrency is no longer capped by the executor size
+- Shares the process-wide email transport (one pool, one executor) with EmailService
 """
 
 import os
 import logging
 import asyncio
-from typing import Optional, List
+from typing import Optional, List, Union
 from pathlib import Path
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
-from jinja2 import Environment, FileSystemLoader
-from concurrent.futures import ThreadPoolExecutor
-
-from utils.smtp_pool import smtp_pool
+from utils.template_environment import get_email_environment
+from utils.email_attachments import EmailAttachment
+from utils.email_transport import email_transport
+from utils.email_metrics import email_metrics, email_type_for_template, set_email_type
 
 logger = logging.getLogger(__name__)
 
+# A file path or an in-memory attachment
+Attachment = Union[str, EmailAttachment]
+
 class OptimizedEmailService:
     """Optimized email service using connection pool"""
     
     def __init__(self):
         # Email Templates Configuration
-        template_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates', 'email')
-        self.env = Environment(loader=FileSystemLoader(template_dir))
+        self.env = get_email_environment()
         
-        # Thread pool for async operations (smaller since SMTP is now efficient)
-        self.executor = ThreadPoolExecutor(max_workers=2)
+        # Connection pool and executor are shared with EmailService through the transport
+        self.transport = email_transport
+        self.pool = email_transport.pool
         
-        logger.info("OptimizedEmailService initialized with SMTP connection pool")
+        logger.info(f"OptimizedEmailService initialized with {self.transport.transport} SMTP connection pool")
     
-    def _send_email_sync(self, to_email: str, subject: str, html_content: str, text_content: Optional[str] = None, attachments: Optional[List[str]] = None) -> bool:
-        """Send email synchronously using connection pool"""
-        try:
-            # Create message
-            message = MIMEMultipart("mixed")
-            message["Subject"] = subject
-            message["From"] = smtp_pool.from_email
-            message["To"] = to_email
-
-            # Create alternative container for text and HTML content
-            msg_alternative = MIMEMultipart("alternative")
-
-            # Add text content if provided
-            if text_content:
-                text_part = MIMEText(text_content, "plain")
-                msg_alternative.attach(text_part)
-
-            # Add HTML content
-            html_part = MIMEText(html_content, "html")
-            msg_alternative.attach(html_part)
-
-            # Attach the alternative container to the main message
-            message.attach(msg_alternative)
-
-            # Add attachments if provided
-            if attachments:
-                for attachment_path in attachments:
-                    if os.path.exists(attachment_path):
-                        with open(attachment_path, "rb") as attachment:
-                            part = MIMEBase('application', 'octet-stream')
-                            part.set_payload(attachment.read())
-                        
-                        encoders.encode_base64(part)
-                        
-                        # Get filename from path
-                        filename = os.path.basename(attachment_path)
-                        part.add_header(
-                            'Content-Disposition',
-                            f'attachment; filename= {filename}',
-                        )
-                        message.attach(part)
-                        logger.debug(f"Added attachment: {filename}")
-
-            # Send email using connection pool
-            success = smtp_pool.send_email_with_pool(to_email, message.as_string())
-            
-            if success:
-                logger.info(f"Email sent successfully to {to_email}")
-            else:
-                logger.error(f"Failed to send email to {to_email}")
-            
-            return success
-            
-        except Exception as e:
-            logger.error(f"Error sending email to {to_email}: {str(e)}")
-            return False
+    def _build_message(self, to_email: str, subject: str, html_content: str, text_content: Optional[str] = None, attachments: Optional[List[Attachment]] = None) -> str:
+        """Build the MIME message for an email"""
+        return self.transport.build_message(to_email, subject, html_content, text_content, attachments)
+    
+    async def send_raw_message(self, to_email: str, message: str) -> bool:
+        """Send an already-built MIME message through the configured transport"""
+        return await self.transport.send_message(to_email, message)
     
-    async def send_email_async(self, to_email: str, subject: str, html_content: str, text_content: Optional[str] = None, attachments: Optional[List[str]] = None) -> bool:
+    async def send_email_async(self, to_email: str, subject: str, html_content: str, text_content: Optional[str] = None, attachments: Optional[List[Attachment]] = None) -> bool:
         """Asynchronous email sending using connection pool"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor, 
-            self._send_email_sync, 
-            to_email, 
-            subject, 
-            html_content, 
-            text_content,
-            attachments
-        )
+        return await self.transport.send_email(to_email, subject, html_content, text_content, attachments)
     
     def render_template(self, template_name: str, **kwargs) -> str:
         """Render email template with provided context"""
+        # Tags the rest of this send (MIME build, SMTP, ...) with the email type for metrics
+        set_email_type(email_type_for_template(template_name))
         try:
-            template = self.env.get_template(template_name)
-            return template.render(**kwargs)
+            with email_metrics.time_stage("render"):
+                template = self.env.get_template(template_name)
+                return template.render(**kwargs)
         except Exception as e:
             logger.error(f"Failed to render template {template_name}: {str(e)}")
             return f"<html><body><h1>Email Content</h1><p>Error rendering template: {str(e)}</p></body></html>"
@@ -127,7 +74,8 @@ class OptimizedEmailService:
         event_title: str, 
         certificate_url: str,
         event_date: Optional[str] = None,
-        certificate_pdf_path: Optional[str] = None
+        certificate_pdf_path: Optional[str] = None,
+        certificate_attachment: Optional[EmailAttachment] = None
     ) -> bool:
         """Send certificate available notification email with optimized performance"""
         try:
@@ -142,7 +90,9 @@ class OptimizedEmailService:
             )
             
             attachments = []
-            if certificate_pdf_path and Path(certificate_pdf_path).exists():
+            if certificate_attachment is not None:
+                attachments.append(certificate_attachment)
+            elif certificate_pdf_path and Path(certificate_pdf_path).exists():
                 attachments.append(str(certificate_pdf_path))
             
             return await self.send_email_async(student_email, subject, html_content, attachments=attachments)
@@ -181,7 +131,7 @@ class OptimizedEmailService:
     
     def get_pool_stats(self) -> dict:
         """Get SMTP connection pool statistics"""
-        return smtp_pool.get_stats()
+        return self.pool.get_stats()
 
 # Global optimized email service instance
 optimized_email_service = OptimizedEmailService()
@@ -15,3 +15,18 @@ async def update_event_statuses():
             print(f"- {status}: {count} events")
     except Exception as e:
         print(f"Error updating event statuses: {str(e)}")
+
+
+async def refresh_platform_statistics(interval_seconds: int = 300):
+    """Periodically recompute the platform statistics snapshot shown on the homepage."""
+    import asyncio
+    from utils.statistics import StatisticsManager
+
+    while True:
+        try:
+            await StatisticsManager.refresh_platform_statistics()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error refreshing platform statistics: {str(e)}")
+        await asyncio.sleep(interval_seconds)
@@ -6,11 +6,15 @@ persistent connections to handle high-volume email sending without the overhead
 of creating new connections for each email.
 
 Features:
-- Connection pooling with configurable pool size
+- Connection pooling with a hard maximum of open connections (SMTP_POOL_SIZE);
+  senders beyond it wait in arrival order, up to SMTP_POOL_CHECKOUT_TIMEOUT
+- Warm-up of SMTP_POOL_MIN_IDLE connections at startup
 - Automatic connection health checks and recovery
 - Thread-safe operation for concurrent access
 - Connection recycling to prevent timeouts
-- Comprehensive monitoring and statistics
+- Comprehensive monitoring and statistics, including checkout wait times
+- Sends paced by the provider-aware rate limiter (utils/smtp_rate_limiter.py),
+  which backs off on 4xx replies
 """
 
 import smtplib
@@ -18,14 +22,25 @@ import ssl
 import threading
 import time
 import logging
+from collections import deque
 from typing import Optional, Dict, List
 from dataclasses import dataclass
-from queue import Queue, Empty
+from queue import Queue, Empty, Full
 from contextlib import contextmanager
 from config.settings import get_settings
+from utils.smtp_rate_limiter import smtp_rate_limiter
+from utils.email_metrics import email_metrics
 
 logger = logging.getLogger(__name__)
 
+LOCAL_SMTP_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+def reply_code(error: Exception) -> int:
+    """SMTP reply code carried by an smtplib rejection (first refused recipient for RCPT errors)"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return next(iter(error.recipients.values()), (0, b""))[0]
+    return getattr(error, "smtp_code", 0)
+
 @dataclass
 class ConnectionStats:
     """Statistics for connection pool monitoring"""
@@ -37,6 +52,77 @@ class ConnectionStats:
     connections_in_use: int = 0
     failed_connections: int = 0
 
+@dataclass
+class CheckoutStats:
+    """Wait-time statistics for connection checkouts"""
+    checkouts: int = 0
+    waited: int = 0
+    timeouts: int = 0
+    waiting: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+    def record(self, wait_seconds: float, queued: bool):
+        self.checkouts += 1
+        if queued:
+            self.waited += 1
+        self.total_wait_seconds += wait_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def to_dict(self) -> Dict:
+        return {
+            "checkouts": self.checkouts,
+            "checkouts_waited": self.waited,
+            "checkout_timeouts": self.timeouts,
+            "waiting_now": self.waiting,
+            "avg_wait_ms": round(self.total_wait_seconds / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 2)
+        }
+
+class SMTPPoolTimeout(Exception):
+    """No connection became free within the checkout timeout"""
+
+class FairSlots:
+    """Counting semaphore that hands freed slots to waiting threads in arrival order"""
+
+    def __init__(self, size: int):
+        self._free = size
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free and nobody is queued ahead"""
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return True
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return True
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+
+        if waiter.wait(timeout):
+            return True
+        with self._lock:
+            # A slot may have been handed over just as the wait timed out
+            if waiter.is_set():
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # Hand the slot straight to the longest waiting thread
+                self._waiters.popleft().set()
+            else:
+                self._free += 1
+
 class SMTPConnection:
     """Wrapper for SMTP connection with health tracking"""
     
@@ -59,7 +145,10 @@ class SMTPConnection:
             
             context = ssl.create_default_context()
             self.connection = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            self.connection.starttls(context=context)
+            self.connection.ehlo()
+            # Plaintext is only accepted from a local server (e.g. the benchmark SMTP sink)
+            if self.connection.has_extn("starttls") or self.smtp_server not in LOCAL_SMTP_HOSTS:
+                self.connection.starttls(context=context)
             self.connection.login(self.email_user, self.email_password)
             
             self.is_healthy = True
@@ -97,6 +186,21 @@ class SMTPConnection:
             self.last_used = time.time()
             self.email_count += 1
             return True
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+            code = reply_code(e)
+            logger.error(f"Message rejected on connection {self.connection_id}: {str(e)}")
+            if code == 421:
+                # 421: the server is closing the session
+                self.is_healthy = False
+            else:
+                # The session itself is still usable after a rejected transaction
+                try:
+                    self.connection.rset()
+                except Exception:
+                    self.is_healthy = False
+            if 400 <= code < 500:
+                smtp_rate_limiter.record_throttle(code)
+            return False
         except Exception as e:
             logger.error(f"Failed to send email via connection {self.connection_id}: {str(e)}")
             self.is_healthy = False
@@ -149,15 +253,20 @@ class SMTPConnectionPool:
         self.from_email = self.settings.FROM_EMAIL or self.email_user
         
         # Pool configuration
-        self.pool_size = 5  # Maximum number of connections in pool
+        self.pool_size = self.settings.SMTP_POOL_SIZE  # Maximum number of open connections
+        self.min_idle = min(self.settings.SMTP_POOL_MIN_IDLE, self.pool_size)  # Opened by warm_up()
+        self.checkout_timeout = self.settings.SMTP_POOL_CHECKOUT_TIMEOUT
         self.max_connection_age = 3600  # 1 hour max connection age
         self.max_emails_per_connection = 100  # Recycle after 100 emails
         
         # Pool state
         self.pool: Queue = Queue(maxsize=self.pool_size)
         self.pool_lock = threading.Lock()
+        # One slot per open connection; senders beyond pool_size wait for a slot
+        self._slots = FairSlots(self.pool_size)
         self.stats = ConnectionStats()
         self.stats.pool_size = self.pool_size
+        self.checkout_stats = CheckoutStats()
         
         # Health monitoring
         self.health_check_interval = 300  # 5 minutes
@@ -186,53 +295,95 @@ class SMTPConnectionPool:
     
     def _cleanup_unhealthy_connections(self):
         """Remove unhealthy connections from pool"""
-        healthy_connections = []
+        checked = []
         
-        # Drain the pool
-        while True:
+        # Drain the idle connections, holding a slot for each so senders can't open extras meanwhile
+        for _ in range(self.pool.qsize()):
+            if not self._slots.try_acquire():
+                break
             try:
                 conn = self.pool.get_nowait()
-                if conn.test_health() and not conn.should_recycle(self.max_connection_age, self.max_emails_per_connection):
-                    healthy_connections.append(conn)
-                else:
-                    conn.close()
-                    with self.pool_lock:
-                        self.stats.total_connections_closed += 1
-                        self.stats.active_connections -= 1
             except Empty:
+                self._slots.release()
                 break
-        
-        # Put healthy connections back
-        for conn in healthy_connections:
-            try:
-                self.pool.put_nowait(conn)
-            except:
-                conn.close()  # Pool is full, close excess connections
+            if conn.test_health() and not conn.should_recycle(self.max_connection_age, self.max_emails_per_connection):
+                checked.append(conn)
+            else:
+                conn.close()
                 with self.pool_lock:
                     self.stats.total_connections_closed += 1
                     self.stats.active_connections -= 1
+                self._slots.release()
+        
+        # Put healthy connections back
+        for conn in checked:
+            self._release(conn)
+            self._slots.release()
     
     def _health_check(self):
         """Periodic health check of connections"""
         current_time = time.time()
-        if current_time - self.last_health_check < self.health_check_interval:
-            return
+        with self.pool_lock:
+            # Only one thread runs each periodic check
+            if current_time - self.last_health_check < self.health_check_interval:
+                return
+            self.last_health_check = current_time
             
         logger.debug("Performing SMTP connection pool health check")
         self._cleanup_unhealthy_connections()
-        self.last_health_check = current_time
         
         with self.pool_lock:
             logger.info(f"Pool health check complete. Active connections: {self.stats.active_connections}, Pool size: {self.pool.qsize()}")
     
+    def _acquire_slot(self, timeout: Optional[float]):
+        """Wait (in arrival order) for one of the pool_size connection slots"""
+        if self._slots.try_acquire():
+            with self.pool_lock:
+                self.checkout_stats.record(0.0, queued=False)
+            return
+
+        start = time.monotonic()
+        with self.pool_lock:
+            self.checkout_stats.waiting += 1
+        try:
+            acquired = self._slots.acquire(self.checkout_timeout if timeout is None else timeout)
+        finally:
+            with self.pool_lock:
+                self.checkout_stats.waiting -= 1
+
+        waited = time.monotonic() - start
+        with self.pool_lock:
+            if not acquired:
+                self.checkout_stats.timeouts += 1
+            else:
+                self.checkout_stats.record(waited, queued=True)
+        if not acquired:
+            raise SMTPPoolTimeout(f"No SMTP connection free after {waited:.1f}s ({self.pool_size} in use)")
+
+    def _release(self, conn: SMTPConnection):
+        """Return a connection to the idle queue, or close it if unhealthy or due for recycling"""
+        if (conn.is_healthy and
+                not conn.should_recycle(self.max_connection_age, self.max_emails_per_connection)):
+            try:
+                self.pool.put_nowait(conn)
+                return
+            except Full:
+                pass  # Pool is full, close connection
+        conn.close()
+        with self.pool_lock:
+            self.stats.total_connections_closed += 1
+            self.stats.active_connections -= 1
+
     @contextmanager
-    def get_connection(self):
-        """Get a connection from the pool (context manager)"""
+    def get_connection(self, timeout: Optional[float] = None):
+        """Get a connection from the pool (context manager), waiting up to timeout for a free one"""
+        checkout_start = time.perf_counter()
         self._health_check()
-        conn = None
+        self._acquire_slot(timeout)
         
         try:
             # Try to get existing connection from pool
+            conn = None
             try:
                 conn = self.pool.get_nowait()
                 # Test connection health
@@ -253,37 +404,44 @@ class SMTPConnectionPool:
             
             with self.pool_lock:
                 self.stats.connections_in_use += 1
-            
-            yield conn
-            
+            email_metrics.observe("checkout", time.perf_counter() - checkout_start)
+            try:
+                yield conn
+            finally:
+                with self.pool_lock:
+                    self.stats.connections_in_use -= 1
+                # Back in the idle queue before the slot is released, so the next waiter reuses it
+                self._release(conn)
         finally:
-            with self.pool_lock:
-                self.stats.connections_in_use -= 1
-            
-            # Return connection to pool or close if unhealthy
-            if conn:
-                if (conn.is_healthy and 
-                    not conn.should_recycle(self.max_connection_age, self.max_emails_per_connection)):
-                    try:
-                        self.pool.put_nowait(conn)
-                    except:
-                        # Pool is full, close connection
-                        conn.close()
-                        with self.pool_lock:
-                            self.stats.total_connections_closed += 1
-                            self.stats.active_connections -= 1
-                else:
-                    conn.close()
-                    with self.pool_lock:
-                        self.stats.total_connections_closed += 1
-                        self.stats.active_connections -= 1
+            self._slots.release()
+    
+    def warm_up(self, min_idle: Optional[int] = None) -> int:
+        """Open connections until min_idle are idle; returns how many were opened"""
+        target = min(self.min_idle if min_idle is None else min_idle, self.pool_size)
+        opened = 0
+        while self.pool.qsize() < target and self._slots.try_acquire():
+            try:
+                conn = self._create_connection()
+                if conn is None:
+                    break
+                self._release(conn)
+                opened += 1
+            finally:
+                self._slots.release()
+        
+        logger.info(f"SMTP connection pool warmed up: {opened} new connection(s), {self.pool.qsize()} idle")
+        return opened
     
     def send_email_with_pool(self, to_email: str, message: str) -> bool:
         """Send email using connection pool"""
         try:
+            # Pace sends to the provider's limits before taking a connection
+            smtp_rate_limiter.acquire_blocking()
             with self.get_connection() as conn:
-                success = conn.send_email(self.from_email, to_email, message)
+                with email_metrics.time_stage("smtp"):
+                    success = conn.send_email(self.from_email, to_email, message)
                 if success:
+                    smtp_rate_limiter.record_success()
                     with self.pool_lock:
                         self.stats.total_emails_sent += 1
                     logger.debug(f"Email sent successfully to {to_email} via connection {conn.connection_id}")
@@ -304,7 +462,11 @@ class SMTPConnectionPool:
                 "current_pool_size": self.pool.qsize(),
                 "connections_in_use": self.stats.connections_in_use,
                 "failed_connections": self.stats.failed_connections,
-                "pool_utilization": f"{(self.stats.connections_in_use / self.pool_size * 100):.1f}%"
+                "pool_utilization": f"{(self.stats.connections_in_use / self.pool_size * 100):.1f}%",
+                "min_idle": self.min_idle,
+                "checkout_timeout": self.checkout_timeout,
+                "checkout": self.checkout_stats.to_dict(),
+                "rate_limit": smtp_rate_limiter.get_stats()
             }
     
     def shutdown(self):
@@ -0,0 +1,197 @@
+"""
+Adaptive SMTP Rate Limiter
+
+Keeps outgoing mail under the SMTP provider's sending limits so bulk sends run
+at a steady rate instead of bursting into throttling replies and reconnects.
+
+Features:
+- Token buckets for the provider's per-minute and per-day limits, with provider
+  profiles selected by SMTP_SERVER and optional overrides in settings
+- Reservation-based pacing: each send reserves the next free slot, so queued
+  work is spread evenly (and in arrival order) across the minute
+- Adaptive backoff: 4xx replies halve the sending rate and 421 pauses sending
+  briefly; successes raise the rate back towards the provider ceiling
+- Usable from the event loop (acquire) and from pool threads (acquire_blocking)
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class ProviderLimits:
+    """Sending limits for an SMTP provider (None = no limit)"""
+    per_minute: int
+    per_day: Optional[int] = None
+    # Tokens that may be spent back to back before pacing starts
+    burst: int = 5
+
+# Keyed by SMTP server host
+PROVIDER_LIMITS: Dict[str, ProviderLimits] = {
+    "smtp.gmail.com": ProviderLimits(per_minute=60, per_day=2000),
+    "smtp.office365.com": ProviderLimits(per_minute=30, per_day=10000),
+    "smtp-mail.outlook.com": ProviderLimits(per_minute=30, per_day=300),
+    "smtp.sendgrid.net": ProviderLimits(per_minute=600, burst=20),
+    "email-smtp.us-east-1.amazonaws.com": ProviderLimits(per_minute=840, burst=14),
+}
+DEFAULT_LIMITS = ProviderLimits(per_minute=120)
+
+# Sends that would have to wait longer than this are refused so callers can retry later
+MAX_WAIT_SECONDS = 60.0
+
+# 421 "service not available" pauses all sending for this long
+SERVICE_PAUSE_SECONDS = 30.0
+
+class SMTPRateLimitExceeded(Exception):
+    """The provider budget is exhausted for longer than a caller should wait"""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"SMTP sending limit reached, retry in {retry_after:.0f}s")
+
+class TokenBucket:
+    """Continuously refilling bucket whose balance may go negative (reservations)"""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token reserved now becomes available"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+class SMTPRateLimiter:
+    """Per-provider token buckets with AIMD rate adaptation"""
+
+    def __init__(self, limits: ProviderLimits, min_rate_fraction: float = 0.1,
+                 recovery_successes: int = 20, max_wait: float = MAX_WAIT_SECONDS):
+        self.min_rate_fraction = min_rate_fraction
+        self.recovery_successes = recovery_successes
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self.configure(limits)
+        self.stats = {
+            "sends": 0,
+            "throttle_replies": 0,
+            "service_pauses": 0,
+            "refused": 0,
+            "total_wait_seconds": 0.0
+        }
+
+    def configure(self, limits: ProviderLimits):
+        """(Re)initialise the buckets for a set of provider limits"""
+        with self._lock:
+            self.limits = limits
+            self.ceiling = limits.per_minute / 60.0
+            self.min_rate = self.ceiling * self.min_rate_fraction
+            self.minute_bucket = TokenBucket(self.ceiling, limits.burst)
+            self.day_bucket = TokenBucket(limits.per_day / 86400.0, limits.per_day) if limits.per_day else None
+            self.paused_until = 0.0
+            self._successes_since_change = 0
+
+    @classmethod
+    def for_server(cls, smtp_server: str, per_minute: int = 0, per_day: int = 0) -> "SMTPRateLimiter":
+        """Build a limiter from the provider profile, with non-zero overrides applied"""
+        limits = PROVIDER_LIMITS.get(smtp_server.lower(), DEFAULT_LIMITS)
+        if per_minute or per_day:
+            limits = ProviderLimits(
+                per_minute=per_minute or limits.per_minute,
+                per_day=per_day or limits.per_day,
+                burst=limits.burst
+            )
+        return cls(limits)
+
+    @property
+    def current_rate_per_minute(self) -> float:
+        return self.minute_bucket.rate * 60
+
+    def _reserve(self) -> float:
+        """Reserve the next send slot and return how long to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self.minute_bucket.wait_time(now), self.paused_until - now)
+            if self.day_bucket:
+                wait = max(wait, self.day_bucket.wait_time(now))
+            if wait > self.max_wait:
+                self.stats["refused"] += 1
+                raise SMTPRateLimitExceeded(wait)
+
+            self.minute_bucket.take()
+            if self.day_bucket:
+                self.day_bucket.take()
+            self.stats["sends"] += 1
+            self.stats["total_wait_seconds"] += wait
+            return wait
+
+    async def acquire(self):
+        """Wait (on the event loop) for permission to send one message"""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_blocking(self):
+        """Wait (in a pool thread) for permission to send one message"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def record_success(self):
+        """Additive increase back towards the provider ceiling"""
+        with self._lock:
+            if self.minute_bucket.rate >= self.ceiling:
+                return
+            self._successes_since_change += 1
+            if self._successes_since_change >= self.recovery_successes:
+                self._successes_since_change = 0
+                self.minute_bucket.rate = min(self.ceiling, self.minute_bucket.rate + self.ceiling * 0.1)
+
+    def record_throttle(self, code: int):
+        """Multiplicative decrease on a 4xx reply; 421 also pauses sending"""
+        with self._lock:
+            self.stats["throttle_replies"] += 1
+            self._successes_since_change = 0
+            self.minute_bucket.rate = max(self.min_rate, self.minute_bucket.rate / 2)
+            if code == 421:
+                self.stats["service_pauses"] += 1
+                self.paused_until = max(self.paused_until, time.monotonic() + SERVICE_PAUSE_SECONDS)
+        logger.warning(f"SMTP provider throttled us ({code}), sending rate now {self.current_rate_per_minute:.0f}/min")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "total_wait_seconds": round(self.stats["total_wait_seconds"], 2),
+                "ceiling_per_minute": self.limits.per_minute,
+                "ceiling_per_day": self.limits.per_day,
+                "current_rate_per_minute": round(self.current_rate_per_minute, 1),
+                "paused_for_seconds": round(max(0.0, self.paused_until - time.monotonic()), 1),
+                "day_budget_remaining": int(self.day_bucket.tokens) if self.day_bucket else None
+            }
+
+def _create_rate_limiter() -> SMTPRateLimiter:
+    settings = get_settings()
+    return SMTPRateLimiter.for_server(
+        settings.SMTP_SERVER,
+        per_minute=settings.SMTP_RATE_LIMIT_PER_MINUTE,
+        per_day=settings.SMTP_RATE_LIMIT_PER_DAY
+    )
+
+# Global limiter shared by every SMTP pool in the process
+smtp_rate_limiter = _create_rate_limiter()
@@ -4,18 +4,43 @@ Fetches real data from the database for dashboard statistics
 """
 from utils.db_operations import DatabaseOperations
 from config.database import Database
-from typing import Dict, Any, Optional
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Document id of the platform statistics snapshot in the platform_stats collection
+PLATFORM_STATS_ID = "platform"
+
+DEFAULT_PLATFORM_RATING = 4.5
+
 class StatisticsManager:
     """Manager class for fetching platform statistics"""
     
+    # In-memory copy of the latest platform statistics snapshot
+    _snapshot: Optional[Dict[str, Any]] = None
+    _refresh_lock = asyncio.Lock()
+    
     @staticmethod
-    async def get_platform_statistics() -> Dict[str, Any]:
+    def _default_statistics() -> Dict[str, Any]:
+        return {
+            "total_events": 0,
+            "active_students": 0,
+            "certificates_issued": 0,
+            "platform_rating": DEFAULT_PLATFORM_RATING
+        }
+    
+    @classmethod
+    async def get_platform_statistics(cls) -> Dict[str, Any]:
         """
-        Fetch real platform statistics from the database
+        Get the precomputed platform statistics snapshot
+        
+        The snapshot is computed by a periodic background job (see
+        refresh_platform_statistics) and served from memory, falling back to the
+        persisted platform_stats document after a restart. No aggregation is done
+        on the request path.
         
         Returns:
             Dict containing:
@@ -25,57 +50,86 @@ class StatisticsManager:
             - platform_rating: Average rating from event feedback
         """
         try:
-            stats = {
-                "total_events": 0,
-                "active_students": 0,
-                "certificates_issued": 0,
-                "platform_rating": 4.5  # Default fallback rating
-            }
+            if cls._snapshot is None:
+                stored = await DatabaseOperations.find_one("platform_stats", {"_id": PLATFORM_STATS_ID})
+                if stored:
+                    stored.pop("_id", None)
+                    cls._snapshot = stored
             
-            # Get total events count
-            try:
-                events_count = await DatabaseOperations.count_documents("events", {})
-                stats["total_events"] = events_count
-            except Exception as e:
-                logger.warning(f"Failed to fetch events count: {e}")
-                stats["total_events"] = 0
+            if cls._snapshot is None:
+                return cls._default_statistics()
             
-            # Get active students count
-            try:
-                students_count = await DatabaseOperations.count_documents("students", {"is_active": True})
-                stats["active_students"] = students_count
-            except Exception as e:
-                logger.warning(f"Failed to fetch students count: {e}")
-                stats["active_students"] = 0
+            return {key: cls._snapshot.get(key, default) for key, default in cls._default_statistics().items()}
             
-            # Get certificates issued count by counting attendance records
-            # (attendance is prerequisite for certificate)
-            try:
-                certificates_count = await StatisticsManager.get_certificates_count()
-                stats["certificates_issued"] = certificates_count
-            except Exception as e:
-                logger.warning(f"Failed to fetch certificates count: {e}")
-                stats["certificates_issued"] = 0
+        except Exception as e:
+            logger.error(f"Error fetching platform statistics: {e}")
+            # Return default fallback statistics
+            return cls._default_statistics()
+    
+    @classmethod
+    async def refresh_platform_statistics(cls) -> Dict[str, Any]:
+        """
+        Recompute platform statistics and store them in the platform_stats snapshot
+        
+        Called by the background statistics job; concurrent calls share one refresh.
+        """
+        if cls._refresh_lock.locked():
+            async with cls._refresh_lock:
+                return cls._snapshot or cls._default_statistics()
+        
+        async with cls._refresh_lock:
+            stats = await cls.compute_platform_statistics()
+            stats["updated_at"] = datetime.now()
+            cls._snapshot = stats
             
-            # Calculate platform rating from feedback
             try:
-                avg_rating = await StatisticsManager.get_average_rating()
-                stats["platform_rating"] = avg_rating
+                db = await Database.get_database()
+                if db is not None:
+                    await db["platform_stats"].replace_one({"_id": PLATFORM_STATS_ID}, stats, upsert=True)
             except Exception as e:
-                logger.warning(f"Failed to fetch platform rating: {e}")
-                stats["platform_rating"] = 4.5
+                logger.warning(f"Failed to persist platform statistics snapshot: {e}")
             
+            logger.info(f"Platform statistics snapshot refreshed: {stats}")
             return stats
-            
+    
+    @staticmethod
+    async def compute_platform_statistics() -> Dict[str, Any]:
+        """
+        Compute platform statistics from the database (expensive - background use only)
+        """
+        stats = StatisticsManager._default_statistics()
+        
+        # Get total events count
+        try:
+            stats["total_events"] = await DatabaseOperations.count_documents("events", {})
         except Exception as e:
-            logger.error(f"Error fetching platform statistics: {e}")
-            # Return default fallback statistics
-            return {
-                "total_events": 0,
-                "active_students": 0,
-                "certificates_issued": 0,
-                "platform_rating": 4.5
-            }
+            logger.warning(f"Failed to fetch events count: {e}")
+        
+        # Get active students count
+        try:
+            stats["active_students"] = await DatabaseOperations.count_documents("students", {"is_active": True})
+        except Exception as e:
+            logger.warning(f"Failed to fetch students count: {e}")
+        
+        # Get certificates issued count by counting attendance records
+        # (attendance is prerequisite for certificate)
+        try:
+            stats["certificates_issued"] = await StatisticsManager.get_certificates_count()
+        except Exception as e:
+            logger.warning(f"Failed to fetch certificates count: {e}")
+        
+        # Calculate platform rating from feedback
+        try:
+            stats["platform_rating"] = await StatisticsManager.get_average_rating()
+        except Exception as e:
+            logger.warning(f"Failed to fetch platform rating: {e}")
+        
+        return stats
+    
+    @staticmethod
+    async def _get_event_ids() -> List[str]:
+        events = await DatabaseOperations.find_many("events", {})
+        return [event.get("event_id") for event in events if event.get("event_id")]
     
     @staticmethod
     async def get_certificates_count() -> int:
@@ -84,29 +138,24 @@ class StatisticsManager:
         Since certificates are issued to students who attended events
         """
         try:
-            # Get all events to check their individual attendance collections
-            events = await DatabaseOperations.find_many("events", {})
-            total_certificates = 0
+            event_ids = await StatisticsManager._get_event_ids()
             
-            for event in events:
-                event_id = event.get("event_id")
-                if not event_id:
-                    continue
-                    
+            async def count_attendance(event_id: str) -> int:
                 try:
                     # Get event-specific database
                     event_collection = await Database.get_event_collection(event_id)
-                    if event_collection is not None:
-                        # Count attendance records (students who attended)
-                        attendance_count = await event_collection.count_documents({
-                            "attendance_status": "present"
-                        })
-                        total_certificates += attendance_count
+                    if event_collection is None:
+                        return 0
+                    # Count attendance records (students who attended)
+                    return await event_collection.count_documents({
+                        "attendance_status": "present"
+                    })
                 except Exception as e:
                     logger.debug(f"Could not access database for event {event_id}: {e}")
-                    continue
+                    return 0
             
-            return total_certificates
+            counts = await asyncio.gather(*(count_attendance(event_id) for event_id in event_ids))
+            return sum(counts)
             
         except Exception as e:
             logger.error(f"Error counting certificates: {e}")
@@ -116,43 +165,47 @@ class StatisticsManager:
     async def get_average_rating() -> float:
         """
         Calculate average platform rating from event feedback
+        
+        Each event's {event_id}_feedbacks collection is reduced server-side to a
+        (sum, count) pair instead of streaming every feedback document.
         """
         try:
-            # Get all events to check their individual feedback collections
-            events = await DatabaseOperations.find_many("events", {})
-            total_rating = 0.0
-            total_feedback = 0
+            event_ids = await StatisticsManager._get_event_ids()
+            db = await Database.get_database()
+            if db is None:
+                return DEFAULT_PLATFORM_RATING
+            
+            # overall_satisfaction is stored as a string by the feedback form
+            pipeline = [
+                {"$project": {"rating": {"$convert": {
+                    "input": "$overall_satisfaction", "to": "double", "onError": None, "onNull": None
+                }}}},
+                {"$match": {"rating": {"$gte": 1, "$lte": 5}}},
+                {"$group": {"_id": None, "total": {"$sum": "$rating"}, "count": {"$sum": 1}}}
+            ]
             
-            for event in events:
-                event_id = event.get("event_id")
-                if not event_id:
-                    continue
-                    
+            async def rating_totals(event_id: str):
                 try:
-                    # Get event-specific database
-                    event_collection = await Database.get_event_collection(event_id)
-                    if event_collection is not None:
-                        # Get all feedback for this event
-                        feedback_cursor = event_collection.find({})
-                        async for feedback in feedback_cursor:
-                            # Use overall_satisfaction rating (1-5 scale)
-                            rating = feedback.get("overall_satisfaction")
-                            if rating and isinstance(rating, (int, float)) and 1 <= rating <= 5:
-                                total_rating += rating
-                                total_feedback += 1
+                    result = await db[f"{event_id}_feedbacks"].aggregate(pipeline).to_list(length=1)
+                    if result:
+                        return result[0]["total"], result[0]["count"]
                 except Exception as e:
                     logger.debug(f"Could not access feedback for event {event_id}: {e}")
-                    continue
+                return 0.0, 0
+            
+            totals = await asyncio.gather(*(rating_totals(event_id) for event_id in event_ids))
+            total_rating = sum(total for total, _ in totals)
+            total_feedback = sum(count for _, count in totals)
             
             if total_feedback > 0:
                 avg_rating = round(total_rating / total_feedback, 1)
                 return min(max(avg_rating, 1.0), 5.0)  # Ensure rating is between 1-5
             else:
-                return 4.5  # Default rating when no feedback exists
+                return DEFAULT_PLATFORM_RATING  # Default rating when no feedback exists
                 
         except Exception as e:
             logger.error(f"Error calculating average rating: {e}")
-            return 4.5
+            return DEFAULT_PLATFORM_RATING
     
     @staticmethod
     def format_stat_number(number: int) -> str:
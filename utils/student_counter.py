@@ -0,0 +1,76 @@
+"""
+Student Counter
+
+Maintains the number of student accounts in memory so that template context
+providers can show it without loading the students collection on every request.
+
+The counter is incremented/decremented by the account write paths and periodically
+reconciled against MongoDB's estimated_document_count (collection metadata, no scan).
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from utils.db_operations import DatabaseOperations
+
+logger = logging.getLogger(__name__)
+
+class StudentCounter:
+    """In-memory student account counter with periodic reconciliation"""
+
+    def __init__(self, reconcile_interval: int = 600):
+        self.reconcile_interval = reconcile_interval
+        self._count: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def count(self) -> int:
+        """Current student count (0 until the first reconciliation)"""
+        return self._count or 0
+
+    def increment(self, amount: int = 1):
+        """Record newly created student accounts"""
+        if self._count is not None:
+            self._count += amount
+
+    def decrement(self, amount: int = 1):
+        """Record removed student accounts"""
+        if self._count is not None:
+            self._count = max(0, self._count - amount)
+
+    async def reconcile(self) -> int:
+        """Reset the counter from the collection metadata count"""
+        try:
+            actual = await DatabaseOperations.estimated_document_count("students")
+            if self._count is not None and self._count != actual:
+                logger.info(f"Student counter drift corrected: {self._count} -> {actual}")
+            self._count = actual
+        except Exception as e:
+            logger.error(f"Error reconciling student counter: {str(e)}")
+        return self.count
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            await self.reconcile()
+
+    async def start(self):
+        """Load the initial count and start periodic reconciliation"""
+        await self.reconcile()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._reconcile_loop())
+        logger.info(f"Student counter started with {self.count} students")
+
+    async def stop(self):
+        """Stop periodic reconciliation"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Global student counter instance
+student_counter = StudentCounter()
@@ -1,14 +1,13 @@
 from fastapi import Request
-from utils.db_operations import DatabaseOperations
+from utils.student_counter import student_counter
 
 async def get_template_context(request: Request):
     """Get common context data for templates"""
     is_student_logged_in = "student" in request.session
     student_data = request.session.get("student", None)
     
-    # Get student count
-    students = await DatabaseOperations.find_many("students", {})
-    student_count = len(students)
+    # Student count is maintained in memory - no students query on the request path
+    student_count = student_counter.count
     
     return {
         "is_student_logged_in": is_student_logged_in,
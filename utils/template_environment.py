@@ -0,0 +1,106 @@
+"""
+Shared Template Environments
+
+Every module that renders templates gets the same Jinja environment for a template
+root instead of building its own, so each template is compiled once per process.
+
+Features:
+- One shared Jinja2Templates instance per page template root and one shared
+  Environment for email templates
+- FileSystemBytecodeCache on local disk so compiled templates survive restarts
+  and are shared between workers
+- auto_reload (template mtime checks) disabled in production
+- Startup precompilation of every template so the first request after a deploy
+  does not pay compile latency
+"""
+
+import hashlib
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from config.paths import BASE_DIR, TEMPLATE_DIR
+from config.settings import ENVIRONMENT
+from utils.fragment_cache import FragmentCacheExtension
+
+logger = logging.getLogger(__name__)
+
+# Compiled template bytecode is written here (one subdirectory per template root)
+BYTECODE_CACHE_DIR = BASE_DIR / ".cache" / "jinja"
+
+EMAIL_TEMPLATE_DIR = TEMPLATE_DIR / "email"
+
+# Template mtime checks are only needed while templates are being edited
+AUTO_RELOAD = ENVIRONMENT.lower() != "production"
+
+_page_templates: Dict[str, object] = {}
+_email_environment: Optional[Environment] = None
+
+def _bytecode_cache(template_root: str) -> Optional[FileSystemBytecodeCache]:
+    """Create an on-disk bytecode cache for a template root"""
+    root_id = hashlib.sha1(os.path.abspath(template_root).encode("utf-8")).hexdigest()[:12]
+    cache_dir = BYTECODE_CACHE_DIR / root_id
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        return FileSystemBytecodeCache(directory=str(cache_dir))
+    except OSError as e:
+        logger.warning(f"Jinja bytecode cache disabled for {template_root}: {str(e)}")
+        return None
+
+def _environment_options(template_root: str) -> dict:
+    return {
+        "auto_reload": AUTO_RELOAD,
+        "bytecode_cache": _bytecode_cache(template_root),
+        "extensions": [FragmentCacheExtension]
+    }
+
+def get_templates(directory: str = "templates"):
+    """Get the shared Jinja2Templates instance for a page template root"""
+    from fastapi.templating import Jinja2Templates
+
+    key = os.path.abspath(directory)
+    templates = _page_templates.get(key)
+    if templates is None:
+        templates = Jinja2Templates(directory=directory, **_environment_options(directory))
+        _page_templates[key] = templates
+    return templates
+
+def get_email_environment() -> Environment:
+    """Get the shared Jinja Environment for email templates"""
+    global _email_environment
+    if _email_environment is None:
+        _email_environment = Environment(
+            loader=FileSystemLoader(str(EMAIL_TEMPLATE_DIR)),
+            **_environment_options(str(EMAIL_TEMPLATE_DIR))
+        )
+    return _email_environment
+
+def precompile_templates() -> Dict[str, int]:
+    """Compile every page and email template ahead of the first request"""
+    start = time.perf_counter()
+    environments = [
+        # Email templates live under templates/email but are rendered by the email environment
+        ("pages", get_templates().env, lambda name: not name.startswith("email/")),
+        ("email", get_email_environment(), lambda name: True)
+    ]
+    stats = {"compiled": 0, "errors": 0}
+
+    for label, environment, include in environments:
+        for template_name in environment.list_templates(extensions=["html", "txt"]):
+            if not include(template_name):
+                continue
+            try:
+                environment.get_template(template_name)
+                stats["compiled"] += 1
+            except Exception as e:
+                stats["errors"] += 1
+                logger.error(f"Error precompiling {label} template {template_name}: {str(e)}")
+
+    logger.info(
+        f"Precompiled {stats['compiled']} templates in {(time.perf_counter() - start) * 1000:.0f}ms "
+        f"({stats['errors']} errors, auto_reload={AUTO_RELOAD})"
+    )
+    return stats
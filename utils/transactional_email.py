@@ -0,0 +1,197 @@
+"""
+Transactional Email Delivery
+
+Confirmation emails (registration, feedback, ...) are stored in the durable email
+outbox and sent by its background workers, so request handlers return as soon as
+their database writes are done instead of waiting for an SMTP transaction.
+
+Features:
+- Enqueue any allowed EmailService send method with its keyword arguments; the
+  arguments are checked against the method signature before they are stored
+- At-least-once delivery with the outbox's retries, backoff and dead-lettering;
+  each outbox attempt is a single SMTP attempt, so retries are not multiplied.
+  enqueue_or_send sends inline when the outbox cannot store the email
+- A caller-supplied idempotency key per message, so a repeated request (double
+  submit, retry after a timeout) does not send the email twice
+- Optional digests: email types with a window in EMAIL_DIGEST_WINDOWS are held for
+  the rest of the current window, and everything queued for the same student in
+  that window is sent as one digest email; each item's idempotency key is
+  reserved in the outbox, so a repeat in a later window is still dropped; an item
+  that cannot be composed into its digest is released and sent on its own
+"""
+
+import inspect
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from config.settings import get_settings
+from utils.email_metrics import EmailType
+from utils.email_outbox import email_outbox
+from utils.email_service import email_service
+
+logger = logging.getLogger(__name__)
+
+# EmailService methods that may be queued, and the email type each one sends
+TRANSACTIONAL_METHODS = {
+    "send_registration_confirmation": EmailType.REGISTRATION,
+    "send_payment_confirmation": EmailType.PAYMENT,
+    "send_attendance_confirmation": EmailType.ATTENDANCE,
+    "send_feedback_confirmation": EmailType.FEEDBACK,
+    "send_event_reminder": EmailType.REMINDER,
+    "send_welcome_email": EmailType.ACCOUNT,
+}
+
+class TransactionalEmailQueue:
+    """Queues EmailService sends in the email outbox"""
+
+    KIND = "transactional"
+    DIGEST_KIND = "transactional_digest"
+    # Outbox reservation for an email that went into a digest
+    DIGEST_ITEM_KIND = "transactional_digest_item"
+
+    def __init__(self, max_attempts: int = 5, digest_windows: Optional[Dict[str, int]] = None):
+        self.max_attempts = max_attempts
+        # Seconds per email type; types without a window are sent straight away
+        self.digest_windows = dict(get_settings().EMAIL_DIGEST_WINDOWS if digest_windows is None else digest_windows)
+        self.outbox = email_outbox
+        self.outbox.register_handler(self.KIND, self._handle_outbox_message)
+        self.outbox.register_handler(self.DIGEST_KIND, self._handle_digest_message)
+        self.stats = {
+            "total_digest_items": 0,
+            "total_digests_sent": 0,
+            "total_emails_coalesced": 0
+        }
+
+    def digest_window(self, method: str) -> int:
+        return max(int(self.digest_windows.get(TRANSACTIONAL_METHODS.get(method), 0) or 0), 0)
+
+    async def enqueue(self, method: str, idempotency_key: str, **kwargs: Any) -> bool:
+        """Store one email for background delivery; returns False if it could not be queued"""
+        if method not in TRANSACTIONAL_METHODS:
+            logger.error(f"Email method {method} cannot be queued")
+            return False
+        try:
+            # Fail here, not on every retry in the worker
+            inspect.signature(getattr(email_service, method)).bind(**kwargs)
+        except TypeError as e:
+            logger.error(f"Invalid arguments for {method} ({idempotency_key}): {str(e)}")
+            return False
+
+        window = self.digest_window(method)
+        if window and kwargs.get("student_email"):
+            if await self._add_to_digest(method, idempotency_key, window, kwargs):
+                return True
+            # The digest could not take it, so send it on its own
+
+        document = await self.outbox.enqueue(
+            self.KIND,
+            {"method": method, "kwargs": kwargs},
+            idempotency_key=idempotency_key,
+            max_attempts=self.max_attempts
+        )
+        return document is not None
+
+    async def enqueue_or_send(self, method: str, idempotency_key: str, **kwargs: Any) -> bool:
+        """Queue the email; if it cannot be queued, send it now rather than drop it"""
+        if await self.enqueue(method, idempotency_key, **kwargs):
+            return True
+        if method not in TRANSACTIONAL_METHODS:
+            return False
+
+        logger.warning(f"Could not queue {idempotency_key}, sending it inline")
+        try:
+            return await getattr(email_service, method)(**kwargs)
+        except Exception as e:
+            logger.error(f"Failed to send {idempotency_key} inline: {str(e)}")
+            return False
+
+    async def _add_to_digest(self, method: str, idempotency_key: str, window: int, kwargs: Dict[str, Any]) -> bool:
+        """Add an email to the student's digest for the current window"""
+        # The key must be unused across all windows and individual sends, not only within this batch
+        reserved = await self.outbox.reserve(idempotency_key, self.DIGEST_ITEM_KIND)
+        if reserved is None:
+            return False
+        if not reserved:
+            logger.info(f"Email {idempotency_key} already queued or sent, not added to a digest")
+            return True
+
+        student_email = kwargs["student_email"]
+        # Fixed windows: everything queued for a student before the window ends goes out together when it ends
+        window_end = (int(time.time()) // window + 1) * window
+        document = await self.outbox.add_to_batch(
+            self.DIGEST_KIND,
+            f"digest:{window}:{student_email.lower()}:{window_end}",
+            {"key": idempotency_key, "method": method, "kwargs": kwargs},
+            deliver_at=datetime.utcfromtimestamp(window_end),
+            fields={"student_email": student_email, "student_name": kwargs.get("student_name") or "Student"},
+            max_attempts=self.max_attempts
+        )
+        if document is None:
+            # Free the key for the individual send the caller falls back to
+            await self.outbox.release(idempotency_key, self.DIGEST_ITEM_KIND)
+            return False
+        self.stats["total_digest_items"] += 1
+        return True
+
+    async def _handle_outbox_message(self, payload: Dict[str, Any], message: Dict[str, Any]) -> bool:
+        """Outbox handler: call the EmailService method"""
+        method = payload.get("method")
+        if method not in TRANSACTIONAL_METHODS:
+            raise ValueError(f"Unknown transactional email method {method}")
+        # The outbox retries with backoff, so no in-process retries on top
+        with email_service.single_attempt():
+            return await getattr(email_service, method)(**payload.get("kwargs", {}))
+
+    async def _handle_digest_message(self, payload: Dict[str, Any], message: Dict[str, Any]) -> bool:
+        """Outbox handler: send a window's emails for one student as a single digest"""
+        items = payload.get("items") or []
+        if len(items) == 1:
+            # Nothing to merge, send the original email
+            return await self._handle_outbox_message(items[0], message)
+
+        emails = []
+        for item in items:
+            if item.get("method") not in TRANSACTIONAL_METHODS:
+                raise ValueError(f"Unknown transactional email method {item.get('method')}")
+            email = await email_service.compose(item["method"], **item.get("kwargs", {}))
+            if email is None:
+                # Its key is reserved, so hand it to an individual send rather than lose it
+                logger.error(f"Could not compose {item.get('key')} for digest {message.get('_id')}, sending it on its own")
+                if not await self._send_separately(item):
+                    return False
+                continue
+            emails.append(email)
+
+        if not emails:
+            # Every item was handed to an individual send
+            return True
+
+        with email_service.single_attempt():
+            success = await email_service.send_digest(payload["student_email"], payload.get("student_name") or "Student", emails)
+        if success:
+            self.stats["total_digests_sent"] += 1
+            self.stats["total_emails_coalesced"] += len(emails)
+        return success
+
+    async def _send_separately(self, item: Dict[str, Any]) -> bool:
+        """Move a digest item to an individual outbox message under its own key"""
+        await self.outbox.release(item["key"], self.DIGEST_ITEM_KIND)
+        document = await self.outbox.enqueue(
+            self.KIND,
+            {"method": item["method"], "kwargs": item.get("kwargs", {})},
+            idempotency_key=item["key"],
+            max_attempts=self.max_attempts
+        )
+        # Still the reservation if it could not be released
+        return document is not None and document.get("kind") == self.KIND
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "digest_windows": dict(self.digest_windows)
+        }
+
+# Global transactional email queue instance
+transactional_emails = TransactionalEmailQueue()